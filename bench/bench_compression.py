@@ -0,0 +1,111 @@
+#!/bin/env python
+"""Cold-cache load times of plain and compressed modules.json files
+
+Writes a synthetic modules.json as plain json and compressed with each
+available format, then times reading the raw bytes, decompressing and
+fully loading an LmodDB (without snapshots) for each. Before every run
+the file is evicted from the page cache with posix_fadvise, so the
+times include reading the file from disk or NFS. Eviction is a hint to
+the kernel; on file systems that ignore it the times are warm-cache.
+
+    python bench/bench_compression.py --packages 10000 --dir /nfs/scratch
+"""
+
+import os, sys, time, argparse, tempfile
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(bench_dir, ".."))
+
+import synth
+
+from mlbrowse import lmod, lmod_stream, spider
+
+FORMATS = ["", "gz", "bz2", "xz", "zst"]
+
+def evict(filename):
+    """Drop @filename from the page cache, if the platform allows it"""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+    return True
+
+def read_raw(filename):
+    """Read the file without decompressing it"""
+    with open(filename, "rb") as f:
+        while f.read(1 << 20):
+            pass
+
+def read_decompressed(filename):
+    """Read and decompress the file without parsing it"""
+    with lmod_stream.JsonSource(filename) as f:
+        while f.read(1 << 20):
+            pass
+
+def load_db(filename):
+    """Parse the file into an LmodDB without snapshots"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        lmod.LmodDB(filename, cache_dirs=[])
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def cold_time(func, filename, repeat):
+    """Return the shortest time of @repeat cold-cache calls of func(filename)"""
+    times = []
+    for i in range(repeat):
+        evict(filename)
+        t0 = time.perf_counter()
+        func(filename)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Cold-cache load times of compressed modules.json files")
+    parser.add_argument("--packages", type=int, default=10000, help="Number of synthetic packages.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark, the best is reported.")
+    parser.add_argument("--dir", default="", help="Directory for the test files, e.g. on NFS, default a temporary directory.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir or None) as temp_dir:
+        modules = synth.module_tree(args.packages)
+
+        print("%d packages, page cache eviction %s" % (args.packages, "enabled" if hasattr(os, "posix_fadvise") else "not available"))
+        print("")
+        print("%-6s %10s %7s %10s %12s %12s %12s" % ("format", "size [MB]", "ratio", "write [s]", "read [ms]", "inflate [ms]", "load [ms]"))
+
+        plain_size = None
+
+        for compression in FORMATS:
+            filename = os.path.join(temp_dir, "modules.json" + ("." + compression if compression != "" else ""))
+
+            t0 = time.perf_counter()
+            try:
+                spider.write_json_atomic(filename, modules)
+            except ValueError as e:
+                print("%-6s skipped, %s" % (compression, e))
+                continue
+            write_time = time.perf_counter() - t0
+
+            size = os.path.getsize(filename)
+            if plain_size is None:
+                plain_size = size
+
+            print("%-6s %10.2f %7.1f %10.2f %12.1f %12.1f %12.1f" % (
+                compression or "plain",
+                size / 1e6,
+                plain_size / size,
+                write_time,
+                cold_time(read_raw, filename, args.repeat) * 1000.0,
+                cold_time(read_decompressed, filename, args.repeat) * 1000.0,
+                cold_time(load_db, filename, args.repeat) * 1000.0))
@@ -0,0 +1,73 @@
+#!/bin/env python
+"""Micro-benchmark of LmodDB.find_modules: linear scan vs trigram index"""
+
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mlbrowse import lmod_search
+
+import synth
+
+def linear_find_modules(packages, name=""):
+    """The original LmodDB.find_modules implementation"""
+    module_names = []
+
+    for package in packages:
+        if name=="":
+            module_names.append(package)
+        else:
+            if name in package:
+                module_names.append(package)
+            elif name.upper() in package.upper():
+                module_names.append(package)
+            elif name.lower() in package.lower():
+                module_names.append(package)
+
+    return module_names
+
+def keystrokes(words):
+    """Return the queries typed when entering @words"""
+    queries = []
+    for word in words:
+        for i in range(1, len(word)+1):
+            queries.append(word[:i])
+    return queries
+
+def time_queries(func, queries, repeat):
+    """Return mean time in ms per query"""
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - t0) * 1000.0 / (repeat * len(queries))
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="find_modules micro-benchmark")
+    parser.add_argument("--packages", type=int, default=50000, help="Number of synthetic packages.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of each query set.")
+    args = parser.parse_args()
+
+    packages = synth.module_names(args.packages)
+
+    t0 = time.perf_counter()
+    index = lmod_search.TrigramIndex(packages)
+    build_time = time.perf_counter() - t0
+
+    queries = keystrokes(["tensorflow", "OpenMPI", "hdf5", "Boost", "xyzzy"])
+
+    for query in queries:
+        if index.search(query) != sorted(linear_find_modules(packages, query)):
+            print("Result mismatch for query %r" % query)
+            sys.exit(1)
+
+    print("Packages         : %d" % len(packages))
+    print("Index build      : %.1f ms" % (build_time * 1000.0))
+    print("Linear scan      : %.3f ms/query" % time_queries(lambda q: linear_find_modules(packages, q), queries, args.repeat))
+    print("Trigram index    : %.3f ms/query" % time_queries(index.search, queries, args.repeat))
+
+    long_queries = [q for q in queries if len(q) >= 3]
+
+    print("Linear scan (>=3): %.3f ms/query" % time_queries(lambda q: linear_find_modules(packages, q), long_queries, args.repeat))
+    print("Trigram (>=3)    : %.3f ms/query" % time_queries(index.search, long_queries, args.repeat))
@@ -0,0 +1,125 @@
+#!/bin/env python
+"""Time to first paint of the browser window with and without compiled UI
+
+Starts the browser window in fresh processes on the offscreen Qt
+platform against a synthetic module tree and measures the time from the
+start of the process to the first paint event of the window, for:
+
+    loadUi       uic.loadUi() of the .ui file (MLBROWSE_COMPILED_UI=0)
+    cached       module compiled on first use in the user cache
+    precompiled  module compiled by ml-browse compile-ui next to the .ui file
+
+The .ui files are copied to a temporary installation, so the repository
+is not modified.
+
+    python bench/bench_first_paint.py --repeat 10
+"""
+
+import os, sys, glob, shutil, argparse, tempfile, subprocess, importlib.util
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(bench_dir, ".."))
+
+sys.path.insert(0, root_dir)
+
+import synth
+
+ml_browse = os.path.join(root_dir, "ml-browse.py")
+
+# Run in the child process. The timer starts before Qt is imported.
+
+first_paint = """
+import time
+t0 = time.perf_counter()
+
+import os, sys, argparse
+sys.path.insert(0, %(root_dir)r)
+
+from PyQt5 import QtCore, QtWidgets
+from mlbrowse import settings, lmod_ui
+
+launch_settings = settings.LaunchSettings.create()
+launch_settings.tool_path = %(tool_path)r
+launch_settings.args = argparse.Namespace(select=False, name_only=False, filter="")
+
+class PaintFilter(QtCore.QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            print("first_paint %%.6f" %% (time.perf_counter() - t0))
+            sys.stdout.flush()
+            os._exit(0)
+        return False
+
+app = QtWidgets.QApplication(sys.argv[:1])
+window = lmod_ui.LmodQueryWindow()
+paint_filter = PaintFilter()
+window.installEventFilter(paint_filter)
+window.show()
+app.exec_()
+"""
+
+def make_installation(temp_dir, packages):
+    """Create bin/ui and etc/mlbrowse.conf of a temporary installation"""
+    filename = os.path.join(temp_dir, "modules.json")
+    synth.write_module_tree(filename, packages)
+
+    tool_path = os.path.join(temp_dir, "bin")
+    shutil.copytree(os.path.join(root_dir, "ui"), os.path.join(tool_path, "ui"), ignore=shutil.ignore_patterns("*_ui.py"))
+
+    os.makedirs(os.path.join(temp_dir, "etc"))
+    with open(os.path.join(temp_dir, "etc", "mlbrowse.conf"), "w") as f:
+        f.write("[general]\nmodules_json_file = %s\n" % filename)
+
+    return tool_path
+
+def run_first_paint(script, env):
+    """Start the window in a new process, return time to first paint in seconds"""
+    output = subprocess.run([sys.executable, "-c", script], env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True, check=True).stdout
+
+    for line in output.splitlines():
+        if line.startswith("first_paint "):
+            return float(line.split()[1])
+
+    raise RuntimeError("window was not painted")
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="ml-browse time to first paint")
+    parser.add_argument("--packages", type=int, default=20000, help="Number of synthetic packages.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each mode.")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("PyQt5") is None:
+        print("PyQt5 is not installed")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tool_path = make_installation(temp_dir, args.packages)
+        script = first_paint % {"root_dir": root_dir, "tool_path": tool_path}
+
+        env = dict(os.environ, QT_QPA_PLATFORM="offscreen", XDG_CACHE_HOME=os.path.join(temp_dir, "cache"))
+        env.pop("MLBROWSE_PROFILE", None)
+
+        # The first run writes the database snapshot and the cached UI module.
+
+        run_first_paint(script, env)
+
+        ui_files = sorted(glob.glob(os.path.join(tool_path, "ui", "*.ui")))
+
+        modes = [
+            ("loadUi", dict(env, MLBROWSE_COMPILED_UI="0"), None),
+            ("cached", env, None),
+            ("precompiled", env, [sys.executable, ml_browse, "compile-ui"] + ui_files)
+        ]
+
+        print("%d packages, %d runs per mode" % (args.packages, args.repeat))
+        print("")
+        print("%-12s %10s %10s" % ("ui", "min [ms]", "mean [ms]"))
+
+        for name, mode_env, setup in modes:
+            if setup is not None:
+                subprocess.run(setup, env=mode_env, stdout=subprocess.DEVNULL, check=True)
+
+            times = [run_first_paint(script, mode_env) for i in range(args.repeat)]
+            print("%-12s %10.1f %10.1f" % (name, min(times) * 1000.0, sum(times) / len(times) * 1000.0))
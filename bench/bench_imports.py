@@ -0,0 +1,147 @@
+#!/bin/env python
+"""Import times of the ml-browse entry points
+
+Imports the modules of each entry point (query, daemon, generate and the
+browser) in fresh processes with python -X importtime and reports the
+import time, leaving out the modules imported by the interpreter at
+startup, and the slowest imports. Each entry point is also checked for
+modules it must not load, e.g. Qt for the query command. The results can
+be written as json and compared with an earlier run, failing with exit
+status 1 if an entry point is more than --threshold slower or loads a
+module it must not.
+
+    python bench/bench_imports.py --output imports.json
+    python bench/bench_imports.py --baseline imports.json --threshold 0.25
+"""
+
+import os, sys, json, argparse, platform, subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(bench_dir, ".."))
+
+# Entry point -> (import statement, modules that must not be imported)
+
+ENTRY_POINTS = {
+    "query": ("from mlbrowse import cli", ["PyQt5", "mlbrowse.lmod_ui", "mlbrowse.lrms", "mlbrowse.jobs", "subprocess"]),
+    "daemon": ("from mlbrowse import lmod_daemon", ["PyQt5", "mlbrowse.lmod_ui", "mlbrowse.lrms", "mlbrowse.jobs"]),
+    "generate": ("from mlbrowse import spider", ["PyQt5", "mlbrowse.lmod_ui", "mlbrowse.lrms", "mlbrowse.jobs"]),
+    "browser": ("from PyQt5 import QtWidgets; from mlbrowse import settings, lmod_ui",
+        ["PyQt5.Qt", "mlbrowse.splash_win", "mlbrowse.lrms", "mlbrowse.jobs", "mlbrowse.cli"])
+}
+
+def import_times(statement):
+    """Run @statement with -X importtime, return list of (module, self, cumulative, depth), times in seconds"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sys; sys.path.insert(0, %r); %s" % (root_dir, statement)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_time) / 1e6, int(cumulative) / 1e6, depth))
+
+    return imports
+
+def is_forbidden(module, forbidden):
+    """Return True if @module is one of @forbidden or inside one of them"""
+    return any(module == name or module.startswith(name + ".") for name in forbidden)
+
+def run_entry_point(statement, forbidden, startup_modules, repeat, top):
+    """Return import report of @statement, the fastest of @repeat runs"""
+    best = None
+
+    for i in range(repeat):
+        imports = [item for item in import_times(statement) if item[0] not in startup_modules]
+        total = sum(cumulative for name, self_time, cumulative, depth in imports if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, imports)
+
+    total, imports = best
+    slowest = sorted(imports, key=lambda item: -item[1])[:top]
+
+    return {
+        "import_time": total,
+        "modules": len(imports),
+        "mlbrowse_modules": sorted(name for name, self_time, cumulative, depth in imports if name.startswith("mlbrowse.")),
+        "forbidden": sorted(name for name, self_time, cumulative, depth in imports if is_forbidden(name, forbidden)),
+        "slowest": [{"module": name, "self": self_time, "cumulative": cumulative} for name, self_time, cumulative, depth in slowest]
+    }
+
+def compare(results, baseline, threshold):
+    """Return list of (entry point, baseline time, time) regressions"""
+    regressions = []
+
+    for name, report in results["entry_points"].items():
+        base_report = baseline.get("entry_points", {}).get(name)
+        if base_report is None or report is None:
+            continue
+        if report["import_time"] > base_report["import_time"] * (1.0 + threshold):
+            regressions.append((name, base_report["import_time"], report["import_time"]))
+
+    return regressions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="ml-browse import times")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each entry point, the fastest is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports listed per entry point.")
+    parser.add_argument("--output", default="", help="Write results as json to this file.")
+    parser.add_argument("--baseline", default="", help="Compare with results from an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown compared with the baseline.")
+    args = parser.parse_args()
+
+    startup_modules = set(name for name, self_time, cumulative, depth in import_times("pass"))
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "entry_points": {}
+    }
+
+    failed = False
+
+    for name, (statement, forbidden) in ENTRY_POINTS.items():
+        try:
+            report = run_entry_point(statement, forbidden, startup_modules, args.repeat, args.top)
+        except subprocess.CalledProcessError:
+            results["entry_points"][name] = None
+            print("%s: skipped, could not import (%s)" % (name, statement))
+            print("")
+            continue
+
+        results["entry_points"][name] = report
+
+        print("%s: %.1f ms, %d modules" % (name, report["import_time"] * 1000.0, report["modules"]))
+        print("    mlbrowse: %s" % ", ".join(report["mlbrowse_modules"]))
+
+        if len(report["forbidden"]) > 0:
+            print("    Error: imports %s" % ", ".join(report["forbidden"]))
+            failed = True
+
+        print("    %-40s %10s %10s" % ("slowest imports", "self [ms]", "cum. [ms]"))
+        for item in report["slowest"]:
+            print("    %-40s %10.2f %10.2f" % (item["module"], item["self"] * 1000.0, item["cumulative"] * 1000.0))
+        print("")
+
+    if args.output != "":
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline != "":
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for name, base_value, value in regressions:
+            print("Regression: %s import time %.1f ms -> %.1f ms" % (name, base_value * 1000.0, value * 1000.0))
+
+        if len(regressions) > 0:
+            failed = True
+        else:
+            print("No regressions above %d%%" % (args.threshold * 100))
+
+    if failed:
+        sys.exit(1)
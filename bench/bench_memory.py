@@ -0,0 +1,117 @@
+#!/bin/env python
+"""Memory report of LmodDB on a synthetic module tree
+
+Compares the original representation (the raw json kept alongside
+module_dict and module_version_dict) with the compact records used by
+LmodDB, with and without the search indexes. Each variant runs in its
+own process, so that the reported maximum RSS is not shared between
+them.
+"""
+
+import os, sys, json, time, argparse, tempfile, tracemalloc, resource, subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(bench_dir, ".."))
+
+import synth
+
+def load_raw(filename):
+    """The original LmodDB data layout"""
+    with open(filename, "r") as f:
+        modules = json.load(f)
+
+    module_dict = {}
+    module_version_dict = {}
+
+    for module in modules:
+        module_name = module["package"]
+        module_dict[module_name] = module
+        for version in module["versions"]:
+            if "versionName" in version:
+                module_version_dict.setdefault(module_name, {}).setdefault(version["versionName"], []).append(version)
+
+    return modules, module_dict, module_version_dict
+
+def load_records(filename):
+    """LmodDB package and version records only, without search indexes"""
+    from mlbrowse import lmod
+
+    with open(filename, "r") as f:
+        modules = json.load(f)
+
+    db = lmod.LmodDB.__new__(lmod.LmodDB)
+    db._module_ids = {}
+    db._module_names = []
+    db._strings = {}
+
+    modules.reverse()
+    records = {}
+    while len(modules) > 0:
+        package = db._make_package(modules.pop())
+        records[package.name] = package
+
+    db._strings = {}
+
+    return db, records
+
+def load_lmoddb(filename):
+    """LmodDB with compact records and search indexes"""
+    from mlbrowse import lmod
+    return lmod.LmodDB(filename, cache_dirs=[])
+
+def measure(variant, filename):
+    """Measure a single variant, run in a child process"""
+    loaders = {"raw": load_raw, "records": load_records, "lmoddb": load_lmoddb}
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    loaded = loaders[variant](filename)
+    sys.stdout = stdout
+
+    load_time = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The loaded data is only released here, so that it is counted in
+    # the current memory use.
+
+    del loaded
+
+    return {
+        "variant": variant,
+        "load_time": load_time,
+        "traced_current_mb": current / 1e6,
+        "traced_peak_mb": peak / 1e6,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    }
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="LmodDB memory report")
+    parser.add_argument("--packages", type=int, default=20000, help="Number of synthetic packages.")
+    parser.add_argument("--modules-json", default="", help="Use an existing modules.json instead.")
+    parser.add_argument("--measure", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure != "":
+        print(json.dumps(measure(args.measure, args.modules_json)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = args.modules_json
+        if filename == "":
+            filename = os.path.join(temp_dir, "modules.json")
+            synth.write_module_tree(filename, args.packages)
+
+        print("modules.json : %s (%.1f MB)" % (filename, os.path.getsize(filename) / 1e6))
+        print("")
+        print("%-8s %10s %14s %14s %12s" % ("variant", "load [s]", "current [MB]", "peak [MB]", "RSS [MB]"))
+
+        for variant in ["raw", "records", "lmoddb"]:
+            output = subprocess.check_output([sys.executable, __file__, "--measure", variant, "--modules-json", filename], universal_newlines=True)
+            result = json.loads(output)
+            print("%-8s %10.2f %14.1f %14.1f %12.1f" % (variant, result["load_time"], result["traced_current_mb"], result["traced_peak_mb"], result["max_rss_mb"]))
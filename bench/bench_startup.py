@@ -0,0 +1,92 @@
+#!/bin/env python
+"""Startup time of headless queries compared with the Qt imports
+
+Runs ml-browse.py query in fresh processes against a synthetic module
+tree and compares the wall time with the time it takes just to import
+the Qt libraries used by the browser. The first query writes the
+database snapshot, the following ones load it.
+"""
+
+import os, sys, json, time, runpy, argparse, tempfile, subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.join(bench_dir, "..")
+
+sys.path.insert(0, root_dir)
+
+import synth
+
+ml_browse = os.path.join(root_dir, "ml-browse.py")
+
+gui_imports = "import sys; sys.path.insert(0, %r); from PyQt5 import QtCore, QtGui, QtWidgets; from mlbrowse import settings, lmod_ui" % root_dir
+
+def run_timed(cmd, env):
+    """Run @cmd and return wall time in seconds"""
+    t0 = time.perf_counter()
+    subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t0
+
+def loaded_modules(filename):
+    """Run a query in this process and report the modules it loaded"""
+    sys.argv = [ml_browse, "query", "--modules-json", filename, "list", "GRO"]
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    try:
+        runpy.run_path(ml_browse, run_name="__main__")
+    except SystemExit:
+        pass
+    sys.stdout, sys.stderr = stdout, stderr
+
+    return {
+        "qt": sorted(name for name in sys.modules if name.startswith("PyQt5")),
+        "mlbrowse": sorted(name for name in sys.modules if name.startswith("mlbrowse"))
+    }
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="ml-browse startup time")
+    parser.add_argument("--packages", type=int, default=20000, help="Number of synthetic packages.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each command.")
+    parser.add_argument("--modules", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modules != "":
+        print(json.dumps(loaded_modules(args.modules)))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "modules.json")
+        synth.write_module_tree(filename, args.packages)
+
+        module = synth.module_names(args.packages)[0]
+
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(temp_dir, "cache"))
+
+        commands = [
+            ("query list", [sys.executable, ml_browse, "query", "--modules-json", filename, "list"]),
+            ("query versions", [sys.executable, ml_browse, "query", "--modules-json", filename, "--json", "versions", module]),
+            ("query load", [sys.executable, ml_browse, "query", "--modules-json", filename, "load", module]),
+            ("qt imports", [sys.executable, "-c", gui_imports])
+        ]
+
+        print("modules.json : %s (%d packages)" % (filename, args.packages))
+        print("")
+
+        print("first query (writes snapshot) : %.3f s" % run_timed(commands[0][1], env))
+        print("")
+        print("%-16s %10s %10s" % ("command", "min [s]", "mean [s]"))
+
+        for name, cmd in commands:
+            try:
+                times = [run_timed(cmd, env) for i in range(args.repeat)]
+            except subprocess.CalledProcessError:
+                print("%-16s %10s" % (name, "failed"))
+                continue
+            print("%-16s %10.3f %10.3f" % (name, min(times), sum(times) / len(times)))
+
+        output = subprocess.check_output([sys.executable, __file__, "--modules", filename], env=env, universal_newlines=True)
+        modules = json.loads(output)
+
+        print("")
+        print("mlbrowse modules loaded by query : %s" % ", ".join(modules["mlbrowse"]))
+        print("Qt modules loaded by query       : %s" % (", ".join(modules["qt"]) or "none"))
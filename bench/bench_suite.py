@@ -0,0 +1,259 @@
+#!/bin/env python
+"""LmodDB benchmark suite on synthetic module trees
+
+Times loading, index building and the queries made by the browser on
+synthetic modules.json files of 1k, 10k and 100k packages. The results
+are written as json and can be compared with a baseline, failing when a
+timing regresses by more than a threshold.
+
+    python bench/bench_suite.py --output results.json
+    python bench/bench_suite.py --baseline results.json --threshold 0.25
+"""
+
+import os, sys, json, time, random, argparse, platform, tempfile, functools
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(bench_dir, ".."))
+
+import synth
+
+from mlbrowse import lmod, lmod_search, lmod_sqlite, view_cache, basket
+
+# Timings below this many seconds are not checked for regressions, as
+# they are dominated by noise.
+
+MIN_CHECKED_TIME = 0.001
+
+# Reported for reference only, they do not measure mlbrowse code.
+
+UNCHECKED_METRICS = ["packages", "file_size_mb", "json_parse"]
+
+def keystrokes(words):
+    """Return the queries typed when entering @words"""
+    queries = []
+    for word in words:
+        for i in range(1, len(word)+1):
+            queries.append(word[:i])
+    return queries
+
+def best_of(func, repeat):
+    """Return the shortest time in seconds of @repeat calls of @func"""
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def quiet(func, *args, **kwargs):
+    """Call @func without the status output of LmodDB"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def list_widget_population(db, repeat):
+    """Time filling the module list as the browser does, None without
+    PyQt5"""
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5 import QtWidgets
+        from mlbrowse import lmod_ui
+    except ImportError:
+        return None
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    module_list = QtWidgets.QListView()
+    module_list.setUniformItemSizes(True)
+    module_model = lmod_ui.ListModel()
+    module_list.setModel(module_model)
+
+    def populate():
+        module_model.set_items([module for module in db.find_modules("") if module[0] != "."])
+        app.processEvents()
+
+    return best_of(populate, repeat)
+
+def run_size(packages, repeat, temp_dir):
+    """Run all benchmarks on a synthetic tree of @packages packages"""
+    filename = os.path.join(temp_dir, "modules-%d.json" % packages)
+    cache_dir = os.path.join(temp_dir, "cache-%d" % packages)
+
+    synth.write_module_tree(filename, packages)
+
+    results = {"packages": packages, "file_size_mb": os.path.getsize(filename) / 1e6}
+
+    # Loading
+
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    results["json_parse"] = best_of(functools.partial(json.loads, data), repeat)
+    del data
+
+    results["load"] = best_of(lambda: quiet(lmod.LmodDB, filename, cache_dirs=[]), repeat)
+
+    quiet(lmod.LmodDB, filename, cache_dirs=[cache_dir])
+    results["load_snapshot"] = best_of(lambda: quiet(lmod.LmodDB, filename, cache_dirs=[cache_dir]), repeat)
+
+    sqlite_file = os.path.join(temp_dir, "modules-%d.sqlite" % packages)
+    lmod_sqlite.SqliteDB(filename, sqlite_file)
+    results["open_sqlite"] = best_of(lambda: lmod_sqlite.SqliteDB(filename, sqlite_file), repeat)
+
+    db = quiet(lmod.LmodDB, filename, cache_dirs=[])
+
+    # Index builds
+
+    names = list(db.module_dict)
+
+    results["build_name_index"] = best_of(lambda: lmod_search.TrigramIndex(names), repeat)
+
+    def build_fuzzy_index():
+        index = lmod_search.FuzzyIndex()
+        for package in db.module_dict.values():
+            index.add_package(package.name, package.description or "", [version.version for version in package.versions if version.version is not None])
+
+    results["build_fuzzy_index"] = best_of(build_fuzzy_index, repeat)
+
+    def build_text_index():
+        db._text_index = None
+        db._cache_dirs = []
+        db._get_text_index()
+
+    results["build_text_index"] = best_of(build_text_index, repeat)
+
+    # Queries, per keystroke as typed in the search box
+
+    queries = keystrokes([names[0], names[len(names) // 2], "tensorflow", "OpenMPI", "xyzzy"])
+
+    def find_per_keystroke():
+        for query in queries:
+            db.find_modules(query)
+
+    results["find_modules_keystroke"] = best_of(find_per_keystroke, repeat) / len(queries)
+    results["find_modules_all"] = best_of(lambda: db.find_modules(""), repeat)
+
+    sqlite_db = lmod_sqlite.SqliteDB(filename, sqlite_file)
+
+    def find_per_keystroke_sqlite():
+        for query in queries:
+            sqlite_db.find_modules(query)
+
+    results["find_modules_sqlite"] = best_of(find_per_keystroke_sqlite, repeat) / len(queries)
+
+    def search_per_keystroke():
+        for query in queries:
+            db.search_modules(query)
+
+    results["search_modules_keystroke"] = best_of(search_per_keystroke, repeat) / len(queries)
+
+    rnd = random.Random(1)
+    module_versions = [(module, version) for module in rnd.sample(names, min(1000, len(names))) for version in db.find_versions(module)]
+
+    def find_parents():
+        for module, version in module_versions:
+            db.find_parents(module, version)
+
+    results["find_parents"] = best_of(find_parents, repeat) / max(len(module_versions), 1)
+
+    # Selecting each sampled module and its versions, first with an
+    # empty view cache and then again
+
+    selected = rnd.sample(names, min(1000, len(names)))
+    views = view_cache.ViewCache(db, maxsize=len(module_versions) + len(selected))
+
+    def select_modules():
+        for module in selected:
+            for version in views.module_view(module).versions:
+                views.version_view(module, version)
+
+    results["select_module_miss"] = best_of(lambda: (views.clear(), select_modules()), repeat) / len(selected)
+    results["select_module_hit"] = best_of(select_modules, repeat) / len(selected)
+
+    # Baskets of 5 module versions, edited one module at a time
+
+    baskets = [tuple(rnd.sample(module_versions, min(5, len(module_versions)))) for i in range(100)]
+    resolver = basket.BasketResolver(db, maxsize=10 * len(baskets))
+
+    def resolve_baskets():
+        for items in baskets:
+            for i in range(1, len(items) + 1):
+                resolver.resolve(items[:i])
+
+    results["resolve_basket"] = best_of(lambda: (resolver.clear(), resolve_baskets()), repeat) / len(baskets)
+
+    results["ui_list_population"] = list_widget_population(db, repeat)
+
+    return results
+
+def compare(results, baseline, threshold):
+    """Return list of regressions of @results against @baseline"""
+    regressions = []
+
+    for packages, metrics in results["sizes"].items():
+        base_metrics = baseline.get("sizes", {}).get(packages)
+        if base_metrics is None:
+            continue
+
+        for metric, value in metrics.items():
+            base_value = base_metrics.get(metric)
+            if metric in UNCHECKED_METRICS or value is None or base_value is None:
+                continue
+            if value < MIN_CHECKED_TIME and base_value < MIN_CHECKED_TIME:
+                continue
+            if value > base_value * (1.0 + threshold):
+                regressions.append((packages, metric, base_value, value))
+
+    return regressions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="LmodDB benchmark suite")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated numbers of synthetic packages.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark, the best is reported.")
+    parser.add_argument("--output", default="", help="Write results as json to this file.")
+    parser.add_argument("--baseline", default="", help="Compare with results from an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown compared with the baseline.")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "sizes": {}
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for packages in [int(size) for size in args.sizes.split(",")]:
+            size_results = run_size(packages, args.repeat, temp_dir)
+            results["sizes"][str(packages)] = size_results
+
+            print("%d packages (%.1f MB)" % (packages, size_results["file_size_mb"]))
+            for metric, value in size_results.items():
+                if metric in ["packages", "file_size_mb"]:
+                    continue
+                if value is None:
+                    print("    %-26s %12s" % (metric, "skipped"))
+                else:
+                    print("    %-26s %12.3f ms" % (metric, value * 1000.0))
+
+    if args.output != "":
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline != "":
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for packages, metric, base_value, value in regressions:
+            print("Regression: %s packages %s %.3f ms -> %.3f ms" % (packages, metric, base_value * 1000.0, value * 1000.0))
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print("No regressions above %d%%" % (args.threshold * 100))
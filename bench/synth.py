@@ -0,0 +1,105 @@
+#!/bin/env python
+"""Synthetic module names and trees for benchmarks"""
+
+import json
+import random
+
+name_prefixes = ["lib", "py", "Py", "Open", "GRO", "Sci", "FFT", "Boost", "hdf", "net", "R-", "Perl-", "X", "gtk", "cuda"]
+name_syllables = ["ma", "cs", "tensor", "flow", "blas", "pack", "mpi", "io", "x", "core", "grid", "zip", "ml", "num", "plot", "geo", "bio", "chem"]
+
+def module_names(count, seed=42):
+    """Return @count unique synthetic package names"""
+    rnd = random.Random(seed)
+    names = []
+    used = set()
+
+    while len(names) < count:
+        name = rnd.choice(name_prefixes) + "".join(rnd.choice(name_syllables) for i in range(rnd.randint(1, 3)))
+        if name in used:
+            name = "%s%d" % (name, len(names))
+        used.add(name)
+        names.append(name)
+
+    return names
+
+description_words = ["library", "tools", "parallel", "numerical", "solver", "molecular", "dynamics", "python",
+    "bindings", "fast", "fourier", "transform", "linear", "algebra", "file", "format", "compression", "mesh",
+    "visualization", "statistics", "genome", "assembly", "quantum", "chemistry", "climate", "model", "GPU", "MPI"]
+
+compilers = ["GCC/11.3.0", "GCC/12.3.0", "GCC/13.2.0", "intel-compilers/2022.1.0", "intel-compilers/2023.1.0"]
+mpis = {"GCC/11.3.0": ["OpenMPI/4.1.4"], "GCC/12.3.0": ["OpenMPI/4.1.5"], "GCC/13.2.0": ["OpenMPI/4.1.6"],
+    "intel-compilers/2022.1.0": ["impi/2021.6.0"], "intel-compilers/2023.1.0": ["impi/2021.9.0"]}
+cudas = {"GCC/12.3.0": ["CUDA/12.1.1"], "GCC/13.2.0": ["CUDA/12.4.0"]}
+
+def module_tree(count, seed=42, max_versions=12):
+    """Return a synthetic spider (jsonSoftwarePage) module list with @count packages
+
+    Packages are spread over Core, compiler, compiler+MPI and
+    compiler+CUDA+MPI levels of the hierarchy. Versions at the compiler
+    levels have one parent chain for each toolchain they are installed
+    in. Most packages have one or two versions, a few up to
+    @max_versions, as in real software stacks.
+    """
+    rnd = random.Random(seed)
+    modules = []
+
+    toolchains = [[compiler] for compiler in compilers]
+    toolchains += [[compiler, mpi] for compiler in compilers for mpi in mpis[compiler]]
+    toolchains += [[compiler, cuda, mpi] for compiler in cudas for cuda in cudas[compiler] for mpi in mpis[compiler]]
+
+    for name in module_names(count, seed):
+        level = rnd.random()
+        description = " ".join(rnd.sample(description_words, 6))
+        versions = []
+
+        for i in range(min(max_versions, 1 + int(rnd.expovariate(0.8)))):
+            version_name = "%d.%d.%d" % (rnd.randint(0, 12), rnd.randint(0, 20), i)
+            path = "/sw/easybuild/modules/all/%s/%s.lua" % (name, version_name)
+            record = {
+                "versionName": version_name,
+                "full": "%s/%s" % (name, version_name),
+                "path": path,
+                "description": description,
+                "help": "Description\n===========\n%s\n\nMore information\n================\n - Homepage: https://example.org/%s" % (description, name),
+                "whatis": ["Description: %s" % description, "Homepage: https://example.org/%s" % name],
+                "markedDefault": False,
+                "hidden": False
+            }
+
+            if level > 0.3:
+                if level > 0.9:
+                    candidates = [chain for chain in toolchains if len(chain) == 3]
+                elif level > 0.7:
+                    candidates = [chain for chain in toolchains if len(chain) == 2]
+                else:
+                    candidates = [chain for chain in toolchains if len(chain) == 1]
+                record["parent"] = [list(chain) for chain in rnd.sample(candidates, rnd.randint(1, min(3, len(candidates))))]
+
+            versions.append(record)
+
+        modules.append({
+            "package": name,
+            "defaultVersionName": versions[-1]["versionName"],
+            "description": description,
+            "url": "https://example.org/%s" % name,
+            "versions": versions
+        })
+
+    return modules
+
+def write_module_tree(filename, count, seed=42):
+    """Write synthetic modules.json with @count packages"""
+    with open(filename, "w") as f:
+        json.dump(module_tree(count, seed), f)
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic modules.json")
+    parser.add_argument("--packages", type=int, default=10000, help="Number of synthetic packages.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    parser.add_argument("output", help="modules.json to write.")
+    args = parser.parse_args()
+
+    write_module_tree(args.output, args.packages, args.seed)
@@ -2,8 +2,6 @@
 
 import os, sys, argparse
 
-from PyQt5 import QtCore, QtGui, QtWidgets
-
 # --- Version information
 
 mlbrowse_copyright = """LUNARC LMOD Browser - Version %s
@@ -20,7 +18,38 @@ mlbrowse_version = "0.3.1"
 tool_path = os.path.dirname(os.path.abspath(sys.argv[0]))
 sys.path.append(tool_path)
 
-from mlbrowse import *
+# --- Opt-in profiling (MLBROWSE_PROFILE, --profile, --cprofile)
+
+from mlbrowse import profiling
+
+profiling.configure(sys.argv)
+
+# --- Headless queries, handled before any Qt libraries are loaded
+
+if __name__ == '__main__' and len(sys.argv) > 1 and sys.argv[1] in ["query", "daemon", "generate", "compile-ui"]:
+
+    from mlbrowse import settings
+
+    settings.LaunchSettings.create().tool_path = tool_path
+
+    if sys.argv[1] == "query":
+        from mlbrowse import cli
+        sys.exit(cli.main(sys.argv[2:]))
+    elif sys.argv[1] == "daemon":
+        from mlbrowse import lmod_daemon
+        sys.exit(lmod_daemon.main(sys.argv[2:]))
+    elif sys.argv[1] == "compile-ui":
+        from mlbrowse import ui_cache
+        sys.exit(ui_cache.main(sys.argv[2:]))
+    else:
+        from mlbrowse import spider
+        sys.exit(spider.main(sys.argv[2:]))
+
+with profiling.phase("qt.import"):
+    from PyQt5 import QtWidgets
+
+with profiling.phase("mlbrowse.import"):
+    from mlbrowse import settings, lmod_ui
 
 if __name__ == '__main__':
 
@@ -35,6 +64,8 @@ if __name__ == '__main__':
     parser.add_argument("--select", dest="select", action="store_true", default=False, help="Selection mode")
     parser.add_argument("--name-only", dest="name_only", action="store_true", default=False, help="Only return names in selection.")
     parser.add_argument("--filter", dest="filter", action="store", default="", help="default filter applied.")
+    parser.add_argument("--profile", dest="profile", action="store_true", default=False, help="Write a timing profile at exit (also MLBROWSE_PROFILE).")
+    parser.add_argument("--cprofile", dest="cprofile", action="store_true", default=False, help="Also write cProfile output (also MLBROWSE_CPROFILE).")
 
     args = parser.parse_args()
 
@@ -49,12 +80,16 @@ if __name__ == '__main__':
 
     redirect = False
 
-    app = QtWidgets.QApplication(sys.argv)
+    with profiling.phase("qt.application"):
+        app = QtWidgets.QApplication(sys.argv)
 
     # Show user interface
-    
-    form = lmod_ui.LmodQueryWindow()
-    form.show()
+
+    with profiling.phase("ui.create_window"):
+        form = lmod_ui.LmodQueryWindow()
+
+    with profiling.phase("ui.show"):
+        form.show()
 
     # Start main application loop
 
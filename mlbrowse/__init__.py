@@ -1 +1,16 @@
-__all__ = ['lrms', 'settings', 'lmod', 'lmod_ui', 'splash_win', 'config']
+"""LUNARC LMOD Browser
+
+Submodules are imported on first use, so that each entry point of
+ml-browse only loads the modules it needs. The query, daemon and
+generate commands never import Qt, and the browser does not import the
+job and LRMS modules.
+"""
+
+__all__ = ['lrms', 'settings', 'lmod', 'lmod_ui', 'splash_win', 'config', 'cli']
+
+
+def __getattr__(name):
+    if name in __all__:
+        __import__(__name__ + "." + name)
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
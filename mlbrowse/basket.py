@@ -0,0 +1,214 @@
+#!/bin/env python
+"""Basket of modules loaded together
+
+A basket collects several module versions. BasketResolver picks one of
+the parent chains of each of them, such that all chosen chains are
+prefixes of a single toolchain, e.g. GCC/12.3.0 and GCC/12.3.0 ->
+OpenMPI/4.1.5, and that toolchain is as short as possible. The load
+plan is the toolchain followed by the modules of the basket, or reports
+the modules that have no common toolchain. Plans are cached per basket
+contents.
+"""
+
+from . import view_cache
+
+
+def module_name(full_name):
+    """Return module name of @full_name, e.g. GCC of GCC/12.3.0"""
+    return full_name.rsplit("/", 1)[0]
+
+
+class Basket(object):
+    """Ordered (module, version) pairs without duplicates"""
+    def __init__(self):
+        self.items = ()
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, module, version):
+        """Add @version of @module, return False if already in the basket"""
+        if (module, version) in self.items:
+            return False
+        self.items = self.items + ((module, version),)
+        return True
+
+    def remove(self, module, version):
+        """Remove @version of @module from the basket"""
+        self.items = tuple(item for item in self.items if item != (module, version))
+
+    def clear(self):
+        """Remove all modules"""
+        self.items = ()
+
+    def labels(self):
+        """Return name/version of the modules in the basket"""
+        return ["%s/%s" % item for item in self.items]
+
+
+class LoadPlan(object):
+    """Modules to load for a basket
+
+    @modules lists the full names to load in order, the toolchain first,
+    and @chains the parent chain chosen for each module of the basket. If
+    the basket cannot be loaded, @modules is empty and @error says why.
+    """
+    def __init__(self, items, modules=(), chains=(), error=""):
+        self.items = items
+        self.modules = list(modules)
+        self.chains = list(chains)
+        self.error = error
+
+    @property
+    def ok(self):
+        """True if the basket can be loaded"""
+        return self.error == ""
+
+    def commands(self, name_only=False):
+        """Return the load commands, one per line"""
+        if name_only:
+            return "".join("%s\n" % full_name for full_name in self.modules)
+        return "".join("module load %s\n" % full_name for full_name in self.modules)
+
+
+class BasketResolver(object):
+    """Load plans of baskets of modules in @db
+
+    The parent chains of each module version and the plan of each
+    basket are kept in LRU caches, so editing a basket only resolves the
+    new contents. clear() must be called when the database changes.
+    """
+    def __init__(self, db, maxsize=256):
+        self.db = db
+        self.alternatives_cache = view_cache.LRUCache(maxsize)
+        self.plans = view_cache.LRUCache(maxsize)
+
+    def _alternatives(self, module, version):
+        try:
+            available = version in self.db.find_versions(module)
+        except KeyError:
+            available = False
+
+        if not available:
+            return None
+
+        # Modules without parents are loaded from Core, the empty chain.
+
+        chains = []
+        for chain in self.db.find_parents(module, version) or [()]:
+            chain = tuple(chain)
+            if not chain in chains:
+                chains.append(chain)
+
+        return chains
+
+    def alternatives(self, module, version):
+        """Return the parent chains of @version of @module, None if it does not exist"""
+        return self.alternatives_cache.get((module, version), lambda: self._alternatives(module, version))
+
+    def _choose_chains(self, items, alternatives):
+        """Return (toolchain, chain of each item) loading the fewest
+        modules, None if the items have no common toolchain"""
+        full_names = ["%s/%s" % item for item in items]
+        names = {}
+
+        for (module, version), full_name in zip(items, full_names):
+            if names.setdefault(module, full_name) != full_name:
+                return None
+
+        # Branch and bound over the items with the fewest alternatives
+        # first. The chains chosen so far must all be prefixes of the
+        # toolchain, the longest of them. A choice is dropped as soon as
+        # the toolchain loads another version of a module in the basket,
+        # or is at least as long as the best toolchain so far. The rest of
+        # the search only depends on the toolchain, so each toolchain is
+        # only visited once per item.
+
+        order = sorted(range(len(items)), key=lambda i: len(alternatives[i]))
+        choice = [None] * len(items)
+        best = [None, None]
+        visited = set()
+
+        def visit(k, toolchain):
+            if best[0] is not None and len(toolchain) >= len(best[0]):
+                return
+
+            if (k, toolchain) in visited:
+                return
+            visited.add((k, toolchain))
+
+            if k == len(order):
+                best[0] = toolchain
+                best[1] = list(choice)
+                return
+
+            i = order[k]
+
+            for chain in alternatives[i]:
+                if chain[:len(toolchain)] == toolchain:
+                    extended = chain
+                elif toolchain[:len(chain)] == chain:
+                    extended = toolchain
+                else:
+                    continue
+
+                if any(names.get(module_name(full_name), full_name) != full_name for full_name in extended[len(toolchain):]):
+                    continue
+
+                choice[i] = chain
+                visit(k + 1, extended)
+
+        visit(0, ())
+
+        if best[1] is None:
+            return None
+
+        return best[0], best[1]
+
+    def _resolve(self, items):
+        alternatives = []
+
+        for module, version in items:
+            chains = self.alternatives(module, version)
+            if chains is None:
+                return LoadPlan(items, error="%s/%s is not available" % (module, version))
+            alternatives.append(chains)
+
+        choice = self._choose_chains(items, alternatives)
+
+        if choice is None:
+            return LoadPlan(items, error="No common toolchain for %s" % ", ".join(self._conflicting(items, alternatives)))
+
+        toolchain, chains = choice
+        modules = list(toolchain)
+
+        for item in items:
+            full_name = "%s/%s" % item
+            if not full_name in modules:
+                modules.append(full_name)
+
+        return LoadPlan(items, modules, chains)
+
+    def _conflicting(self, items, alternatives):
+        """Return name/version of the first pair of items without a common
+        toolchain, all items if every pair has one"""
+        for i in range(len(items)):
+            for j in range(i):
+                if self._choose_chains([items[j], items[i]], [alternatives[j], alternatives[i]]) is None:
+                    return ["%s/%s" % items[j], "%s/%s" % items[i]]
+
+        return ["%s/%s" % item for item in items]
+
+    def resolve(self, items):
+        """Return LoadPlan of @items, (module, version) pairs in basket order"""
+        items = tuple(items)
+        return self.plans.get(items, lambda: self._resolve(items))
+
+    def clear(self):
+        """Drop cached chains and plans, e.g. after the database has been updated"""
+        self.alternatives_cache.clear()
+        self.plans.clear()
+
+    def stats(self):
+        """Return hit and miss counters of the chain and plan caches"""
+        return {"alternatives": self.alternatives_cache.stats(), "plans": self.plans.stats()}
@@ -0,0 +1,299 @@
+#!/bin/env python
+"""Headless command line queries of the LMOD database
+
+Only the lmod and config modules are used, so no Qt libraries are
+loaded when ml-browse is used from scripts.
+"""
+
+import sys
+import json
+import argparse
+import contextlib
+
+from . import lmod
+from . import config
+from . import profiling
+
+
+def print_error(msg):
+    """Print error message"""
+    print("Error: %s" % msg, file=sys.stderr)
+
+
+def open_lmod_db(modules_json_file="", daemon_socket=None, source=""):
+    """Open the LMOD database given by the configuration, or of the
+    configured @source, through the query daemon if one is running.
+    Returns None if @source is not configured."""
+
+    # Status messages go to stderr so that stdout only contains the result.
+
+    with contextlib.redirect_stdout(sys.stderr):
+        with profiling.phase("config"):
+            cfg = config.MlBrowseConfig.create()
+
+        if source != "":
+            if not source in cfg.sources:
+                print_error("Source %s not configured" % source)
+                return None
+            modules_json_file = cfg.sources[source]
+
+        if modules_json_file == "":
+            modules_json_file = cfg.modules_json_file
+
+        if daemon_socket is None:
+            daemon_socket = cfg.daemon_socket
+
+        with profiling.phase("lmod.open"):
+            return lmod.open_db(modules_json_file, lmod.snapshot_dirs(cfg.snapshot_dir), daemon_socket, cfg.backend, cfg.sqlite_file,
+                daemon_user=cfg.daemon_user)
+
+
+def open_federated_db():
+    """Open the databases of all configured sources"""
+    from . import lmod_federation
+
+    with contextlib.redirect_stdout(sys.stderr):
+        cfg = config.MlBrowseConfig.create()
+
+    return lmod_federation.FederatedDB(cfg.sources, lmod.snapshot_dirs(cfg.snapshot_dir))
+
+
+def load_commands(db, module, version, alternative=0, name_only=False):
+    """Return the commands needed to load @module/@version
+
+    Modules in a hierarchy can be reached through several parent chains.
+    @alternative selects the chain, as the alternatives list in the
+    browser does. Returns None if @alternative does not exist.
+    """
+    alternatives = db.find_parents(module, version)
+
+    if len(alternatives) > 0:
+        if alternative < 0 or alternative >= len(alternatives):
+            return None
+        modules = list(alternatives[alternative])
+    else:
+        modules = []
+
+    modules.append("%s/%s" % (module, version))
+
+    if name_only:
+        return modules
+    else:
+        return ["module load %s" % name for name in modules]
+
+
+def select_version(db, module, version=""):
+    """Return @version or the default version of @module"""
+    if version != "":
+        return version
+
+    version = db.find_default_version(module)
+
+    if version == "":
+        versions = db.find_versions(module)
+        if len(versions) > 0:
+            version = versions[-1]
+
+    return version
+
+
+def split_module(db, name):
+    """Return (module, version) of @name, e.g. GCC/12.3.0, or of the
+    default version if @name is a module"""
+    try:
+        db.find_versions(name)
+        module, version = name, select_version(db, name)
+    except KeyError:
+        if not "/" in name:
+            raise
+        module, version = name.rsplit("/", 1)
+
+    if version not in db.find_versions(module):
+        raise KeyError("%s/%s" % (module, version))
+
+    return module, version
+
+
+def query_list(db, args):
+    """List modules, optionally filtered by name"""
+    modules = [module for module in db.find_modules(args.filter) if module[0] != "."]
+    return modules, "\n".join(modules)
+
+
+def query_search(db, args):
+    """Ranked fuzzy or full-text search"""
+    if args.full_text:
+        modules = db.search_text(args.query, args.limit)
+    else:
+        modules = db.search_modules(args.query, args.limit)
+    return modules, "\n".join(modules)
+
+
+def query_versions(db, args):
+    """Versions and default version of a module"""
+    versions = db.find_versions(args.module)
+    default_version = db.find_default_version(args.module)
+
+    result = {
+        "module": args.module,
+        "description": db.find_description(args.module),
+        "default": default_version,
+        "versions": versions
+        }
+
+    lines = []
+    for version in versions:
+        if version == default_version:
+            lines.append("%s (default)" % version)
+        else:
+            lines.append(version)
+
+    return result, "\n".join(lines)
+
+
+def query_default(db, args):
+    """Default version of a module"""
+    default_version = db.find_default_version(args.module)
+    return {"module": args.module, "default": default_version}, default_version
+
+
+def query_load(db, args):
+    """Commands for loading a module version"""
+    version = select_version(db, args.module, args.version)
+
+    if version not in db.find_versions(args.module):
+        raise KeyError("%s/%s" % (args.module, version))
+
+    commands = load_commands(db, args.module, version, args.alternative, args.name_only)
+
+    if commands is None:
+        raise KeyError("alternative %d of %s/%s" % (args.alternative, args.module, version))
+
+    result = {
+        "module": args.module,
+        "version": version,
+        "alternatives": db.find_parents(args.module, version),
+        "commands": commands
+        }
+
+    return result, "\n".join(commands)
+
+
+def query_basket(db, args):
+    """Commands for loading several modules through a common toolchain"""
+    from . import basket
+
+    items = [split_module(db, name) for name in args.modules]
+    plan = basket.BasketResolver(db).resolve(items)
+
+    if not plan.ok:
+        raise ValueError(plan.error)
+
+    commands = plan.commands(args.name_only).splitlines()
+
+    result = {
+        "modules": ["%s/%s" % item for item in items],
+        "chains": plan.chains,
+        "commands": commands
+        }
+
+    return result, "\n".join(commands)
+
+
+def query_where(db, args):
+    """Sources (clusters, architectures) providing a module"""
+    availability = db.find_availability(args.module)
+
+    if args.version != "":
+        availability = [(version, sources) for version, sources in availability if version == args.version]
+        if len(availability) == 0:
+            raise KeyError("%s/%s" % (args.module, args.version))
+
+    result = {
+        "module": args.module,
+        "versions": [{"version": version, "sources": sources} for version, sources in availability]
+        }
+
+    return result, "\n".join(["%s: %s" % (version, ", ".join(sources)) for version, sources in availability])
+
+
+def create_parser(prog="ml-browse query"):
+    """Create argument parser for the query command"""
+
+    parser = argparse.ArgumentParser(prog=prog, description="Query the LMOD module database without starting the browser")
+
+    parser.add_argument("--json", dest="json", action="store_true", default=False, help="Output results as json.")
+    parser.add_argument("--modules-json", dest="modules_json_file", action="store", default="", help="LMOD json database to query instead of the configured one.")
+    parser.add_argument("--socket", dest="daemon_socket", action="store", default=None, help="Query daemon socket, default from the daemon_socket option.")
+    parser.add_argument("--source", dest="source", action="store", default="", help="Query the database of a source in the [sources] section.")
+
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    list_parser = subparsers.add_parser("list", help="List modules with names containing FILTER.")
+    list_parser.add_argument("filter", nargs="?", default="")
+    list_parser.set_defaults(func=query_list)
+
+    search_parser = subparsers.add_parser("search", help="Ranked search for modules.")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--full-text", dest="full_text", action="store_true", default=False, help="Search descriptions, help and whatis texts.")
+    search_parser.add_argument("--limit", dest="limit", type=int, default=50, help="Maximum number of modules returned.")
+    search_parser.set_defaults(func=query_search)
+
+    versions_parser = subparsers.add_parser("versions", help="Show versions and default version of MODULE.")
+    versions_parser.add_argument("module")
+    versions_parser.set_defaults(func=query_versions)
+
+    default_parser = subparsers.add_parser("default", help="Show default version of MODULE.")
+    default_parser.add_argument("module")
+    default_parser.set_defaults(func=query_default)
+
+    load_parser = subparsers.add_parser("load", help="Print commands for loading MODULE.")
+    load_parser.add_argument("module")
+    load_parser.add_argument("version", nargs="?", default="", help="Version to load, default version if not given.")
+    load_parser.add_argument("--alternative", dest="alternative", type=int, default=0, help="Parent chain to load the module through.")
+    load_parser.add_argument("--name-only", dest="name_only", action="store_true", default=False, help="Only return module names.")
+    load_parser.set_defaults(func=query_load)
+
+    basket_parser = subparsers.add_parser("basket", help="Print commands for loading all MODULES through a common toolchain.")
+    basket_parser.add_argument("modules", nargs="+", help="Modules as name/version, or name for the default version.")
+    basket_parser.add_argument("--name-only", dest="name_only", action="store_true", default=False, help="Only return module names.")
+    basket_parser.set_defaults(func=query_basket)
+
+    where_parser = subparsers.add_parser("where", help="Show the sources in the [sources] section providing MODULE.")
+    where_parser.add_argument("module")
+    where_parser.add_argument("version", nargs="?", default="", help="Only show this version.")
+    where_parser.set_defaults(func=query_where, federated=True)
+
+    return parser
+
+
+def main(argv=None, prog="ml-browse query"):
+    """Run a query command, returns exit status"""
+
+    args = create_parser(prog).parse_args(argv)
+
+    if getattr(args, "federated", False):
+        db = open_federated_db()
+    else:
+        db = open_lmod_db(args.modules_json_file, args.daemon_socket, args.source)
+
+    if db is None:
+        return 1
+
+    try:
+        with profiling.phase("query.%s" % args.command):
+            result, text = args.func(db, args)
+    except KeyError as e:
+        print_error("Module %s not found" % e.args[0])
+        return 1
+    except ValueError as e:
+        print_error(e)
+        return 1
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif text != "":
+        print(text)
+
+    return 0
@@ -47,6 +47,13 @@ class MlBrowseConfig(object):
         """Assign default properties"""
         self.modules_json_file = "/sw/pkg/rviz/share/modules.json"
         self.terminal_command = "gnome-terminal"
+        self.snapshot_dir = ""
+        self.daemon_socket = ""
+        self.daemon_user = ""
+        self.spider = ""
+        self.sources = {}
+        self.backend = "memory"
+        self.sqlite_file = ""
 
     def print_config(self):
         """Print configuration"""
@@ -61,6 +68,19 @@ class MlBrowseConfig(object):
         print("")
         print("modules_json_file = %s" % (self.module_json_file))
         print("terminal-command = %s" % (self.terminal_command))
+        print("snapshot_dir = %s" % (self.snapshot_dir))
+        print("daemon_socket = %s" % (self.daemon_socket))
+        print("daemon_user = %s" % (self.daemon_user))
+        print("spider = %s" % (self.spider))
+        print("backend = %s" % (self.backend))
+        print("sqlite_file = %s" % (self.sqlite_file))
+
+        if len(self.sources) > 0:
+            print("")
+            print("Sources")
+            print("")
+            for name, filename in self.sources.items():
+                print("%s = %s" % (name, filename))
 
         
     def _config_get(self, config, section, option, default=""):
@@ -96,6 +116,17 @@ class MlBrowseConfig(object):
         try:
             self.modules_json_file = self._config_get(config, "general", "modules_json_file", self.modules_json_file)
             self.terminal_command = self._config_get(config, "general", "terminal_command", self.terminal_command)
+            self.snapshot_dir = self._config_get(config, "general", "snapshot_dir", self.snapshot_dir)
+            self.daemon_socket = self._config_get(config, "general", "daemon_socket", self.daemon_socket)
+            self.daemon_user = self._config_get(config, "general", "daemon_user", self.daemon_user)
+            self.spider = self._config_get(config, "general", "spider", self.spider)
+            self.backend = self._config_get(config, "general", "backend", self.backend)
+            self.sqlite_file = self._config_get(config, "general", "sqlite_file", self.sqlite_file)
+
+            # Json databases of other clusters or architectures, by name.
+
+            if config.has_section("sources"):
+                self.sources = dict(config.items("sources"))
         except configparser.Error as e:
             print_error(e)
             return False
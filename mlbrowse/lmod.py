@@ -3,58 +3,885 @@
 
 import os
 import sys
-import subprocess
 import json
+import hashlib
+import gc
+import pickle
+import re
+import contextlib
+
+from . import lmod_search
+from . import lmod_graph
+from . import lmod_stream
+from . import profiling
 
 # Generate modules.json with:
 # $LMOD_DIR/spider -o jsonSoftwarePage $MODULEPATH > modules.json
 
 import sys
 
-class LmodDB(object):
+# Bump when the layout of the snapshot state changes.
+
+SNAPSHOT_FORMAT = 12
+
+# EasyBuild style toolchain suffix, e.g. "-GCC-12.3.0" in "1.2-GCC-12.3.0"
+
+toolchain_suffix_re = re.compile(r"-(?=[A-Za-z])")
+version_token_re = re.compile(r"\d+|[A-Za-z]+")
+
+pre_release_tags = {"dev", "pre", "alpha", "beta", "rc"}
+
+def natural_key(text):
+    """Sort key comparing the numbers in @text as numbers. Pre-release
+    tags such as rc sort before the release, other letters after it."""
+    key = []
+    for token in version_token_re.findall(text):
+        if token.isdigit():
+            key.append((2, int(token), ""))
+        elif token.lower() in pre_release_tags:
+            key.append((0, 0, token.lower()))
+        else:
+            key.append((3, 0, token.lower()))
+    key.append((1, 0, ""))
+    return key
+
+def version_key(version):
+    """Natural sort key of a version name
+
+    The toolchain suffix is compared after the version itself, so that
+    "1.2-GCC-12.3.0" sorts after "1.2" and before "1.10-GCC-11.3.0", and
+    the toolchains of a version by name and version. The leading dot of
+    hidden versions is ignored.
+    """
+    parts = toolchain_suffix_re.split((version or "").lstrip("."), 1)
+    suffix = parts[1] if len(parts) > 1 else ""
+    return (natural_key(parts[0]), natural_key(suffix), version or "")
+
+def user_cache_dir():
+    """Return per-user cache directory"""
+    cache_home = os.environ.get("XDG_CACHE_HOME", "")
+    if cache_home == "":
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "mlbrowse")
+
+def snapshot_dirs(site_dir=""):
+    """Return snapshot directories in lookup order (site, user)"""
+    dirs = []
+    if site_dir != "":
+        dirs.append(site_dir)
+    dirs.append(user_cache_dir())
+    return dirs
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector while the enclosed block creates
+    many objects that live as long as the database, as the collector
+    would otherwise traverse them over and over again"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def hash_file(filename):
+    """Return content hash of a file"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def open_db(filename="modules.json", cache_dirs=None, daemon_socket="", backend="memory", sqlite_file="", progress=None, daemon_user=""):
+    """Return a client of the query daemon at @daemon_socket if it serves
+    @filename and runs as root or @daemon_user, otherwise open the
+    database in this process. With the "sqlite" @backend queries are
+    answered from an SQLite file instead of loading the database into
+    memory. @progress is passed on to LmodDB."""
+    if daemon_socket != "":
+        from . import lmod_daemon
+        client = lmod_daemon.connect(daemon_socket, filename, cache_dirs, daemon_user)
+        if client is not None:
+            return client
+
+    if backend == "sqlite":
+        import sqlite3
+        from . import lmod_sqlite
+        try:
+            return lmod_sqlite.SqliteDB(filename, sqlite_file, cache_dirs)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print("Could not open SQLite database, loading %s: %s" % (filename, e))
+
+    return LmodDB(filename, cache_dirs, progress)
+
+class VersionRecord(object):
+    """Compact version record
+
+    Parent chains are stored as tuples of module ids, see
+    LmodDB.module_name(). Keys not used by the browser are kept in
+    @extra.
+    """
+    __slots__ = ("name", "version", "full", "path", "description", "help", "whatis", "parents", "marked_default", "hidden", "extra")
+
+    keys = {"versionName", "full", "path", "description", "help", "whatis", "parent", "markedDefault", "hidden"}
+
+    def __init__(self, name, version, full, path, description, help, whatis, parents, marked_default, hidden, extra):
+        self.name = name
+        self.version = version
+        self.full = full
+        self.path = path
+        self.description = description
+        self.help = help
+        self.whatis = whatis
+        self.parents = parents
+        self.marked_default = marked_default
+        self.hidden = hidden
+        self.extra = extra
+
+    def __reduce__(self):
+        return (VersionRecord, tuple([getattr(self, name) for name in self.__slots__]))
+
+    def full_name(self):
+        """Return full name (name/version), also if the json record has none"""
+        if self.full is None and self.version is not None:
+            return "%s/%s" % (self.name, self.version)
+        return self.full
+
+
+class PackageRecord(object):
+    """Compact package record"""
+    __slots__ = ("name", "description", "default_version", "versions", "extra")
+
+    keys = {"package", "description", "defaultVersionName", "versions"}
+
+    def __init__(self, name, description, default_version, versions, extra):
+        self.name = name
+        self.description = description
+        self.default_version = default_version
+        self.versions = versions
+        self.extra = extra
+
+    def __reduce__(self):
+        return (PackageRecord, tuple([getattr(self, name) for name in self.__slots__]))
+
+
+class ModuleChanges(object):
+    """Difference between the loaded database and the json file
+
+    Holds the json records of added and changed packages and the names
+    of removed packages, see LmodDB.scan_changes().
+    """
+    def __init__(self, base_stat, stat, source_hash, package_hashes, modules, added, changed, removed):
+        self.base_stat = base_stat
+        self.stat = stat
+        self.source_hash = source_hash
+        self.package_hashes = package_hashes
+        self.modules = modules
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+
+class CacheFiles(object):
+    """Cache files made from a json file
+
+    Cache files of each kind are named after the path of the json file
+    and start with a header identifying the json file they were made
+    from. Subclasses set _filename, _source_stat, _source_hash and
+    _cache_dirs.
+    """
+    def _snapshot_filename(self, cache_dir, kind="snapshot"):
+        """Return snapshot filename for the json file in @cache_dir"""
+        source = os.path.abspath(self._filename)
+        key = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(cache_dir, "lmoddb-%s.%s" % (key, kind))
+
+    def _snapshot_header(self):
+        """Return header identifying the json file a snapshot was made from"""
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "python": tuple(sys.version_info[:2]),
+            "source": os.path.abspath(self._filename),
+            "size": self._source_stat.st_size,
+            "mtime": self._source_stat.st_mtime_ns,
+            "hash": self._source_hash
+        }
+
+    def _is_valid_header(self, header, compare_hash=True):
+        """Check snapshot header against the json file. Without
+        @compare_hash the modification time must match as well."""
+        expected = self._snapshot_header()
+
+        for key in ["format", "python", "source", "size"]:
+            if header.get(key) != expected[key]:
+                return False
+
+        if header.get("mtime") == expected["mtime"]:
+            self._source_hash = header.get("hash", "")
+            return True
+
+        if not compare_hash:
+            return False
+
+        # File has been touched or rewritten, compare the content.
+
+        if self._source_hash == "":
+            self._source_hash = hash_file(self._filename)
+
+        return header.get("hash") == self._source_hash
+
+    def _read_cache_file(self, kind):
+        """Return (header, payload) of a valid cache file of @kind or None
+
+        All cache directories are first searched for a header matching
+        the size and modification time of the json file, so a refreshed
+        header in the user cache is found even if the site cache
+        directory comes first. Only if there is none is the json file
+        hashed, and a cache file matching the hash is written again with
+        the current modification time, so the next start does not have
+        to hash the json file.
+        """
+        for compare_hash in [False, True]:
+            for cache_dir in self._cache_dirs:
+                cache_filename = self._snapshot_filename(cache_dir, kind)
+
+                if not os.path.isfile(cache_filename):
+                    continue
+
+                try:
+                    with open(cache_filename, "rb") as f:
+                        header = pickle.load(f)
+                        if not self._is_valid_header(header, compare_hash):
+                            continue
+                        payload = pickle.load(f)
+                except Exception:
+                    continue
+
+                if compare_hash:
+                    self._write_cache_file(kind, payload)
+
+                return header, payload
+
+        return None
+
+    def _write_cache_file(self, kind, payload):
+        """Write cache file of @kind to the first writable cache directory"""
+        import tempfile
+
+        for cache_dir in self._cache_dirs:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                fd, temp_filename = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            except OSError:
+                continue
+
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(self._snapshot_header(), f, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(payload, f, pickle.HIGHEST_PROTOCOL)
+                os.chmod(temp_filename, 0o644)
+                os.replace(temp_filename, self._snapshot_filename(cache_dir, kind))
+                return True
+            except Exception:
+                try:
+                    os.remove(temp_filename)
+                except OSError:
+                    pass
+
+        return False
+
+
+class LmodDB(CacheFiles):
     """LmodDB class
 
-    Reads a LMOD json database and stores in Python dictionaries.
+    Reads a LMOD json database and stores it as compact package and
+    version records in Python dictionaries. The json records are
+    released once they have been converted.
+
+    The parsed and indexed database is stored as a binary snapshot in
+    the first writable of @cache_dirs. The snapshot is used instead of
+    the json file as long as the size, modification time or content hash
+    of the json file match. Use cache_dirs=[] to disable snapshots.
+
+    The full-text and fuzzy search indexes are built on the first call
+    to search_text() and search_modules() and stored in separate cache
+    files, so they do not add to startup time. The module hierarchy is
+    built on the first toolchain query.
+
+    With @streaming the json file is parsed one package at a time and
+    the records and indexes are built as it is read, so the peak memory
+    use stays close to the size of the final database. @progress is
+    called as progress(bytes_read, total_bytes, packages) while the file
+    is read. The packages read so far can be queried from the callback.
+
+    A hash of the json text of every package is kept, so that a changed
+    json file can be compared with the loaded database and only the
+    added, changed and removed packages are updated, see reload() and
+    watch(). Without @streaming no package hashes are made and the first
+    reload updates all packages.
+
+    The json file may be compressed with gzip, bzip2, xz or, if the
+    zstandard module is installed, zstd. It is decompressed while it is
+    parsed, see lmod_stream.JsonSource.
      """
-    def __init__(self, filename="modules.json"):
+    def __init__(self, filename="modules.json", cache_dirs=None, progress=None, streaming=True):
         self._filename = filename
+        self._progress = progress
+
+        if cache_dirs is None:
+            cache_dirs = snapshot_dirs()
+
+        self._cache_dirs = cache_dirs
 
         if not os.path.exists(self._filename):
             print(f"Could not load {self._filename}")
             sys.exit(1)
 
-        with open(self._filename, "r") as f:
-            self.modules = json.load(f)
+        self._source_stat = os.stat(self._filename)
+        self._source_hash = ""
+        self._text_index = None
+        self._fuzzy_index = None
+        self._hierarchy = None
+        self._watcher = None
+        self.package_hashes = {}
+
+        with profiling.phase("lmod.load_snapshot"), gc_paused():
+            loaded = self._load_snapshot()
+
+        if loaded:
+            self._report_progress(self._source_stat.st_size)
+        else:
+            with profiling.phase("lmod.parse"), gc_paused():
+                if streaming:
+                    self._stream_modules()
+                else:
+                    hasher = hashlib.blake2b(digest_size=20)
+
+                    with lmod_stream.JsonSource(self._filename, hasher) as f:
+                        data = f.read()
+
+                    self._source_hash = hasher.hexdigest()
+                    modules = json.loads(data)
+                    del data
+
+                    self._index_modules(modules)
+
+            with profiling.phase("lmod.save_snapshot"):
+                self._save_snapshot()
+
+        print(self.module_count)
+        print(self.module_version_count)
+
+    def _share(self, value):
+        """Return a shared copy of an equal string seen during indexing"""
+        try:
+            return self._strings.setdefault(value, value)
+        except TypeError:
+            return value
+
+    def module_id(self, full_name):
+        """Return id of module full name (name/version) used in parent chains"""
+        if full_name in self._module_ids:
+            return self._module_ids[full_name]
+
+        module_id = len(self._module_names)
+        self._module_ids[full_name] = module_id
+        self._module_names.append(full_name)
+        return module_id
+
+    def module_name(self, module_id):
+        """Return module full name (name/version) of a module id"""
+        return self._module_names[module_id]
+
+    def _make_version(self, name, version):
+        """Create compact version record from json version record"""
+        share = self._share
+
+        version_name = share(version.get("versionName"))
+        full_name = share(version.get("full"))
+
+        whatis = version.get("whatis")
+        if isinstance(whatis, list):
+            whatis = tuple([share(line) for line in whatis])
+        else:
+            whatis = share(whatis)
+
+        parents = tuple([tuple([self.module_id(share(parent)) for parent in chain]) for chain in version.get("parent", [])])
+
+        extra = None
+        if not VersionRecord.keys.issuperset(version):
+            extra = {key: value for key, value in version.items() if not key in VersionRecord.keys}
+
+        return VersionRecord(name, version_name, full_name, share(version.get("path")),
+            share(version.get("description")), share(version.get("help")), whatis, parents,
+            version.get("markedDefault"), version.get("hidden"), extra)
+
+    def _make_package(self, module):
+        """Create compact package record from json package record"""
+        name = self._share(module["package"])
+
+        versions = tuple([self._make_version(name, version) for version in module["versions"]])
+
+        extra = None
+        if not PackageRecord.keys.issuperset(module):
+            extra = {key: value for key, value in module.items() if not key in PackageRecord.keys}
+
+        return PackageRecord(name, self._share(module.get("description")), self._share(module.get("defaultVersionName")), versions, extra)
+
+    def _report_progress(self, bytes_read):
+        """Call progress callback"""
+        if self._progress is not None:
+            self._progress(bytes_read, self._source_stat.st_size, self.module_count)
+
+    def _init_index(self):
+        """Create empty records, lookup dictionaries and indexes"""
 
         self.module_dict = {}
         self.module_version_dict = {}
         self.module_count = 0
         self.module_version_count = 0
 
-        for module in self.modules:
-            self.module_count += 1
-            module_name = module["package"]
-            self.module_dict[module_name] = module
-            for version in module["versions"]:
+        self._module_ids = {}
+        self._module_names = []
+        self._strings = {}
 
-                self.module_version_count += 1
+        self.name_index = lmod_search.TrigramIndex()
 
-                if "versionName" in version:
-                    module_version = version["versionName"]
+    def _index_modules(self, modules):
+        """Build records and lookup dictionaries from the parsed json"""
 
-                    if not module_name in self.module_version_dict:
-                        self.module_version_dict[module_name] = {}
-                    if not module_version in self.module_version_dict[module_name]:
-                        self.module_version_dict[module_name][module_version] = []
+        self._init_index()
 
-                    self.module_version_dict[module["package"]][module_version].append(version)
-        
-        print(self.module_count)
-        print(self.module_version_count)
+        # Records are created package by package, so the json records
+        # can be released as soon as they have been converted.
+
+        modules.reverse()
+        while len(modules) > 0:
+            self._index_package(modules.pop(), index_name=False)
+
+        self.name_index = lmod_search.TrigramIndex(self.module_dict)
+        self._strings = {}
+
+    def _stream_modules(self, report_interval=500):
+        """Build records and lookup dictionaries while reading the json file"""
+
+        self._init_index()
+
+        hasher = hashlib.blake2b(digest_size=20)
+
+        with lmod_stream.JsonSource(self._filename, hasher) as reader:
+            for module, raw in lmod_stream.iter_json_array(reader, raw=True):
+                self._index_package(module, index_name=False)
+                self._add_package_hash(self.package_hashes, module["package"], self._package_digest(raw), len(module["versions"]))
+
+                if self.module_count % report_interval == 0:
+                    self._report_progress(reader.bytes_read)
+
+            self._report_progress(reader.bytes_read)
+
+        self.name_index = lmod_search.TrigramIndex(self.module_dict)
+        self._source_hash = hasher.hexdigest()
+        self._strings = {}
+
+    def _package_digest(self, raw):
+        """Return hash of the json text of a package"""
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+    def _add_package_hash(self, package_hashes, name, digest, version_count):
+        """Record package hash and record counts, combining packages with
+        the same name"""
+        if name in package_hashes:
+            previous, packages, versions = package_hashes[name]
+            package_hashes[name] = (hashlib.blake2b(previous + digest, digest_size=16).digest(), packages + 1, versions + version_count)
+        else:
+            package_hashes[name] = (digest, 1, version_count)
+
+    def _remove_package(self, module_name):
+        """Remove all records of a package from the lookup dictionaries and indexes"""
+        package = self.module_dict.pop(module_name, None)
+
+        if package is None:
+            return
+
+        versions = self.module_version_dict.pop(module_name, {})
+
+        if self._hierarchy is not None:
+            for version_records in versions.values():
+                for version in version_records:
+                    self._hierarchy.remove_module(version.full_name())
+
+        if self._text_index is not None:
+            for version in versions:
+                self._text_index.remove_document((module_name, version))
+
+        self.name_index.remove(module_name)
+
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.remove_package(module_name, package.description or "", [version.version for version in package.versions if version.version is not None])
+
+        digest, packages, version_count = self.package_hashes.get(module_name, (None, 1, len(package.versions)))
 
+        self.module_count -= packages
+        self.module_version_count -= version_count
+
+    def _index_package(self, module, index_name=True):
+        """Add json package record to records and indexes. While loading
+        the name index is built afterwards, in sorted order."""
+        self._add_package(self._make_package(module), index_name)
+
+    def _add_package(self, package, index_name=True):
+        """Add package record to lookup dictionaries and indexes"""
+        module_name = package.name
+
+        self.module_count += 1
+        self.module_dict[module_name] = package
+
+        for version in package.versions:
+
+            self.module_version_count += 1
+
+            if version.version is not None:
+                module_version = version.version
+
+                if not module_name in self.module_version_dict:
+                    self.module_version_dict[module_name] = {}
+                if not module_version in self.module_version_dict[module_name]:
+                    self.module_version_dict[module_name][module_version] = []
+
+                self.module_version_dict[module_name][module_version].append(version)
+
+                if self._hierarchy is not None:
+                    self._hierarchy.add_module(version.full_name(), self._decode_parents(version.parents))
+
+        # Versions are kept in natural order, so that they do not have to
+        # be sorted for each query.
+
+        if len(self.module_version_dict.get(module_name, ())) > 1:
+            self.module_version_dict[module_name] = dict(sorted(self.module_version_dict[module_name].items(), key=lambda item: version_key(item[0])))
+
+        if index_name:
+            self.name_index.add(module_name)
+
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.add_package(module_name, package.description or "", [version.version for version in package.versions if version.version is not None])
+
+    def _package_info(self, package):
+        """Return package record as json (dictionary)"""
+        info = {"package": package.name}
+
+        if package.description is not None:
+            info["description"] = package.description
+        if package.default_version is not None:
+            info["defaultVersionName"] = package.default_version
+
+        info["versions"] = [self._version_info(version) for version in package.versions]
+
+        if package.extra is not None:
+            info.update(package.extra)
+
+        return info
+
+    def _decode_parents(self, parents):
+        """Return parent chains as lists of module full names"""
+        return [[self._module_names[module_id] for module_id in chain] for chain in parents]
+
+    def _version_info(self, version):
+        """Return version record as json (dictionary)"""
+        info = {}
+
+        if version.version is not None:
+            info["versionName"] = version.version
+        if version.full is not None:
+            info["full"] = version.full
+
+        for key, value in [("path", version.path), ("description", version.description), ("help", version.help),
+                ("markedDefault", version.marked_default), ("hidden", version.hidden)]:
+            if value is not None:
+                info[key] = value
+
+        if version.whatis is not None:
+            info["whatis"] = list(version.whatis) if isinstance(version.whatis, tuple) else version.whatis
+
+        if len(version.parents) > 0:
+            info["parent"] = self._decode_parents(version.parents)
+
+        if version.extra is not None:
+            info.update(version.extra)
+
+        return info
+
+    def _snapshot_state(self):
+        """Return the state stored in a snapshot"""
+        return {
+            "module_dict": self.module_dict,
+            "module_version_dict": self.module_version_dict,
+            "name_index": self.name_index,
+            "module_names": self._module_names,
+            "package_hashes": self.package_hashes,
+            "module_count": self.module_count,
+            "module_version_count": self.module_version_count
+        }
+
+    def _restore_snapshot_state(self, state):
+        """Restore state read from a snapshot"""
+        self.module_dict = state["module_dict"]
+        self.module_version_dict = state["module_version_dict"]
+        self.name_index = state["name_index"]
+        self._module_names = state["module_names"]
+        self.package_hashes = state["package_hashes"]
+        self._module_ids = {full_name: module_id for module_id, full_name in enumerate(self._module_names)}
+        self.module_count = state["module_count"]
+        self.module_version_count = state["module_version_count"]
+        self._strings = {}
+
+    def _load_snapshot(self):
+        """Load database from a valid snapshot. Returns False if none found."""
+        snapshot = self._read_cache_file("snapshot")
+
+        if snapshot is None:
+            return False
+
+        header, state = snapshot
+
+        try:
+            self._restore_snapshot_state(state)
+        except Exception:
+            return False
+
+        return True
+
+    def _save_snapshot(self):
+        """Write snapshot to the first writable cache directory"""
+        return self._write_cache_file("snapshot", self._snapshot_state())
+
+    def _package_documents(self, package):
+        """Yield (module, version) keys and text of the versions of a package"""
+        for version in package.versions:
+            if version.version is None:
+                continue
+
+            whatis = version.whatis or ""
+            if isinstance(whatis, tuple):
+                whatis = " ".join(whatis)
+
+            texts = [package.name, package.description or "", version.description or "", version.help or "", whatis]
+
+            yield (package.name, version.version), " ".join(texts)
+
+    def _text_documents(self):
+        """Yield (module, version) keys and text of all version records"""
+        for package in self.module_dict.values():
+            for key, text in self._package_documents(package):
+                yield key, text
+
+    @property
+    def fuzzy_index(self):
+        """Fuzzy search index, see _get_fuzzy_index()"""
+        return self._get_fuzzy_index()
+
+    @property
+    def hierarchy(self):
+        """Graph of the module hierarchy, built on first use"""
+        if self._hierarchy is None:
+            with profiling.phase("lmod.hierarchy"):
+                hierarchy = lmod_graph.HierarchyGraph()
+
+                for versions in self.module_version_dict.values():
+                    for version_records in versions.values():
+                        for version in version_records:
+                            hierarchy.add_module(version.full_name(), self._decode_parents(version.parents))
+
+                self._hierarchy = hierarchy
+
+        return self._hierarchy
+
+    @profiling.timed("lmod.fuzzy_index")
+    def _get_fuzzy_index(self):
+        """Return fuzzy search index, loading or building it on first use.
+        Like the full-text index it is kept in a separate cache file, so
+        it does not add to startup time."""
+        if self._fuzzy_index is not None:
+            return self._fuzzy_index
+
+        cached = self._read_cache_file("fuzzyindex")
+
+        if cached is not None:
+            self._fuzzy_index = cached[1]
+            return self._fuzzy_index
+
+        fuzzy_index = lmod_search.FuzzyIndex()
+
+        for package in self.module_dict.values():
+            fuzzy_index.add_package(package.name, package.description or "", [version.version for version in package.versions if version.version is not None])
+
+        self._fuzzy_index = fuzzy_index
+        self._write_cache_file("fuzzyindex", fuzzy_index)
+
+        return self._fuzzy_index
+
+    @profiling.timed("lmod.text_index")
+    def _get_text_index(self):
+        """Return full-text index, loading or building it on first use"""
+        if self._text_index is not None:
+            return self._text_index
+
+        cached = self._read_cache_file("textindex")
+
+        if cached is not None:
+            self._text_index = cached[1]
+            return self._text_index
+
+        self._text_index = lmod_search.BM25Index()
+
+        for key, text in self._text_documents():
+            self._text_index.add_document(key, text)
+
+        self._write_cache_file("textindex", self._text_index)
+
+        return self._text_index
+
+    @profiling.timed("lmod.scan_changes")
+    def scan_changes(self):
+        """Compare the json file with the loaded database
+
+        Returns None if the file has not been modified or can not be
+        read, otherwise a ModuleChanges. Only the json records of added
+        and changed packages are kept. The database itself is not
+        modified, so this can run in a background thread.
+        """
+        base_stat = self._source_stat
+        package_hashes_loaded = self.package_hashes
+        module_names = set(self.module_dict)
+
+        try:
+            stat = os.stat(self._filename)
+        except OSError:
+            return None
+
+        if (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (base_stat.st_size, base_stat.st_mtime_ns, base_stat.st_ino):
+            return None
+
+        hasher = hashlib.blake2b(digest_size=20)
+        package_hashes = {}
+        modules = {}
+
+        try:
+            with lmod_stream.JsonSource(self._filename, hasher) as reader:
+                for module, raw in lmod_stream.iter_json_array(reader, raw=True):
+                    module_name = module["package"]
+                    digest = self._package_digest(raw)
+
+                    # A second package with the same name, the first was
+                    # unchanged and is taken from the loaded records.
+
+                    if module_name in package_hashes and not module_name in modules:
+                        modules[module_name] = [self._package_info(self.module_dict[module_name])]
+
+                    self._add_package_hash(package_hashes, module_name, digest, len(module["versions"]))
+
+                    if module_name in modules:
+                        modules[module_name].append(module)
+                    elif package_hashes_loaded.get(module_name, (None,))[0] != digest:
+                        modules[module_name] = [module]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print("Could not read %s: %s" % (self._filename, e))
+            return None
+
+        added = []
+        changed = []
+
+        for module_name in list(modules):
+            if not module_name in module_names:
+                added.append(module_name)
+            elif package_hashes[module_name] != package_hashes_loaded.get(module_name):
+                changed.append(module_name)
+            else:
+                del modules[module_name]
+
+        removed = sorted([module_name for module_name in module_names if not module_name in package_hashes])
+
+        return ModuleChanges(base_stat, stat, hasher.hexdigest(), package_hashes, modules, added, changed, removed)
+
+    @profiling.timed("lmod.apply_changes")
+    def apply_changes(self, changes):
+        """Update records and indexes with changes from scan_changes()
+
+        Only the added, changed and removed packages are updated. The
+        snapshot is rewritten afterwards. Returns False if nothing
+        changed.
+        """
+
+        # The changes were made against an earlier state of the database.
+
+        if changes.base_stat != self._source_stat:
+            changes = self.scan_changes()
+            if changes is None:
+                return False
+
+        # The new records are created before anything is removed, so that
+        # a broken json record leaves the database as it was.
+
+        try:
+            packages = {module_name: [self._make_package(module) for module in changes.modules[module_name]]
+                for module_name in changes.changed + changes.added}
+        finally:
+            self._strings = {}
+
+        for module_name in changes.removed + changes.changed + changes.added:
+            self._remove_package(module_name)
+
+        for module_name in changes.changed + changes.added:
+            for package in packages[module_name]:
+                self._add_package(package)
+
+            if self._text_index is not None:
+                for key, text in self._package_documents(self.module_dict[module_name]):
+                    self._text_index.add_document(key, text)
+
+        self.package_hashes = changes.package_hashes
+        self._source_stat = changes.stat
+        self._source_hash = changes.source_hash
+
+        self._save_snapshot()
+
+        if self._text_index is not None:
+            self._write_cache_file("textindex", self._text_index)
+
+        if self._fuzzy_index is not None:
+            self._write_cache_file("fuzzyindex", self._fuzzy_index)
+
+        return len(changes) > 0
+
+    def reload(self):
+        """Update the database from a modified json file. Returns True if
+        any package changed."""
+        changes = self.scan_changes()
+
+        if changes is None:
+            return False
+
+        return self.apply_changes(changes)
+
+    def watch(self, callback, interval=2.0):
+        """Call @callback() from a background thread when the json file
+        has been modified. The callback is expected to call reload() or
+        scan_changes() and apply_changes()."""
+        from . import lmod_watch
+
+        if self._watcher is not None:
+            self._watcher.stop()
+
+        self._watcher = lmod_watch.FileWatcher(self._filename, callback, interval)
+        self._watcher.start()
+
+        return self._watcher
 
     def find_versions(self, module):
-        """Find versions of specific module."""
+        """Find versions of specific module, in natural version order."""
         versions = []
         for version in self.module_version_dict[module].keys():
             versions.append(version)
@@ -64,65 +891,101 @@ class LmodDB(object):
         """Find module source"""
         if module in self.module_version_dict:
             if version in self.module_version_dict[module]:
-                return self.module_version_dict[module][version]["path"]
-            
+                return self.module_version_dict[module][version][0].path or ""
+
         return ""
 
+    @profiling.timed("lmod.find_parents")
     def find_parents(self, module, version):
         """Find module parents (dependencies)"""
         module_parents = []
         if module in self.module_version_dict:
             if version in self.module_version_dict[module]:
-                for parents in self.module_version_dict[module][version]:
-                    if "parent" in parents:
-                        for parent in parents["parent"]:
-                            module_parents.append(parent)
+                for version_record in self.module_version_dict[module][version]:
+                    module_parents.extend(self._decode_parents(version_record.parents))
                 return module_parents
         
         return []
 
+    def find_available(self, loaded=(), include_core=True):
+        """Find modules (name/version) that can be loaded once the modules
+        in @loaded, e.g. ["GCC/12.3.0", "OpenMPI/4.1.5"], are loaded."""
+        return self.hierarchy.available(loaded, include_core)
+
+    def find_toolchains(self, module, version=""):
+        """Find parent chains (toolchains) in which a module exists. Use
+        @version to limit to a specific version."""
+        if version != "":
+            full_names = [self._full_name(module, version)]
+        else:
+            full_names = [self._full_name(module, version) for version in self.module_version_dict.get(module, {})]
+        return [list(chain) for chain in self.hierarchy.find_toolchains(full_names)]
+
+    def list_toolchains(self):
+        """List all parent chains (toolchains) in the hierarchy"""
+        return [list(chain) for chain in self.hierarchy.list_toolchains()]
+
+    def find_toolchain_modules(self, toolchain):
+        """Find modules made available by exactly the modules in @toolchain"""
+        return self.hierarchy.unlocked_by(toolchain)
+
+    def find_children(self, full_name=""):
+        """Find modules directly below @full_name (name/version) in the
+        hierarchy, e.g. the MPI libraries and packages built with a
+        compiler. By default the modules of the Core level."""
+        return self.hierarchy.find_children(full_name)
+
+    def _full_name(self, module, version):
+        """Return full module name (name/version) as used in parent chains"""
+        if module in self.module_version_dict and version in self.module_version_dict[module]:
+            return self.module_version_dict[module][version][0].full_name()
+        return "%s/%s" % (module, version)
+
+    @profiling.timed("lmod.find_version_info")
     def find_version_info(self, module):
         """Find version information on specific module."""
         versions = []
-        for version in self.module_dict[module]["versions"]:
-            versions.append(version)
+        for version in self.module_dict[module].versions:
+            versions.append(self._version_info(version))
         return versions
 
+    @profiling.timed("lmod.find_modules")
     def find_modules(self, name=""):
-        """Find modules in tree. Use @name to filter modules."""
+        """Find modules in tree, sorted by name. Use @name to filter modules."""
+        return self.name_index.search(name)
+
+    @profiling.timed("lmod.search_modules")
+    def search_modules(self, query, limit=50):
+        """Ranked fuzzy search over module names, descriptions and versions.
+        Returns at most @limit module names, best match first."""
+        return [name for name, score in self.fuzzy_index.search(query, limit)]
+
+    @profiling.timed("lmod.search_text")
+    def search_text(self, query, limit=50):
+        """BM25 ranked full-text search over descriptions, help and whatis
+        text of all versions. Returns at most @limit module names, best
+        match first."""
         module_names = []
 
-        for module in self.modules:
-            if name=="":
-                module_names.append(module["package"])
-            else:
-                if name in module["package"]:
-                    module_names.append(module["package"])
-                elif name.upper() in module["package"].upper():
-                    module_names.append(module["package"])
-                elif name.lower() in module["package"].lower():
-                    module_names.append(module["package"])
-
-                #if name == module["package"][0:len(name)]:
-                #    module_names.append(module["package"])
-                #elif name.upper() == module["package"][0:len(name)]:
-                #    module_names.append(module["package"])
-                #elif name.lower() == module["package"][0:len(name)]:
-                #    module_names.append(module["package"])
+        for (module, version), score in self._get_text_index().search(query, 4 * limit):
+            if not module in module_names:
+                module_names.append(module)
+                if len(module_names) == limit:
+                    break
 
         return module_names
 
     def find_description(self, module):
         """Find module descriptions."""
         try:
-            return self.module_dict[module]["description"]
+            return self.module_dict[module].description or ""
         except:
             return ""
 
     def find_default_version(self, module):
         """Return default version of specific module"""
         try:
-            return self.module_dict[module]["defaultVersionName"]
+            return self.module_dict[module].default_version or ""
         except:
             return ""
 
@@ -0,0 +1,347 @@
+#!/bin/env python
+"""Shared LmodDB query daemon
+
+The daemon loads the LMOD database once and answers queries from
+ml-browse clients over a Unix domain socket, so that users on the same
+login node share a single copy of the database and its indexes.
+
+The protocol is one json object per line. A request is
+{"method": name, "args": [...]} and the reply is {"result": value} or
+{"error": exception name, "message": message}.
+"""
+
+import os
+import sys
+import json
+import struct
+import socket
+import argparse
+import threading
+import socketserver
+
+from . import lmod
+from . import config
+
+# Queries that are served. All of them are read-only.
+
+QUERY_METHODS = [
+    "find_modules",
+    "find_versions",
+    "find_parents",
+    "find_description",
+    "find_default_version",
+    "find_version_info",
+    "find_module_source",
+    "find_available",
+    "find_toolchains",
+    "list_toolchains",
+    "find_toolchain_modules",
+    "find_children",
+    "search_modules",
+    "search_text"
+    ]
+
+
+def print_error(msg):
+    """Print error message"""
+    print("Error: %s" % msg, file=sys.stderr)
+
+
+class LmodRequestHandler(socketserver.StreamRequestHandler):
+    """Answer json line requests from a single client"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                reply = {"result": self.server.query(request["method"], request.get("args", []))}
+            except Exception as e:
+                reply = {"error": e.__class__.__name__, "message": str(e.args[0]) if e.args else ""}
+
+            try:
+                self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            except OSError:
+                break
+
+
+class LmodServer(socketserver.ThreadingUnixStreamServer):
+    """Unix domain socket server sharing a single LmodDB"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.socket_path = socket_path
+        self.filename = os.path.realpath(db._filename)
+
+        remove_stale_socket(socket_path)
+
+        socketserver.ThreadingUnixStreamServer.__init__(self, socket_path, LmodRequestHandler)
+
+        # All users on the node may query the database.
+
+        os.chmod(socket_path, 0o666)
+
+    def query(self, method, args):
+        """Run query @method on the database"""
+        if method == "stats":
+            with self.lock:
+                return {
+                    "filename": self.filename,
+                    "module_count": self.db.module_count,
+                    "module_version_count": self.db.module_version_count
+                    }
+
+        if not method in QUERY_METHODS:
+            raise KeyError("Unknown method %s" % method)
+
+        with self.lock:
+            return getattr(self.db, method)(*args)
+
+    def reload(self):
+        """Apply changes of the json file, called from the watcher thread"""
+        changes = self.db.scan_changes()
+
+        if changes is None:
+            return
+
+        with self.lock:
+            if self.db.apply_changes(changes):
+                print("Reloaded %s: %d added, %d changed, %d removed" % (self.db._filename, len(changes.added), len(changes.changed), len(changes.removed)))
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def trusted_uids(daemon_user=""):
+    """Return user ids a daemon may run as: root, the current user and
+    @daemon_user, a user name or id"""
+    uids = {0, os.getuid()}
+
+    if daemon_user != "":
+        if daemon_user.isdigit():
+            uids.add(int(daemon_user))
+        else:
+            import pwd
+            try:
+                uids.add(pwd.getpwnam(daemon_user).pw_uid)
+            except KeyError:
+                raise ValueError("Unknown daemon user %s" % daemon_user)
+
+    return uids
+
+
+def check_socket_dir(socket_path, uids):
+    """Raise PermissionError unless the directory of @socket_path is owned
+    by one of @uids, so that no other user can replace the socket"""
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    owner = os.stat(directory).st_uid
+
+    if not owner in uids:
+        raise PermissionError("%s is owned by user id %d" % (directory, owner))
+
+
+def check_peer(sock, uids):
+    """Raise PermissionError unless the process listening on the other end
+    of the Unix domain socket @sock runs as one of @uids"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        raise PermissionError("Peer credentials not available on this platform")
+
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i", credentials)
+
+    if not uid in uids:
+        raise PermissionError("Daemon runs as user id %d" % uid)
+
+
+def remove_stale_socket(socket_path):
+    """Remove a socket file left by a daemon that is no longer running"""
+    if not os.path.exists(socket_path):
+        return
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise OSError("A daemon is already listening on %s" % socket_path)
+    finally:
+        s.close()
+
+
+class LmodClient(object):
+    """LmodDB interface to a running query daemon
+
+    Provides the query methods of LmodDB. Queries from several threads
+    are serialized over the single connection. The daemon must run as
+    one of @uids, if given.
+
+    If the connection fails after connecting, e.g. because the daemon
+    was stopped, the error is reported and the queries are answered by
+    an LmodDB loaded in this process from @filename and @cache_dirs.
+    """
+    def __init__(self, socket_path, timeout=10.0, uids=None, filename="", cache_dirs=None):
+        self.socket_path = socket_path
+        self._lock = threading.Lock()
+        self._local_filename = filename
+        self._cache_dirs = cache_dirs
+        self._local_db = None
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+
+        try:
+            self._socket.connect(socket_path)
+            if uids is not None:
+                check_peer(self._socket, uids)
+        except OSError:
+            self._socket.close()
+            raise
+
+        self._file = self._socket.makefile("rwb")
+
+        self.filename = self._request("stats")["filename"]
+
+    @property
+    def module_count(self):
+        """Number of packages, as currently loaded by the daemon"""
+        return self._call("stats")["module_count"]
+
+    @property
+    def module_version_count(self):
+        """Number of versions, as currently loaded by the daemon"""
+        return self._call("stats")["module_version_count"]
+
+    def _local(self):
+        """Return the LmodDB used when the daemon is gone, loading it on first use"""
+        with self._lock:
+            if self._local_db is None:
+                from . import lmod
+                self._local_db = lmod.LmodDB(self._local_filename or self.filename, self._cache_dirs)
+            return self._local_db
+
+    def _call(self, method, *args):
+        """Send a query to the daemon and return the result, or answer it
+        locally if the connection to the daemon fails"""
+        if self._local_db is None:
+            try:
+                return self._request(method, *args)
+            except (OSError, ValueError) as e:
+                print_error("Query daemon at %s failed, loading the database (%s)" % (self.socket_path, e))
+                self.close()
+
+        db = self._local()
+
+        if method == "stats":
+            return {"filename": self.filename, "module_count": db.module_count, "module_version_count": db.module_version_count}
+
+        return getattr(db, method)(*args)
+
+    def _request(self, method, *args):
+        """Send a query to the daemon and return the result"""
+        request = json.dumps({"method": method, "args": list(args)}).encode("utf-8") + b"\n"
+
+        with self._lock:
+            self._file.write(request)
+            self._file.flush()
+            line = self._file.readline()
+
+        if line == b"":
+            raise OSError("Connection to %s closed" % self.socket_path)
+
+        reply = json.loads(line)
+
+        if "error" in reply:
+            if reply["error"] == "KeyError":
+                raise KeyError(reply["message"])
+            raise RuntimeError("%s: %s" % (reply["error"], reply["message"]))
+
+        return reply["result"]
+
+    def __getattr__(self, name):
+        if name in QUERY_METHODS:
+            return lambda *args: self._call(name, *args)
+        raise AttributeError(name)
+
+    def close(self):
+        """Close connection to the daemon"""
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._socket.close()
+
+
+def connect(socket_path, filename, cache_dirs=None, daemon_user=""):
+    """Return a client for the daemon at @socket_path, or None if no
+    daemon serving @filename is running. The socket must be in a
+    directory owned by, and the daemon run as, root, the current user or
+    @daemon_user."""
+    if socket_path == "" or not os.path.exists(socket_path):
+        return None
+
+    try:
+        uids = trusted_uids(daemon_user)
+        check_socket_dir(socket_path, uids)
+        client = LmodClient(socket_path, uids=uids, filename=filename, cache_dirs=cache_dirs)
+    except (OSError, ValueError, KeyError, RuntimeError) as e:
+        print_error("Query daemon at %s not available (%s)" % (socket_path, e))
+        return None
+
+    if client.filename != os.path.realpath(filename):
+        print_error("Query daemon at %s serves %s" % (socket_path, client.filename))
+        client.close()
+        return None
+
+    return client
+
+
+def main(argv=None, prog="ml-browse daemon"):
+    """Run the query daemon until interrupted"""
+
+    parser = argparse.ArgumentParser(prog=prog, description="Serve LMOD database queries over a Unix domain socket")
+    parser.add_argument("--socket", dest="socket_path", action="store", default="", help="Socket path, default from the daemon_socket option.")
+    parser.add_argument("--modules-json", dest="modules_json_file", action="store", default="", help="LMOD json database to serve instead of the configured one.")
+    args = parser.parse_args(argv)
+
+    cfg = config.MlBrowseConfig.create()
+
+    socket_path = args.socket_path or cfg.daemon_socket
+    modules_json_file = args.modules_json_file or cfg.modules_json_file
+
+    if socket_path == "":
+        print_error("No socket given, use --socket or the daemon_socket option")
+        return 1
+
+    db = lmod.LmodDB(modules_json_file, lmod.snapshot_dirs(cfg.snapshot_dir))
+
+    # Build the search indexes and the hierarchy before the request
+    # threads may need them.
+
+    db._get_text_index()
+    db._get_fuzzy_index()
+    db.hierarchy
+
+    try:
+        server = LmodServer(socket_path, db)
+    except OSError as e:
+        print_error(e)
+        return 1
+
+    db.watch(server.reload)
+
+    print("Serving %s on %s" % (modules_json_file, socket_path))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
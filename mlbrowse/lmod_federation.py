@@ -0,0 +1,275 @@
+#!/bin/env python
+"""Federated LMOD json-databases of several clusters or architectures"""
+
+import os
+import sys
+import hashlib
+import threading
+
+from . import lmod
+from . import lmod_search
+from . import lmod_stream
+from . import profiling
+
+
+def print_error(msg):
+    """Print error message"""
+    print("Error: %s" % msg, file=sys.stderr)
+
+
+class SourceCatalog(lmod.CacheFiles):
+    """Package names, descriptions and versions of a json-database
+
+    The catalog is read from the json file one package at a time without
+    building the records of LmodDB, and is kept as a cache file next to
+    the snapshot of the database. @packages maps package names to
+    (description, default version, versions in natural order).
+    """
+    def __init__(self, filename, cache_dirs):
+        self._filename = filename
+        self._cache_dirs = cache_dirs
+        self._source_stat = os.stat(filename)
+        self._source_hash = ""
+
+        cached = self._read_cache_file("catalog")
+
+        if cached is not None:
+            header, self.packages = cached
+        else:
+            self.packages = self._read_packages()
+            self._write_cache_file("catalog", self.packages)
+
+    def _read_packages(self):
+        """Return catalog read from the json file"""
+        packages = {}
+        hasher = hashlib.blake2b(digest_size=20)
+
+        with lmod_stream.JsonSource(self._filename, hasher) as reader:
+            for module in lmod_stream.iter_json_array(reader):
+                name = module["package"]
+                versions = [version["versionName"] for version in module["versions"] if version.get("versionName") is not None]
+
+                # Packages with the same name are combined, as in LmodDB
+                # the description and default version of the last one are
+                # used.
+
+                if name in packages:
+                    packages[name] = (module.get("description"), module.get("defaultVersionName"), packages[name][2] + versions)
+                else:
+                    packages[name] = (module.get("description"), module.get("defaultVersionName"), versions)
+
+        self._source_hash = hasher.hexdigest()
+
+        for name, (description, default_version, versions) in packages.items():
+            packages[name] = (description, default_version, tuple(sorted(set(versions), key=lmod.version_key)))
+
+        return packages
+
+
+class Source(object):
+    """Named json-database, e.g. of a cluster or an architecture"""
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+        self.catalog = None
+        self.name_index = None
+        self.fuzzy_index = None
+        self.db = None
+
+
+class FederatedDB(object):
+    """Module databases of several clusters or architectures
+
+    @sources maps source names to json-database files, in the order
+    they are listed. Nothing is read until the first query. Queries on
+    names, versions and availability are answered from the catalog of
+    each source, a cache of package names, descriptions and versions,
+    and a single name and fuzzy index shared by all sources. Queries
+    given a @source only read the catalog of that source and use
+    indexes of their own. The full LmodDB of a source, needed for
+    parents and version details, is only loaded when it is asked for and
+    can be released with unload().
+
+    A source that cannot be read is reported and treated as empty.
+    """
+    def __init__(self, sources, cache_dirs=None):
+        if cache_dirs is None:
+            cache_dirs = lmod.snapshot_dirs()
+
+        self._cache_dirs = cache_dirs
+        self._sources = {name: Source(name, filename) for name, filename in sources.items()}
+        self._lock = threading.RLock()
+
+        self.name_index = None
+        self.fuzzy_index = None
+        self.package_sources = None
+
+    @property
+    def sources(self):
+        """Names of the sources"""
+        return list(self._sources)
+
+    def _source(self, name):
+        """Return source @name"""
+        if not name in self._sources:
+            raise KeyError(name)
+        return self._sources[name]
+
+    def _catalog(self, source):
+        """Return catalog of @source, reading it on first use"""
+        with self._lock:
+            if source.catalog is None:
+                with profiling.phase("federation.load_catalog"):
+                    try:
+                        source.catalog = SourceCatalog(source.filename, self._cache_dirs).packages
+                    except (OSError, ValueError, KeyError) as e:
+                        print_error("Could not read source %s: %s" % (source.name, e))
+                        source.catalog = {}
+
+            return source.catalog
+
+    def _package_sources(self):
+        """Return the names of the sources providing each package, reading
+        the catalogs of all sources"""
+        with self._lock:
+            if self.package_sources is None:
+                package_sources = {}
+
+                for source in self._sources.values():
+                    for name in self._catalog(source):
+                        package_sources.setdefault(name, []).append(source.name)
+
+                self.package_sources = package_sources
+
+            return self.package_sources
+
+    def _build_index(self):
+        """Build the indexes shared by all sources"""
+        with self._lock:
+            if self.name_index is not None:
+                return
+
+            with profiling.phase("federation.build_index"):
+                package_sources = self._package_sources()
+                fuzzy_index = lmod_search.FuzzyIndex()
+
+                for name, sources in package_sources.items():
+                    packages = [self._catalog(self._sources[source])[name] for source in sources]
+                    versions = set()
+                    for description, default_version, source_versions in packages:
+                        versions.update(source_versions)
+                    fuzzy_index.add_package(name, packages[0][0] or "", versions)
+
+                self.fuzzy_index = fuzzy_index
+                self.name_index = lmod_search.TrigramIndex(package_sources)
+
+    def _source_index(self, name):
+        """Return source @name with its name and fuzzy index, building them
+        from its catalog on first use"""
+        source = self._source(name)
+
+        with self._lock:
+            if source.name_index is None:
+                catalog = self._catalog(source)
+                fuzzy_index = lmod_search.FuzzyIndex()
+
+                for package, (description, default_version, versions) in catalog.items():
+                    fuzzy_index.add_package(package, description or "", versions)
+
+                source.fuzzy_index = fuzzy_index
+                source.name_index = lmod_search.TrigramIndex(catalog)
+
+        return source
+
+    def database(self, source):
+        """Return LmodDB of @source, loading it on first use"""
+        source = self._source(source)
+
+        with self._lock:
+            if source.db is None:
+                with profiling.phase("federation.load_source"):
+                    source.db = lmod.LmodDB(source.filename, self._cache_dirs)
+
+            return source.db
+
+    def unload(self, source=""):
+        """Release the LmodDB of @source, of all sources if not given"""
+        with self._lock:
+            for name in [source] if source != "" else self._sources:
+                self._source(name).db = None
+
+    def find_modules(self, name="", source=""):
+        """Find modules of all sources, or of @source, sorted by name. Use
+        @name to filter modules."""
+        if source != "":
+            return self._source_index(source).name_index.search(name)
+
+        self._build_index()
+        return self.name_index.search(name)
+
+    def search_modules(self, query, limit=50, source=""):
+        """Ranked fuzzy search over the modules of all sources, or of @source"""
+        if source != "":
+            fuzzy_index = self._source_index(source).fuzzy_index
+        else:
+            self._build_index()
+            fuzzy_index = self.fuzzy_index
+
+        return [name for name, score in fuzzy_index.search(query, limit)]
+
+    def find_versions(self, module, source=""):
+        """Find versions of a module in any source, or in @source, in
+        natural version order"""
+        if source != "":
+            return list(self._catalog(self._source(source))[module][2])
+
+        versions = set()
+        for name in self._package_sources()[module]:
+            versions.update(self._catalog(self._sources[name])[module][2])
+
+        return sorted(versions, key=lmod.version_key)
+
+    def find_sources(self, module, version=""):
+        """Find sources providing @module, or a specific @version of it"""
+        sources = []
+        for name in self._package_sources().get(module, []):
+            if version == "" or version in self._catalog(self._sources[name])[module][2]:
+                sources.append(name)
+
+        return sources
+
+    def find_availability(self, module):
+        """Return (version, sources) pairs of @module in natural version order"""
+        return [(version, self.find_sources(module, version)) for version in self.find_versions(module)]
+
+    def find_description(self, module, source=""):
+        """Find module description in @source, by default of the first
+        source providing it"""
+        if source != "":
+            catalog = self._catalog(self._source(source))
+            return (catalog[module][0] or "") if module in catalog else ""
+
+        for name in self._package_sources().get(module, []):
+            description = self._catalog(self._sources[name])[module][0]
+            if description:
+                return description
+
+        return ""
+
+    def find_default_version(self, module, source=""):
+        """Return default version of a module in @source, by default the
+        first source providing it"""
+        for name in [source] if source != "" else self._package_sources().get(module, []):
+            catalog = self._catalog(self._source(name))
+            if module in catalog:
+                return catalog[module][1] or ""
+
+        return ""
+
+    def find_parents(self, module, version, source):
+        """Find module parents (dependencies) in @source"""
+        return self.database(source).find_parents(module, version)
+
+    def find_version_info(self, module, source):
+        """Find version information on a module in @source"""
+        return self.database(source).find_version_info(module)
@@ -0,0 +1,90 @@
+#!/bin/env python
+"""Graph of the LMOD module hierarchy"""
+
+CORE = ""
+
+
+class HierarchyGraph(object):
+    """Directed graph of the LMOD module hierarchy
+
+    The graph is built from the parent chains of all version records,
+    e.g. Core -> GCC/12.3.0 -> OpenMPI/4.1.5 -> FFTW/3.3.10. Every
+    distinct chain (toolchain) maps to the modules it makes loadable.
+    The edges of the graph follow from the ordered toolchains, so only
+    the toolchains are stored. Queries look at the toolchains, which are
+    far fewer than the modules. Modules without parents are available
+    from the Core toolchain, the empty chain.
+    """
+    def __init__(self):
+        self.toolchains = {}
+        self.toolchain_order = {}
+
+    def add_module(self, full_name, parents=()):
+        """Add module @full_name reachable through @parents chains"""
+        chains = [tuple(chain) for chain in parents]
+
+        if len(chains) == 0:
+            chains = [()]
+
+        for chain in chains:
+            key = frozenset(chain)
+
+            if key in self.toolchains:
+                self.toolchains[key].add(full_name)
+            else:
+                self.toolchains[key] = {full_name}
+                self.toolchain_order[key] = chain
+
+    def remove_module(self, full_name):
+        """Remove module @full_name from all toolchains"""
+        for key in [key for key, full_names in self.toolchains.items() if full_name in full_names]:
+            self.toolchains[key].discard(full_name)
+            if len(self.toolchains[key]) == 0:
+                del self.toolchains[key]
+                del self.toolchain_order[key]
+
+    def available(self, loaded=(), include_core=True):
+        """Return sorted list of modules loadable once @loaded are loaded"""
+        loaded = frozenset(loaded)
+        modules = set()
+
+        for key, full_names in self.toolchains.items():
+            if len(key) == 0 and not include_core:
+                continue
+            if key <= loaded:
+                modules.update(full_names)
+
+        return sorted(modules)
+
+    def unlocked_by(self, toolchain):
+        """Return sorted list of modules made loadable by exactly @toolchain"""
+        return sorted(self.toolchains.get(frozenset(toolchain), ()))
+
+    def list_toolchains(self):
+        """Return all toolchains as ordered tuples"""
+        return sorted(self.toolchain_order.values(), key=lambda chain: (len(chain), chain))
+
+    def find_toolchains(self, full_names):
+        """Return toolchains in which any of the modules in @full_names exist"""
+        chains = []
+
+        for key, unlocked in self.toolchains.items():
+            if not unlocked.isdisjoint(full_names):
+                chains.append(self.toolchain_order[key])
+
+        return sorted(chains, key=lambda chain: (len(chain), chain))
+
+    def find_children(self, full_name=CORE):
+        """Return modules directly below @full_name in the hierarchy"""
+        children = set()
+
+        for key, chain in self.toolchain_order.items():
+            nodes = (CORE,) + chain
+            for i, node in enumerate(nodes):
+                if node == full_name:
+                    if i + 1 < len(nodes):
+                        children.add(nodes[i + 1])
+                    else:
+                        children.update(self.toolchains[key])
+
+        return sorted(children)
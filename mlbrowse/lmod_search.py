@@ -0,0 +1,531 @@
+#!/bin/env python
+"""Search indexes used by the LMOD json-database"""
+
+import re
+import bisect
+import heapq
+import collections
+import math
+
+token_re = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text):
+    """Return the set of trigrams in @text"""
+    return {text[i:i+3] for i in range(len(text)-2)}
+
+def name_matches(name, package):
+    """Substring match used by LmodDB.find_modules"""
+    if name in package:
+        return True
+    elif name.upper() in package.upper():
+        return True
+    elif name.lower() in package.lower():
+        return True
+    return False
+
+
+class TrigramIndex(object):
+    """Inverted trigram index over module names
+
+    Names are case folded with lower() and split into trigrams. Each
+    trigram maps to a posting set of name ids. A query is answered by
+    intersecting the posting sets of its trigrams and checking the
+    remaining candidates with name_matches(), so the result is exactly
+    the same as a linear scan.
+
+    Non-ASCII names are always checked, as the upper case comparison in
+    name_matches() can match them without a common lower case trigram
+    (e.g. "ß" and "ss").
+
+    Queries shorter than a trigram fall back to a scan of the folded
+    names. Their results are cached as there are only a few of them.
+
+    Name ids are assigned in sorted name order, so results are sorted
+    without sorting them for each query. Names added out of order, when
+    a database is reloaded, renumber the index at the next search.
+    """
+    def __init__(self, names=()):
+        self.names = []
+        self.folded = []
+        self.ids = {}
+        self.postings = {}
+        self.irregular = set()
+        self.ordered = True
+        self._short_results = {}
+
+        for name in sorted(names):
+            self.add(name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_short_results"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, name):
+        """Add name to index"""
+        if name in self.ids:
+            return
+
+        name_id = len(self.names)
+        folded = name.lower()
+
+        self._short_results.clear()
+
+        if self.ordered and len(self.ids) > 0 and name < self._last_name():
+            self.ordered = False
+
+        self.names.append(name)
+        self.folded.append(folded)
+        self.ids[name] = name_id
+
+        for trigram in trigrams(folded):
+            if trigram in self.postings:
+                self.postings[trigram].add(name_id)
+            else:
+                self.postings[trigram] = {name_id}
+
+        if not name.isascii():
+            self.irregular.add(name_id)
+
+    def remove(self, name):
+        """Remove name from index"""
+        if not name in self.ids:
+            return
+
+        name_id = self.ids.pop(name)
+
+        self._short_results.clear()
+
+        for trigram in trigrams(self.folded[name_id]):
+            postings = self.postings[trigram]
+            postings.discard(name_id)
+            if len(postings) == 0:
+                del self.postings[trigram]
+
+        self.irregular.discard(name_id)
+        self.names[name_id] = None
+        self.folded[name_id] = None
+
+    def _last_name(self):
+        """Return the name with the highest id"""
+        for name in reversed(self.names):
+            if name is not None:
+                return name
+        return ""
+
+    def _renumber(self):
+        """Rebuild index with ids in sorted name order"""
+        names = sorted(self.ids)
+
+        self.__init__()
+
+        for name in names:
+            self.add(name)
+
+    def _candidates(self, query):
+        """Return candidate ids for query, None if all names are candidates"""
+        if len(query) < 3 or not query.isascii():
+            return None
+
+        posting_sets = []
+
+        for trigram in trigrams(query.lower()):
+            if not trigram in self.postings:
+                return set(self.irregular)
+            posting_sets.append(self.postings[trigram])
+
+        posting_sets.sort(key=len)
+
+        candidates = posting_sets[0].intersection(*posting_sets[1:])
+        candidates.update(self.irregular)
+
+        return candidates
+
+    def search(self, query=""):
+        """Return names matching @query in sorted order"""
+        if not self.ordered:
+            self._renumber()
+
+        if query == "":
+            return [name for name in self.names if name is not None]
+
+        candidates = self._candidates(query)
+
+        if candidates is None:
+            if query in self._short_results:
+                return list(self._short_results[query])
+
+            if query.isascii():
+                folded_query = query.lower()
+                results = [self.names[i] for i, folded in enumerate(self.folded)
+                    if folded is not None and (folded_query in folded or (i in self.irregular and name_matches(query, self.names[i])))]
+            else:
+                results = [name for name in self.names if name is not None and name_matches(query, name)]
+
+            if len(query) < 3:
+                self._short_results[query] = results
+
+            return list(results)
+
+        return [self.names[i] for i in sorted(candidates) if name_matches(query, self.names[i])]
+
+
+def tokenize(text):
+    """Split text into lower case alphanumeric tokens"""
+    return token_re.findall(text.lower())
+
+def bigrams(token):
+    """Return the set of padded bigrams in @token"""
+    padded = "^" + token + "$"
+    return {padded[i:i+2] for i in range(len(padded)-1)}
+
+def bounded_edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance+1 if larger"""
+    if abs(len(a)-len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b)+1))
+
+    for i in range(1, len(a)+1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b)+1):
+            cost = 0 if a[i-1] == b[j-1] else 1
+            current[j] = min(previous[j] + 1, current[j-1] + 1, previous[j-1] + cost)
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return min(previous[-1], max_distance + 1)
+
+
+class FuzzyIndex(object):
+    """Ranked fuzzy search over package names, descriptions and versions
+
+    Every package is split into tokens from its name, its versionName
+    strings and its description. A query token matches a token in the
+    vocabulary exactly, as a prefix or within a small edit distance.
+    Candidates for the edit distance test are found with a padded bigram
+    count filter over the vocabulary, so only a few tokens are compared.
+
+    Packages are ranked by the number of query tokens they match and
+    then by score, where name matches weigh more than version and
+    description matches.
+    """
+
+    FIELD_NAME = 0
+    FIELD_VERSION = 1
+    FIELD_DESCRIPTION = 2
+
+    field_weights = (3.0, 1.5, 1.0)
+
+    exact_score = 1.0
+    prefix_score = 0.7
+    fuzzy_score = 0.5
+
+    max_prefix_tokens = 64
+
+    def __init__(self):
+        self.tokens = {}
+        self.token_bigrams = {}
+        self._sorted_vocab = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_sorted_vocab"] = None
+        return state
+
+    def _package_tokens(self, name, description, versions):
+        """Return token -> best field for a package"""
+        package_tokens = {}
+
+        for field, texts in [(self.FIELD_DESCRIPTION, [description]), (self.FIELD_VERSION, versions), (self.FIELD_NAME, [name])]:
+            for text in texts:
+                for token in tokenize(text):
+                    package_tokens[token] = field
+
+        # The whole folded name is a token too, so that "openmpi" also
+        # matches names like "Open-MPI".
+
+        folded_name = "".join(tokenize(name))
+        if folded_name != "":
+            package_tokens[folded_name] = self.FIELD_NAME
+
+        return package_tokens
+
+    def add_package(self, name, description="", versions=()):
+        """Add package with description and version names to index"""
+        for token, field in self._package_tokens(name, description, versions).items():
+            if not token in self.tokens:
+                self.tokens[token] = [None, None, None]
+                self._sorted_vocab = None
+                for bigram in bigrams(token):
+                    if bigram in self.token_bigrams:
+                        self.token_bigrams[bigram].add(token)
+                    else:
+                        self.token_bigrams[bigram] = {token}
+
+            # Most tokens belong to a single package, which is stored
+            # as is until a second package needs a set.
+
+            postings = self.tokens[token]
+            if postings[field] is None:
+                postings[field] = name
+            elif isinstance(postings[field], str):
+                if postings[field] != name:
+                    postings[field] = {postings[field], name}
+            else:
+                postings[field].add(name)
+
+    def remove_package(self, name, description="", versions=()):
+        """Remove package added with the same description and version names"""
+        for token, field in self._package_tokens(name, description, versions).items():
+            postings = self.tokens.get(token)
+            if postings is None or postings[field] is None:
+                continue
+
+            if isinstance(postings[field], str):
+                if postings[field] == name:
+                    postings[field] = None
+            else:
+                postings[field].discard(name)
+                if len(postings[field]) == 0:
+                    postings[field] = None
+
+            if postings == [None, None, None]:
+                del self.tokens[token]
+                self._sorted_vocab = None
+                for bigram in bigrams(token):
+                    token_set = self.token_bigrams[bigram]
+                    token_set.discard(token)
+                    if len(token_set) == 0:
+                        del self.token_bigrams[bigram]
+
+    def _prefix_tokens(self, query_token):
+        """Return vocabulary tokens starting with query_token"""
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self.tokens)
+
+        matches = []
+        i = bisect.bisect_right(self._sorted_vocab, query_token)
+
+        while i < len(self._sorted_vocab) and len(matches) < self.max_prefix_tokens:
+            token = self._sorted_vocab[i]
+            if not token.startswith(query_token):
+                break
+            matches.append(token)
+            i += 1
+
+        return matches
+
+    def _fuzzy_tokens(self, query_token):
+        """Return (token, distance) for vocabulary tokens close to query_token"""
+        if len(query_token) < 4:
+            return []
+
+        max_distance = 1 if len(query_token) < 8 else 2
+
+        query_bigrams = bigrams(query_token)
+        min_common = len(query_bigrams) - 2 * max_distance
+
+        counts = {}
+        for bigram in query_bigrams:
+            for token in self.token_bigrams.get(bigram, ()):
+                counts[token] = counts.get(token, 0) + 1
+
+        matches = []
+        for token, count in counts.items():
+            if count < min_common or token == query_token:
+                continue
+            distance = bounded_edit_distance(query_token, token, max_distance)
+            if distance <= max_distance:
+                matches.append((token, distance))
+
+        return matches
+
+    def _match_levels(self, query_token):
+        """Return (score, package set) tuples for a query token, best first"""
+        token_scores = {}
+
+        if query_token in self.tokens:
+            token_scores[query_token] = self.exact_score
+
+        if len(query_token) >= 2:
+            for token in self._prefix_tokens(query_token):
+                token_scores.setdefault(token, self.prefix_score)
+
+        for token, distance in self._fuzzy_tokens(query_token):
+            token_scores.setdefault(token, self.fuzzy_score / distance)
+
+        levels = []
+        for token, token_score in token_scores.items():
+            for field, names in enumerate(self.tokens[token]):
+                if isinstance(names, str):
+                    levels.append((token_score * self.field_weights[field], {names}))
+                elif names is not None:
+                    levels.append((token_score * self.field_weights[field], names))
+
+        levels.sort(key=lambda level: level[0], reverse=True)
+
+        return levels
+
+    def _match_token(self, query_token):
+        """Return package -> best score for a query token"""
+        scores = {}
+
+        # Apply the lowest scores first so that better ones overwrite them.
+
+        for score, names in reversed(self._match_levels(query_token)):
+            scores.update(dict.fromkeys(names, score))
+
+        return scores
+
+    def search(self, query, limit=50):
+        """Return up to @limit (name, score) tuples in ranked order"""
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+
+        if len(query_tokens) == 0:
+            return []
+
+        if len(query_tokens) == 1:
+
+            # Walk the score levels from the best one, so that only the
+            # packages that end up in the result have to be ordered.
+
+            results = []
+            seen = set()
+
+            for score, names in self._match_levels(query_tokens[0]):
+                level_names = heapq.nsmallest(limit - len(results), names - seen, key=lambda name: (len(name), name))
+                results.extend((name, score) for name in level_names)
+                if len(results) == limit:
+                    break
+                seen.update(names)
+
+            return results
+
+        matched = collections.Counter()
+        totals = {}
+
+        for query_token in query_tokens:
+            scores = self._match_token(query_token)
+            matched.update(scores.keys())
+            for name, score in scores.items():
+                totals[name] = totals.get(name, 0.0) + score
+
+        ranked = heapq.nsmallest(limit, totals, key=lambda name: (-matched[name], -totals[name], len(name), name))
+
+        return [(name, totals[name]) for name in ranked]
+
+
+class BM25Index(object):
+    """Okapi BM25 full-text index
+
+    Documents are identified by a key and indexed by their tokens.
+    Documents can be added and removed at any time, the collection
+    statistics are kept up to date incrementally.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.doc_ids = {}
+        self.doc_keys = []
+        self.doc_lengths = []
+        self.doc_terms = []
+        self.postings = {}
+        self.total_length = 0
+        self._norms = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_norms"] = None
+        return state
+
+    def _length_norms(self):
+        """Return per document length normalization, cached between queries"""
+        if self._norms is None:
+            average_length = max(self.total_length / max(len(self.doc_ids), 1), 1.0)
+            self._norms = [self.k1 * (1.0 - self.b + self.b * length / average_length) for length in self.doc_lengths]
+        return self._norms
+
+    def add_document(self, key, text):
+        """Add document @text with @key to index"""
+        if key in self.doc_ids:
+            self.remove_document(key)
+
+        tokens = tokenize(text)
+
+        term_counts = {}
+        for token in tokens:
+            term_counts[token] = term_counts.get(token, 0) + 1
+
+        doc_id = len(self.doc_keys)
+
+        self._norms = None
+        self.doc_ids[key] = doc_id
+        self.doc_keys.append(key)
+        self.doc_lengths.append(len(tokens))
+        self.doc_terms.append(tuple(term_counts))
+        self.total_length += len(tokens)
+
+        for token, count in term_counts.items():
+            if token in self.postings:
+                self.postings[token][doc_id] = count
+            else:
+                self.postings[token] = {doc_id: count}
+
+    def remove_document(self, key):
+        """Remove document with @key from index"""
+        if not key in self.doc_ids:
+            return
+
+        doc_id = self.doc_ids.pop(key)
+
+        self._norms = None
+
+        for token in self.doc_terms[doc_id]:
+            postings = self.postings[token]
+            del postings[doc_id]
+            if len(postings) == 0:
+                del self.postings[token]
+
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_keys[doc_id] = None
+        self.doc_lengths[doc_id] = 0
+        self.doc_terms[doc_id] = ()
+
+    def search(self, query, limit=50):
+        """Return up to @limit (key, score) tuples, best match first"""
+        doc_count = len(self.doc_ids)
+
+        if doc_count == 0:
+            return []
+
+        norms = self._length_norms()
+        scores = {}
+
+        for token in set(tokenize(query)):
+            if not token in self.postings:
+                continue
+
+            postings = self.postings[token]
+            idf = math.log(1.0 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weight = idf * (self.k1 + 1.0)
+
+            for doc_id, count in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * count / (count + norms[doc_id])
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+        return [(self.doc_keys[doc_id], score) for doc_id, score in best]
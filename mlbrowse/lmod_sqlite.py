@@ -0,0 +1,420 @@
+#!/bin/env python
+"""SQLite storage backend for the LMOD json-database
+
+The json-database is converted once into an SQLite file with indexed
+package and version tables and FTS5 tables for searching. Sessions then
+open the file read-only with memory mapped I/O and only read the rows
+their queries touch, so startup time does not grow with the size of the
+module tree.
+"""
+
+import os
+import json
+import pickle
+import sqlite3
+import hashlib
+import tempfile
+import urllib.parse
+
+from . import lmod
+from . import lmod_search
+from . import lmod_stream
+from . import profiling
+
+MMAP_SIZE = 1 << 28
+
+schema = [
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB)",
+    "CREATE TABLE packages (name TEXT PRIMARY KEY, description TEXT, default_version TEXT, record INTEGER) WITHOUT ROWID",
+    "CREATE TABLE versions (id INTEGER PRIMARY KEY, name TEXT NOT NULL, version TEXT, rank INTEGER, path TEXT, parents TEXT, info TEXT NOT NULL, record INTEGER)",
+    "CREATE VIRTUAL TABLE package_text USING fts5(name, description, versions)",
+    "CREATE VIRTUAL TABLE version_text USING fts5(name UNINDEXED, text)"
+]
+
+indexes = [
+    "CREATE INDEX versions_name ON versions (name, rank, id)"
+]
+
+# The trigram tokenizer (SQLite 3.34) answers substring queries on
+# names. Without it, names are matched with LIKE.
+
+name_schema = "CREATE VIRTUAL TABLE package_names USING fts5(name, tokenize='trigram')"
+
+
+def fts_query(query, prefix=False):
+    """Return FTS5 query matching any token of @query. With @prefix,
+    tokens also match as prefixes, ranked below whole tokens."""
+    terms = []
+    for token in lmod_search.tokenize(query):
+        terms.append('"%s"' % token)
+        if prefix:
+            terms.append('"%s"*' % token)
+    return " OR ".join(terms)
+
+
+class SqliteDB(lmod.CacheFiles):
+    """LmodDB backed by an SQLite file
+
+    Answers the queries of LmodDB used by the browser and the query
+    command: find_modules(), find_versions(), find_parents(),
+    find_description(), find_default_version(), find_version_info(),
+    find_module_source(), search_modules() and search_text().
+    search_modules() matches tokens and token prefixes with FTS5, it
+    does not correct spelling mistakes as the fuzzy index of LmodDB does.
+
+    The SQLite file is @sqlite_file or, if not given, a file next to the
+    database snapshots in @cache_dirs. It is rebuilt from the json file
+    when it is missing or was made from a different json file, using the
+    same checks as the snapshots.
+    """
+    def __init__(self, filename="modules.json", sqlite_file="", cache_dirs=None):
+        self._filename = filename
+
+        if cache_dirs is None:
+            cache_dirs = lmod.snapshot_dirs()
+
+        self._cache_dirs = cache_dirs
+        self._source_stat = os.stat(filename)
+        self._source_hash = ""
+
+        if sqlite_file != "":
+            self._candidates = [sqlite_file]
+        else:
+            self._candidates = [self._snapshot_filename(cache_dir, "sqlite") for cache_dir in cache_dirs]
+
+        with profiling.phase("sqlite.open"):
+            self._db = self._open_valid()
+
+        if self._db is None:
+            with profiling.phase("sqlite.build"):
+                self._db = self._build_first_writable()
+
+        self.module_count = self._meta("module_count")
+        self.module_version_count = self._meta("module_version_count")
+        self._trigram_names = self._meta("trigram_names")
+        self._irregular_names = self._meta("irregular_names")
+
+        if self._irregular_names is None:
+            self._irregular_names = [row[0] for row in self._db.execute("SELECT name FROM packages ORDER BY name") if not row[0].isascii()]
+
+    def _connect(self, sqlite_file):
+        """Open @sqlite_file read-only with memory mapped I/O"""
+        uri = "file:%s?mode=ro" % urllib.parse.quote(os.path.abspath(sqlite_file))
+        db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        db.execute("PRAGMA mmap_size = %d" % MMAP_SIZE)
+        db.execute("PRAGMA query_only = 1")
+        return db
+
+    def _meta(self, key, db=None):
+        """Return value of @key in the meta table"""
+        row = (db or self._db).execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def _open_header(self, sqlite_file):
+        """Return (connection, header) of @sqlite_file, None if it cannot be read"""
+        if not os.path.isfile(sqlite_file):
+            return None
+
+        try:
+            db = self._connect(sqlite_file)
+        except sqlite3.Error:
+            return None
+
+        try:
+            header = self._meta("header", db)
+        except (sqlite3.Error, pickle.UnpicklingError):
+            header = None
+
+        if header is None:
+            db.close()
+            return None
+
+        return db, header
+
+    def _stamp(self, sqlite_file, header):
+        """Return what identifies the content of @sqlite_file with @header"""
+        stat = os.stat(sqlite_file)
+        return (os.path.abspath(sqlite_file), stat.st_size, stat.st_mtime_ns, header.get("hash"))
+
+    def _open_valid(self):
+        """Return connection to a valid SQLite file, None if none found
+
+        A file whose header matches the size and modification time of
+        the json file is used first. Otherwise a file made from the same
+        content, by hash, is used and its header refreshed, see
+        _refresh_header().
+        """
+        for sqlite_file in self._candidates:
+            opened = self._open_header(sqlite_file)
+            if opened is None:
+                continue
+            if self._is_valid_header(opened[1], compare_hash=False):
+                return opened[0]
+            opened[0].close()
+
+        refreshed = self._read_cache_file("sqliteheader")
+
+        for sqlite_file in self._candidates:
+            opened = self._open_header(sqlite_file)
+            if opened is None:
+                continue
+
+            db, header = opened
+
+            if refreshed is not None and refreshed[1] == self._stamp(sqlite_file, header):
+                return db
+
+            if self._is_valid_header(header):
+                self._refresh_header(sqlite_file, header)
+                return db
+
+            db.close()
+
+        return None
+
+    def _refresh_header(self, sqlite_file, header):
+        """Only the modification time of the json file differs, update the
+        header so that the next session does not have to hash the file.
+        If @sqlite_file is read-only, e.g. installed by the site, the
+        refreshed header is written to a cache file of its own instead."""
+        try:
+            db = sqlite3.connect(sqlite_file)
+            try:
+                db.execute("UPDATE meta SET value = ? WHERE key = 'header'", (pickle.dumps(self._snapshot_header()),))
+                db.commit()
+            finally:
+                db.close()
+        except sqlite3.Error:
+            self._write_cache_file("sqliteheader", self._stamp(sqlite_file, header))
+
+    def _build_first_writable(self):
+        """Build the SQLite file in the first writable location and open it"""
+        errors = []
+
+        for sqlite_file in self._candidates:
+            try:
+                self._build(sqlite_file)
+                return self._connect(sqlite_file)
+            except (OSError, sqlite3.Error) as e:
+                errors.append(str(e))
+
+        raise OSError("Could not write SQLite database for %s: %s" % (self._filename, "; ".join(errors)))
+
+    def _build(self, sqlite_file):
+        """Convert the json file into @sqlite_file"""
+        directory = os.path.dirname(os.path.abspath(sqlite_file))
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+
+        try:
+            db = sqlite3.connect(temp_filename)
+            try:
+                self._fill(db)
+            finally:
+                db.close()
+            os.chmod(temp_filename, 0o644)
+            os.replace(temp_filename, sqlite_file)
+        except BaseException:
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+            raise
+
+    def _fill(self, db):
+        """Create tables and indexes in @db from the json file"""
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+
+        for statement in schema:
+            db.execute(statement)
+
+        try:
+            db.execute(name_schema)
+            trigram_names = True
+        except sqlite3.OperationalError:
+            trigram_names = False
+
+        hasher = hashlib.blake2b(digest_size=20)
+        packages = {}
+        versions = {}
+        module_count = 0
+        module_version_count = 0
+
+        with lmod_stream.JsonSource(self._filename, hasher) as f:
+            for module in lmod_stream.iter_json_array(f):
+                name = module["package"]
+
+                module_count += 1
+                module_version_count += len(module["versions"])
+
+                # As in LmodDB, the last package of a name gives the
+                # description, default version and version information,
+                # versions accumulate. Packages are numbered in @record.
+
+                packages[name] = (module.get("description"), module.get("defaultVersionName"), module_count)
+                package_versions = versions.setdefault(name, set())
+
+                rows = []
+                texts = []
+
+                for version in module["versions"]:
+                    version_name = version.get("versionName")
+
+                    if version_name is not None:
+                        package_versions.add(version_name)
+
+                        whatis = version.get("whatis") or ""
+                        if isinstance(whatis, list):
+                            whatis = " ".join(whatis)
+
+                        texts.append((name, " ".join([name, module.get("description") or "", version.get("description") or "", version.get("help") or "", whatis])))
+
+                    rows.append((name, version_name, version.get("path"), json.dumps(version.get("parent", [])), json.dumps(version), module_count))
+
+                db.executemany("INSERT INTO versions (name, version, path, parents, info, record) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                db.executemany("INSERT INTO version_text (name, text) VALUES (?, ?)", texts)
+
+        self._source_hash = hasher.hexdigest()
+
+        db.executemany("INSERT INTO packages (name, description, default_version, record) VALUES (?, ?, ?, ?)",
+            [(name, description, default_version, record) for name, (description, default_version, record) in packages.items()])
+        db.executemany("INSERT INTO package_text (name, description, versions) VALUES (?, ?, ?)",
+            [(name, description or "", " ".join(versions[name])) for name, (description, default_version, record) in packages.items()])
+
+        if trigram_names:
+            db.executemany("INSERT INTO package_names (name) VALUES (?)", [(name,) for name in packages])
+
+        for statement in indexes:
+            db.execute(statement)
+
+        # Versions are ranked in natural order once, so queries only sort
+        # by an indexed integer.
+
+        ranks = []
+        for name, package_versions in versions.items():
+            for rank, version in enumerate(sorted(package_versions, key=lmod.version_key)):
+                ranks.append((rank, name, version))
+
+        db.executemany("UPDATE versions SET rank = ? WHERE name = ? AND version = ?", ranks)
+
+        meta = {
+            "header": self._snapshot_header(),
+            "module_count": module_count,
+            "module_version_count": module_version_count,
+            "trigram_names": trigram_names,
+            "irregular_names": sorted(name for name in packages if not name.isascii())
+        }
+
+        db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [(key, pickle.dumps(value)) for key, value in meta.items()])
+        db.execute("ANALYZE")
+        db.commit()
+
+    def _has_package(self, module):
+        return self._db.execute("SELECT 1 FROM packages WHERE name = ?", (module,)).fetchone() is not None
+
+    @profiling.timed("sqlite.find_modules")
+    def find_modules(self, name=""):
+        """Find modules in tree, sorted by name. Use @name to filter modules."""
+        if name == "":
+            return [row[0] for row in self._db.execute("SELECT name FROM packages ORDER BY name")]
+
+        if not name.isascii():
+            rows = self._db.execute("SELECT name FROM packages ORDER BY name")
+            return [row[0] for row in rows if lmod_search.name_matches(name, row[0])]
+
+        if self._trigram_names and len(name) >= 3:
+            rows = self._db.execute("SELECT name FROM package_names WHERE package_names MATCH ? ORDER BY name", ('"%s"' % name.replace('"', '""'),))
+        else:
+            pattern = "%" + name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = self._db.execute("SELECT name FROM packages WHERE name LIKE ? ESCAPE '\\' ORDER BY name", (pattern,))
+
+        module_names = [row[0] for row in rows if lmod_search.name_matches(name, row[0])]
+
+        # Trigrams and LIKE only fold ASCII case, non-ASCII names are
+        # always checked, as in TrigramIndex (e.g. "STRASSE" and "Straße").
+
+        irregular = [module_name for module_name in self._irregular_names if lmod_search.name_matches(name, module_name)]
+
+        if len(irregular) > 0:
+            module_names = sorted(set(module_names).union(irregular))
+
+        return module_names
+
+    def find_versions(self, module):
+        """Find versions of specific module, in natural version order."""
+        versions = [row[0] for row in self._db.execute("SELECT DISTINCT version FROM versions WHERE name = ? AND version IS NOT NULL ORDER BY rank", (module,))]
+
+        if len(versions) == 0 and not self._has_package(module):
+            raise KeyError(module)
+
+        return versions
+
+    def find_module_source(self, module, version):
+        """Find module source"""
+        row = self._db.execute("SELECT path FROM versions WHERE name = ? AND version = ? ORDER BY id LIMIT 1", (module, version)).fetchone()
+        return (row[0] or "") if row is not None else ""
+
+    @profiling.timed("sqlite.find_parents")
+    def find_parents(self, module, version):
+        """Find module parents (dependencies)"""
+        module_parents = []
+        for row in self._db.execute("SELECT parents FROM versions WHERE name = ? AND version = ? ORDER BY id", (module, version)):
+            module_parents.extend(json.loads(row[0]))
+        return module_parents
+
+    @profiling.timed("sqlite.find_version_info")
+    def find_version_info(self, module):
+        """Find version information on specific module."""
+        if not self._has_package(module):
+            raise KeyError(module)
+
+        return [json.loads(row[0]) for row in self._db.execute(
+            "SELECT info FROM versions WHERE name = ? AND record = (SELECT record FROM packages WHERE name = ?) ORDER BY id", (module, module))]
+
+    @profiling.timed("sqlite.search_modules")
+    def search_modules(self, query, limit=50):
+        """Ranked search over module names, descriptions and versions.
+        Returns at most @limit module names, best match first."""
+        match = fts_query(query, prefix=True)
+
+        if match == "":
+            return []
+
+        return [row[0] for row in self._db.execute(
+            "SELECT name FROM package_text WHERE package_text MATCH ? ORDER BY bm25(package_text, 3.0, 1.0, 1.5) LIMIT ?", (match, limit))]
+
+    @profiling.timed("sqlite.search_text")
+    def search_text(self, query, limit=50):
+        """BM25 ranked full-text search over descriptions, help and whatis
+        text of all versions. Returns at most @limit module names, best
+        match first."""
+        match = fts_query(query)
+        module_names = []
+
+        if match == "":
+            return module_names
+
+        for row in self._db.execute("SELECT name FROM version_text WHERE version_text MATCH ? ORDER BY rank LIMIT ?", (match, 4 * limit)):
+            if not row[0] in module_names:
+                module_names.append(row[0])
+                if len(module_names) == limit:
+                    break
+
+        return module_names
+
+    def find_description(self, module):
+        """Find module descriptions."""
+        row = self._db.execute("SELECT description FROM packages WHERE name = ?", (module,)).fetchone()
+        return (row[0] or "") if row is not None else ""
+
+    def find_default_version(self, module):
+        """Return default version of specific module"""
+        row = self._db.execute("SELECT default_version FROM packages WHERE name = ?", (module,)).fetchone()
+        return (row[0] or "") if row is not None else ""
+
+    def close(self):
+        """Close the SQLite file"""
+        self._db.close()
@@ -0,0 +1,240 @@
+#!/bin/env python
+"""Streaming reader for LMOD json-databases"""
+
+import os
+import re
+import json
+import codecs
+
+whitespace_re = re.compile(r"[ \t\n\r]*")
+number_tail_re = re.compile(r"[0-9.eE+-]*")
+
+# Compressed json-databases are recognised by their magic bytes, or by
+# the extension of the file name when it is too short to tell.
+
+compression_magic = [
+    (b"\x1f\x8b", "gz"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zst")
+]
+
+compression_extensions = {".gz": "gz", ".bz2": "bz2", ".xz": "xz", ".zst": "zst"}
+
+
+def detect_compression(f, filename=""):
+    """Return compression ("gz", "bz2", "xz", "zst") of the binary file
+    @f, "" if it is not compressed. The file position is not changed."""
+    magic = f.peek(6)[:6]
+
+    for prefix, compression in compression_magic:
+        if magic.startswith(prefix):
+            return compression
+
+    if len(magic) < 6:
+        return compression_extensions.get(os.path.splitext(filename)[1], "")
+
+    return ""
+
+
+def _zstd_module():
+    """Return a zstd module, None if not available"""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        pass
+
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        return None
+
+
+def decompressing_reader(f, compression):
+    """Return binary file object decompressing @f while it is read"""
+    if compression == "":
+        return f
+    elif compression == "gz":
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    elif compression == "bz2":
+        import bz2
+        return bz2.BZ2File(f, "rb")
+    elif compression == "xz":
+        import lzma
+        return lzma.LZMAFile(f, "rb")
+    elif compression == "zst":
+        zstd = _zstd_module()
+        if zstd is None:
+            raise ValueError("zstd compressed json needs the zstandard module")
+        if hasattr(zstd, "ZstdDecompressor"):
+            return zstd.ZstdDecompressor().stream_reader(f)
+        return zstd.ZstdFile(f, "rb")
+
+    raise ValueError("Unknown compression %s" % compression)
+
+
+def compressing_writer(f, compression, level=6):
+    """Return binary file object compressing into @f while it is written"""
+    if compression == "":
+        return f
+    elif compression == "gz":
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode="wb", compresslevel=level, mtime=0)
+    elif compression == "bz2":
+        import bz2
+        return bz2.BZ2File(f, "wb", compresslevel=max(level, 1))
+    elif compression == "xz":
+        import lzma
+        return lzma.LZMAFile(f, "wb", preset=level)
+    elif compression == "zst":
+        zstd = _zstd_module()
+        if zstd is None:
+            raise ValueError("zstd compression needs the zstandard module")
+        if hasattr(zstd, "ZstdCompressor"):
+            return zstd.ZstdCompressor(level=level).stream_writer(f, closefd=False)
+        return zstd.ZstdFile(f, "wb", level=level)
+
+    raise ValueError("Unknown compression %s" % compression)
+
+
+class HashingReader(object):
+    """Binary file wrapper that counts and optionally hashes bytes read"""
+    def __init__(self, f, hasher=None):
+        self._f = f
+        self.hasher = hasher
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.bytes_read += len(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class JsonSource(object):
+    """Binary reader of a json-database file, plain or compressed
+
+    The file is decompressed while it is read, so a compressed file is
+    never inflated in memory as a whole. The compressed bytes are counted
+    in @bytes_read and hashed with @hasher, so that progress and hashes
+    refer to the file on disk. Damaged or truncated compressed files
+    raise OSError or ValueError, as damaged plain files do.
+    """
+    def __init__(self, filename, hasher=None):
+        self._f = open(filename, "rb")
+
+        try:
+            self.compression = detect_compression(self._f, filename)
+            self._reader = HashingReader(self._f, hasher)
+            self._stream = decompressing_reader(self._reader, self.compression)
+        except BaseException:
+            self._f.close()
+            raise
+
+    @property
+    def bytes_read(self):
+        return self._reader.bytes_read
+
+    def read(self, size=-1):
+        try:
+            return self._stream.read(size)
+        except (OSError, ValueError):
+            raise
+        except Exception as e:
+            raise ValueError("Could not decompress %s data: %s" % (self.compression, e)) from e
+
+    def close(self):
+        if self._stream is not self._reader:
+            self._stream.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_json_array(f, chunk_size=1 << 16, raw=False):
+    """Yield the elements of a top-level json array one at a time
+
+    @f is a binary file object with utf-8 encoded json. Only the element
+    being decoded and the current chunk are kept in memory. If an element
+    does not fit in the buffer, the read size is doubled until it does.
+    With @raw, (element, json text of element) tuples are yielded.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    buffer = ""
+    pos = 0
+    eof = False
+    read_size = chunk_size
+    state = "start"
+
+    while True:
+        pos = whitespace_re.match(buffer, pos).end()
+
+        need_data = pos == len(buffer)
+
+        if not need_data:
+            ch = buffer[pos]
+
+            if state == "start":
+                if ch != "[":
+                    raise ValueError("Expected a json array")
+                pos += 1
+                state = "first"
+                continue
+
+            if ch == "]" and state in ["first", "separator"]:
+                return
+
+            if state == "separator":
+                if ch != ",":
+                    raise ValueError("Expected ',' or ']' at position %d of buffer" % pos)
+                pos += 1
+                state = "value"
+                continue
+
+            try:
+                start = pos
+                element, end = decoder.raw_decode(buffer, pos)
+
+                # A number at the end of the buffer may continue in the
+                # next chunk.
+
+                if not eof and isinstance(element, (int, float)) and number_tail_re.fullmatch(buffer, end):
+                    need_data = True
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                need_data = True
+
+            if not need_data:
+                read_size = chunk_size
+                pos = end
+                state = "separator"
+                if raw:
+                    yield element, buffer[start:end]
+                else:
+                    yield element
+                continue
+
+            read_size *= 2
+
+        if eof:
+            raise ValueError("Unexpected end of json array")
+
+        data = f.read(read_size)
+        eof = len(data) == 0
+
+        buffer = buffer[pos:] + text_decoder.decode(data, final=eof)
+        pos = 0
@@ -1,25 +1,126 @@
 #!/bin/env python
 """LMOD Browser main user interface"""
 
-import os, sys
+import os, sys, threading
 
-from PyQt5 import Qt, QtCore, QtGui, QtWidgets, uic
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 from . import lmod
+from . import basket
 from . import settings
 from . import config
+from . import profiling
+from . import ui_cache
+from . import view_cache
 
-from subprocess import Popen, PIPE, STDOUT
+SEARCH_NAME = 0
+SEARCH_FULL_TEXT = 1
+
+# Milliseconds without typing before a search is started.
+
+SEARCH_DELAY = 150
 
 def execute_with_output(command):
     """Execute a command and return output"""
+    from subprocess import Popen, PIPE
+
     process = Popen(command, shell=True, stdout=PIPE)
     output, error = process.communicate()
     return output
 
+class ListModel(QtCore.QAbstractListModel):
+    """Read-only list model over a list of strings
+
+    The list, e.g. the result of LmodDB.find_modules(), is used as is and
+    the view only asks for the rows it shows. set_items() swaps in a new
+    list. The row @highlighted, such as the default version, is shown in
+    red.
+    """
+    def __init__(self, parent=None):
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.items = []
+        self.highlighted = -1
+        self.highlight_brush = QtGui.QBrush(QtCore.Qt.red)
+
+    def set_items(self, items, highlighted=-1):
+        """Replace the items of the model"""
+        self.beginResetModel()
+        self.items = items
+        self.highlighted = highlighted
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.items)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.items):
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.items[index.row()]
+        if role == QtCore.Qt.ForegroundRole and index.row() == self.highlighted:
+            return self.highlight_brush
+        return None
+
+    def item(self, row):
+        """Return item in @row"""
+        return self.items[row]
+
+    def find(self, text):
+        """Return row of @text, -1 if not found"""
+        try:
+            return self.items.index(text)
+        except ValueError:
+            return -1
+
+class SearchTask(QtCore.QRunnable):
+    """Module search run in the search thread of the window"""
+    def __init__(self, window, generation, search_string, search_mode):
+        QtCore.QRunnable.__init__(self)
+        self.window = window
+        self.generation = generation
+        self.search_string = search_string
+        self.search_mode = search_mode
+
+    def run(self):
+        self.window.run_search(self.generation, self.search_string, self.search_mode)
+
+class DatabaseLoader(QtCore.QThread):
+    """Thread opening the module database given by the configuration"""
+
+    progress = QtCore.pyqtSignal("qint64", "qint64", int)
+    loaded = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, config, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.config = config
+
+    def report_progress(self, bytes_read, total_bytes, packages):
+        """Progress callback of LmodDB, called in the loader thread"""
+        self.progress.emit(bytes_read, total_bytes, packages)
+
+    def run(self):
+        try:
+            with profiling.phase("lmod.open"):
+                db = lmod.open_db(self.config.modules_json_file, lmod.snapshot_dirs(self.config.snapshot_dir), self.config.daemon_socket,
+                    self.config.backend, self.config.sqlite_file, self.report_progress, self.config.daemon_user)
+        except SystemExit:
+            self.failed.emit("Could not load %s" % self.config.modules_json_file)
+            return
+        except Exception as e:
+            self.failed.emit("Could not load %s: %s" % (self.config.modules_json_file, e))
+            return
+
+        self.loaded.emit(db)
+
 class LmodQueryWindow(QtWidgets.QWidget):
     """Resource specification window"""
 
+    modules_changed = QtCore.pyqtSignal(object)
+    search_finished = QtCore.pyqtSignal(int, object)
+
     def __init__(self, parent=None):
         """Resource window constructor"""
 
@@ -29,19 +130,62 @@ class LmodQueryWindow(QtWidgets.QWidget):
         ui_path = os.path.join(self.tool_path, "ui")
         etc_path = os.path.join(self.tool_path, "etc")
 
-        uic.loadUi(os.path.join(ui_path, "lmod_query.ui"), self)
+        with profiling.phase("ui.load_ui"):
+            ui_cache.load_ui(os.path.join(ui_path, "lmod_query.ui"), self)
         #uic.loadUi(os.path.join("../ui", "lmod_query.ui"), self)
         
-        self.config = config.MlBrowseConfig.create()
+        with profiling.phase("config"):
+            self.config = config.MlBrowseConfig.create()
 
         self.parent = parent
 
-        self.lmod = lmod.LmodDB(self.config.modules_json_file)
+        self.lmod = None
+        self.view_cache = None
+        self.basket_resolver = None
         self.terminal_command = self.config.terminal_command
 
         self.current_module = ""
         self.current_version = ""
 
+        # The lists only materialize the rows they show. Rows are selected
+        # through the selection models of the views.
+
+        self.module_model = ListModel(self)
+        self.version_model = ListModel(self)
+        self.alt_model = ListModel(self)
+        self.parent_model = ListModel(self)
+        self.basket_model = ListModel(self)
+
+        self.basket = basket.Basket()
+
+        for view, model, slot in [
+                (self.module_list, self.module_model, self.module_selected),
+                (self.version_list, self.version_model, self.version_selected),
+                (self.alt_list, self.alt_model, self.alternative_selected),
+                (self.parent_list, self.parent_model, None),
+                (self.basket_list, self.basket_model, None)]:
+            view.setModel(model)
+            if slot is not None:
+                view.selectionModel().currentRowChanged.connect(slot)
+
+        # Searches run in a worker thread once typing pauses. Each change
+        # of the search increments the generation, results of earlier
+        # generations are dropped. The lock keeps searches and database
+        # updates apart.
+
+        self.lmod_lock = threading.Lock()
+        self.search_generation = 0
+        self.pending_selection = None
+
+        self.search_pool = QtCore.QThreadPool(self)
+        self.search_pool.setMaxThreadCount(1)
+
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.start_search)
+
+        self.search_finished.connect(self.apply_search_results)
+
         self.prefer_gcc = False
         self.prefer_ifort = False
         self.prefer_icc = False
@@ -56,35 +200,193 @@ class LmodQueryWindow(QtWidgets.QWidget):
         if settings.LaunchSettings.create().args.name_only:
             self.name_only = settings.LaunchSettings.create().args.name_only
 
-        self.module_stats_label.setText("%d total modules and %d versions." % (self.lmod.module_count, self.lmod.module_version_count))
-
         if settings.LaunchSettings.create().args.filter:
             self.filter = settings.LaunchSettings.create().args.filter
         
         self.search_edit.setText(self.filter)
+
+        # The database is loaded in a background thread once the window
+        # is shown. Searching is enabled when it has been loaded.
+
+        self.search_edit.setEnabled(False)
+        self.search_mode_combo.setEnabled(False)
+        self.module_stats_label.setText("Loading module database...")
+
+        self.loader = DatabaseLoader(self.config, self)
+        self.loader.progress.connect(self.show_load_progress)
+        self.loader.loaded.connect(self.database_loaded)
+        self.loader.failed.connect(self.database_failed)
+
+        QtCore.QTimer.singleShot(0, self.loader.start)
         #self.on_search_edit_textChanged("")
 
+    @QtCore.pyqtSlot("qint64", "qint64", int)
+    def show_load_progress(self, bytes_read, total_bytes, packages):
+        """Show loading progress"""
+        if total_bytes > 0:
+            self.load_progress.setValue(int(100 * bytes_read / total_bytes))
+        self.module_stats_label.setText("Loading module database... %d modules." % packages)
+
+    @QtCore.pyqtSlot(object)
+    @profiling.timed()
+    def database_loaded(self, db):
+        """Database loaded, enable searching and apply the --filter preset"""
+
+        self.lmod = db
+        self.view_cache = view_cache.ViewCache(db, self.name_only)
+        self.basket_resolver = basket.BasketResolver(db)
+
+        self.load_progress.setVisible(False)
+        self.module_stats_label.setText("%d total modules and %d versions." % (self.lmod.module_count, self.lmod.module_version_count))
+
+        self.search_edit.setEnabled(True)
+        self.search_mode_combo.setEnabled(True)
+        self.search_edit.setFocus()
+
+        if self.search_edit.text() != "":
+            self.schedule_search(0)
+
+        # Reload the database when modules.json is regenerated. The json
+        # file is compared in the watcher thread, the changes are applied
+        # in the user interface thread.
+
+        if hasattr(self.lmod, "watch"):
+            self.modules_changed.connect(self.apply_module_changes)
+            self.lmod.watch(self.scan_module_changes)
+
+    @QtCore.pyqtSlot(str)
+    def database_failed(self, message):
+        """Database could not be loaded"""
+        print("Error: %s" % message)
+        self.load_progress.setVisible(False)
+        self.module_stats_label.setText(message)
+
 
     @QtCore.pyqtSlot(str)
+    @profiling.timed()
     def on_search_edit_textChanged(self, search_string):
         """Updates module list based on search criteria"""
-        
-        self.module_list.clear()
-        self.version_list.clear()
-        self.alt_list.clear()
-        self.parent_list.clear()
+        self.schedule_search()
+
+    def schedule_search(self, delay=SEARCH_DELAY):
+        """Search after @delay ms, superseding earlier searches"""
+        self.search_generation += 1
+        self.search_timer.start(delay)
+
+    def start_search(self):
+        """Start search for the current search string in the search thread"""
+        if self.lmod is None:
+            return
+        self.search_pool.start(SearchTask(self, self.search_generation, self.search_edit.text(), self.search_mode_combo.currentIndex()))
+
+    @profiling.timed()
+    def run_search(self, generation, search_string, search_mode):
+        """Find modules matching @search_string, called in the search thread"""
+
+        if generation != self.search_generation:
+            return
+
+        try:
+            with self.lmod_lock:
+                if search_mode == SEARCH_FULL_TEXT:
+                    sorted_modules = self.lmod.search_text(search_string)
+                else:
+                    sorted_modules = self.lmod.find_modules(search_string)
+
+                    # No substring matches, show ranked fuzzy matches instead.
+
+                    if len(sorted_modules) == 0:
+                        sorted_modules = self.lmod.search_modules(search_string)
+        except Exception as e:
+            print("Error: Search failed: %s" % e)
+            return
+
+        self.search_finished.emit(generation, [module for module in sorted_modules if module[0] != "."])
+
+    @QtCore.pyqtSlot(int, object)
+    @profiling.timed()
+    def apply_search_results(self, generation, modules):
+        """Show search results unless a newer search has been started"""
+
+        if generation != self.search_generation:
+            return
 
         self.current_module = ""
         self.current_version = ""
 
-        sorted_modules = self.lmod.find_modules(search_string)
-        sorted_modules.sort()
+        # Model resets do not report a change of the current row, so the
+        # texts of the previous module are cleared here.
+
+        self.module_help_text.clear()
+        self.module_cmds_text.clear()
+
+        with profiling.phase("ui.populate_module_list"):
+            self.parent_model.set_items([])
+            self.alt_model.set_items([])
+            self.version_model.set_items([])
+            self.module_model.set_items(modules)
 
-        for module in sorted_modules:
-            if module[0] != ".":
-                self.module_list.addItem(module)
+        if self.pending_selection is not None:
+            self.select_module(*self.pending_selection)
+            self.pending_selection = None
+
+    def scan_module_changes(self):
+        """Compare modules.json with the loaded database, called from the
+        watcher thread"""
+        changes = self.lmod.scan_changes()
+        if changes is not None:
+            self.modules_changed.emit(changes)
+
+    @QtCore.pyqtSlot(object)
+    @profiling.timed()
+    def apply_module_changes(self, changes):
+        """Update database and lists, keeping the current selection"""
+
+        with self.lmod_lock:
+            if not self.lmod.apply_changes(changes):
+                return
+
+        self.view_cache.clear()
+        self.basket_resolver.clear()
+
+        self.module_stats_label.setText("%d total modules and %d versions." % (self.lmod.module_count, self.lmod.module_version_count))
+
+        self.pending_selection = (self.current_module, self.current_version, self.alt_list.currentIndex().row())
+        self.schedule_search(0)
+
+        if len(self.basket) > 0:
+            self.update_basket()
+
+    def select_module(self, module, version="", alternative=-1):
+        """Select module, version and alternative in the lists if they exist"""
+
+        row = self.module_model.find(module)
+        if row == -1:
+            return
+
+        self.select_row(self.module_list, row)
+
+        row = self.version_model.find(version)
+        if row == -1:
+            return
+
+        self.select_row(self.version_list, row)
+
+        if alternative >= 0 and alternative < self.alt_model.rowCount():
+            self.select_row(self.alt_list, alternative)
+
+    def select_row(self, view, row):
+        """Make @row the current row of list @view"""
+        view.setCurrentIndex(view.model().index(row))
+
+    @QtCore.pyqtSlot(int)
+    @profiling.timed()
+    def on_search_mode_combo_currentIndexChanged(self, idx):
+        """Search mode changed, repeat search"""
+        self.schedule_search(0)
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_prefer_none_check_clicked(self):
         """None radio button checked."""
         self.prefer_gcc = False
@@ -92,6 +394,7 @@ class LmodQueryWindow(QtWidgets.QWidget):
         self.prefer_ifort = False
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_prefer_gcc_check_clicked(self):
         """GCC radio button checked."""
         self.prefer_gcc = True
@@ -99,6 +402,7 @@ class LmodQueryWindow(QtWidgets.QWidget):
         self.prefer_ifort = False
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_prefer_ifort_check_clicked(self):
         """Intel Fortran radio button checked."""
         self.prefer_gcc = False
@@ -106,6 +410,7 @@ class LmodQueryWindow(QtWidgets.QWidget):
         self.prefer_ifort = True
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_prefer_icc_check_clicked(self):
         """Intel C radio button checked."""
         self.prefer_gcc = False
@@ -113,78 +418,71 @@ class LmodQueryWindow(QtWidgets.QWidget):
         self.prefer_ifort = False
 
     @QtCore.pyqtSlot(int)
+    @profiling.timed()
     def on_prefer_cuda_check_stateChanged(self, state):
         """CUDA Check box checked."""
         self.prefer_cuda = self.prefer_cuda_check.isChecked()
 
-    @QtCore.pyqtSlot(int)
-    def on_module_list_currentRowChanged(self, idx):
+    @QtCore.pyqtSlot(QtCore.QModelIndex, QtCore.QModelIndex)
+    @profiling.timed()
+    def module_selected(self, current, previous):
         """Module selected in module list"""
 
+        idx = current.row()
         default_version_idx = -1
 
         if idx>=0:
 
-            self.alt_list.clear()
-            self.parent_list.clear()
+            self.alt_model.set_items([])
+            self.parent_model.set_items([])
 
-            self.current_module = self.module_list.item(idx).text()
-            self.version_list.clear()
+            self.current_module = self.module_model.item(idx)
 
-            self.versions = self.lmod.find_versions(self.current_module)
-            self.version_info = self.lmod.find_version_info(self.current_module)
-            self.description = self.lmod.find_description(self.current_module)
-            self.default_version = self.lmod.find_default_version(self.current_module)
+            module_view = self.view_cache.module_view(self.current_module)
+
+            self.versions = module_view.versions
+            self.description = module_view.description
+            default_version_idx = module_view.default_index
 
             self.module_help_text.clear()
-            self.module_help_text.insertPlainText(self.description.replace("\n", ""))
+            self.module_help_text.insertPlainText(self.description)
 
             #default_version = self.lmod.module_tree[self.current_module]["default_version"]
 
-            self.version_list.clear()
-
-            curr_row = 0
-
-            for version in self.versions:
-                if version == self.default_version:
-                    self.version_list.addItem(version)
-                    self.version_list.item(self.version_list.count()-1).setForeground(QtCore.Qt.red)
-                    default_version_idx = curr_row
-                else:
-                    self.version_list.addItem(version)
+            # The default version is shown in red by the model. The reset
+            # does not call version_selected(), so the commands of the
+            # previous version are cleared first.
 
-                curr_row += 1
+            self.module_cmds_text.clear()
+            self.version_model.set_items(self.versions, default_version_idx)
 
             if default_version_idx != -1:
-                self.version_list.setCurrentRow(default_version_idx)
+                self.select_row(self.version_list, default_version_idx)
 
 
-    @QtCore.pyqtSlot(int)
-    def on_version_list_currentRowChanged(self, idx):
+    @QtCore.pyqtSlot(QtCore.QModelIndex, QtCore.QModelIndex)
+    @profiling.timed()
+    def version_selected(self, current, previous):
         """Version selected in version list"""
 
-        self.alt_list.clear()
-        self.parent_list.clear()
+        idx = current.row()
+
+        self.alt_model.set_items([])
+        self.parent_model.set_items([])
         self.module_cmds_text.clear()
         
         if idx>=0:
 
-            self.current_version = self.version_list.item(idx).text()
+            self.current_version = self.version_model.item(idx)
 
-            self.current_alternatives = self.lmod.find_parents(self.current_module, self.current_version)
+            self.version_view = self.view_cache.version_view(self.current_module, self.current_version)
+            self.current_alternatives = self.version_view.alternatives
 
-            self.alt_list.clear()
             if len(self.current_alternatives)>0:
-                for i in range(len(self.current_alternatives)):
-                    short_form = ""
-                    for parent in self.current_alternatives[i]:
-                        short_form += parent.split("/")[0] + "/"
-
-                    short_form = short_form[:-1]
-                    self.alt_list.addItem("%s" % (short_form))
+                self.alt_model.set_items(self.version_view.labels)
 
                 if len(self.current_alternatives)>0:
-                    self.alt_list.setCurrentRow(0)
+                    self.select_row(self.alt_list, 0)
 
                 # if len(self.current_alternatives)==1:
                 #     self.alt_list.setCurrentRow(0)
@@ -209,37 +507,94 @@ class LmodQueryWindow(QtWidgets.QWidget):
                 #                     break
                 
             else:
-                if self.name_only:
-                    self.module_cmds_text.insertPlainText("%s/%s" % (self.current_module, self.current_version))
-                else:
-                    self.module_cmds_text.insertPlainText("module load %s/%s" % (self.current_module, self.current_version))
+                self.module_cmds_text.insertPlainText(self.version_view.command)
 
 
 
-    @QtCore.pyqtSlot(int)
-    def on_alt_list_currentRowChanged(self, idx):
+    @QtCore.pyqtSlot(QtCore.QModelIndex, QtCore.QModelIndex)
+    @profiling.timed()
+    def alternative_selected(self, current, previous):
         """Variant selected in variants list."""
 
+        idx = current.row()
+
         if idx>=0:
 
             self.current_alternative = self.current_alternatives[idx]
 
-            self.parent_list.clear()
+            self.parent_model.set_items(list(self.current_alternatives[idx]))
             self.module_cmds_text.clear()
+            self.module_cmds_text.insertPlainText(self.version_view.commands[idx])
 
-            for parent in self.current_alternatives[idx]:
-                self.parent_list.addItem(parent)
-                if self.name_only:
-                    self.module_cmds_text.insertPlainText("%s\n" % parent)
-                else:
-                    self.module_cmds_text.insertPlainText("module load %s\n" % parent)
+    @QtCore.pyqtSlot()
+    @profiling.timed()
+    def on_add_basket_button_clicked(self):
+        """Add selected module version to the basket"""
 
-            if self.name_only:
-                self.module_cmds_text.insertPlainText("%s/%s\n" % (self.current_module, self.current_version))
-            else:
-                self.module_cmds_text.insertPlainText("module load %s/%s\n" % (self.current_module, self.current_version))
+        row = self.version_list.currentIndex().row()
+
+        if self.basket_resolver is not None and row >= 0:
+            self.basket.add(self.current_module, self.version_model.item(row))
+            self.update_basket()
+
+    @QtCore.pyqtSlot()
+    @profiling.timed()
+    def on_remove_basket_button_clicked(self):
+        """Remove selected module version from the basket"""
+
+        row = self.basket_list.currentIndex().row()
+
+        if row >= 0:
+            self.basket.remove(*self.basket.items[row])
+            self.update_basket()
+
+    @QtCore.pyqtSlot()
+    @profiling.timed()
+    def on_clear_basket_button_clicked(self):
+        """Empty the basket"""
+        self.basket.clear()
+        self.update_basket()
+
+    @profiling.timed()
+    def show_version_commands(self):
+        """Show the load commands of the selected version and alternative"""
+
+        self.module_cmds_text.clear()
+
+        if self.version_list.currentIndex().row() < 0 or self.current_version == "":
+            return
+
+        version_view = self.view_cache.version_view(self.current_module, self.current_version)
+
+        if len(version_view.alternatives) == 0:
+            self.module_cmds_text.insertPlainText(version_view.command)
+        else:
+            idx = self.alt_list.currentIndex().row()
+            if idx >= 0:
+                self.module_cmds_text.insertPlainText(version_view.commands[idx])
+
+    def update_basket(self):
+        """Show the basket and the commands loading all of its modules"""
+
+        self.basket_model.set_items(self.basket.labels())
+
+        if len(self.basket) == 0:
+            self.basket_status_label.setText("")
+            self.show_version_commands()
+            return
+
+        plan = self.basket_resolver.resolve(self.basket.items)
+
+        self.module_cmds_text.clear()
+
+        if plan.ok:
+            self.basket_status_label.setText("%d modules to load." % len(plan.modules))
+            self.module_cmds_text.insertPlainText(plan.commands(self.name_only))
+        else:
+            self.basket_status_label.setText(plan.error)
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_start_term_button_clicked(self):
         """Start a terminal with selected modules"""
 
@@ -255,12 +610,14 @@ class LmodQueryWindow(QtWidgets.QWidget):
                 execute_with_output("ml purge;%s;%s" % (cmds.strip(), self.terminal_command))
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_copy_cmds_button_clicked(self):
         """Copy selected modules to clipboard"""
         self.module_cmds_text.selectAll()
         self.module_cmds_text.copy()
 
     @QtCore.pyqtSlot()
+    @profiling.timed()
     def on_select_modules_button_clicked(self):
         """Copy selected modules to clipboard"""
 
@@ -0,0 +1,145 @@
+#!/bin/env python
+"""Watch the LMOD json-database for modifications"""
+
+import os
+import sys
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+
+event_header = struct.Struct("iIII")
+
+
+def file_signature(filename):
+    """Return (size, mtime, inode) of a file or None if it is missing"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class Inotify(object):
+    """Minimal inotify interface using ctypes"""
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        """Watch @path for events in @mask"""
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed for %s" % path)
+        return wd
+
+    def wait(self, timeout):
+        """Return names of the files with events, waiting at most @timeout seconds"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+
+        if len(ready) == 0:
+            return []
+
+        data = os.read(self.fd, 65536)
+        names = []
+        pos = 0
+
+        while pos < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, pos)
+            pos += event_header.size
+            names.append(os.fsdecode(data[pos:pos + length].rstrip(b"\0")))
+            pos += length
+
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher(threading.Thread):
+    """Background thread calling @callback() when @filename is modified
+
+    The directory of the file is watched with inotify where available,
+    which also catches a file replaced by a rename. As inotify does not
+    see modifications made on other hosts of a network file system, the
+    size, modification time and inode of the file are also polled every
+    @interval seconds. The callback is called once the file has not
+    changed for @settle seconds, so that a file being written is not
+    read half way.
+    """
+    def __init__(self, filename, callback, interval=2.0, settle=0.5, use_inotify=True):
+        threading.Thread.__init__(self, name="FileWatcher", daemon=True)
+
+        self.filename = os.path.abspath(filename)
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle
+        self.inotify = None
+
+        self._stop_event = threading.Event()
+        self._signature = file_signature(self.filename)
+
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify()
+                self.inotify.add_watch(os.path.dirname(self.filename), IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            except (OSError, AttributeError):
+                self.inotify = None
+
+    def _wait(self, timeout):
+        """Wait for an event in the directory of the file or @timeout seconds"""
+        if self.inotify is None:
+            self._stop_event.wait(timeout)
+        else:
+            self.inotify.wait(timeout)
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                self._wait(self.interval)
+
+                signature = file_signature(self.filename)
+
+                if signature is None or signature == self._signature:
+                    continue
+
+                # Wait until the file is no longer being written.
+
+                while not self._stop_event.is_set():
+                    self._stop_event.wait(self.settle)
+                    settled = file_signature(self.filename)
+                    if settled == signature:
+                        break
+                    signature = settled
+
+                if self._stop_event.is_set() or signature is None:
+                    continue
+
+                self._signature = signature
+
+                try:
+                    self.callback()
+                except Exception as e:
+                    print("Error: Reloading %s failed: %s" % (self.filename, e))
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+    def stop(self):
+        """Stop watching"""
+        self._stop_event.set()
@@ -0,0 +1,209 @@
+#!/bin/env python
+"""Opt-in timing of ml-browse phases
+
+Profiling is enabled with the MLBROWSE_PROFILE environment variable or
+the --profile flag. MLBROWSE_PROFILE can be set to 1 or to the
+directory the profiles are written to. MLBROWSE_CPROFILE=1 or
+--cprofile also records a cProfile of the session.
+
+Phases are timed with the phase() context manager and functions, such
+as the slots of the browser window, with the timed() decorator. When
+profiling is disabled both only check a module variable. At exit the
+session profile is written as json, a summary is printed to stderr and
+the cProfile output, if any, is written next to the json file.
+"""
+
+import os
+import sys
+import time
+import json
+import atexit
+import functools
+import threading
+import contextlib
+
+# Only the first events are kept in the profile, the per phase
+# statistics include all of them.
+
+MAX_EVENTS = 10000
+
+_session = None
+
+
+class Session(object):
+    """Timings of a single ml-browse session"""
+    def __init__(self, output_dir="", use_cprofile=False):
+        self.output_dir = output_dir
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stats = {}
+        self.events = []
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if use_cprofile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def record(self, name, start, duration):
+        """Record a phase @name that started at @start (perf_counter)"""
+        depth = getattr(self._local, "depth", 0)
+
+        with self._lock:
+            if name in self.stats:
+                stat = self.stats[name]
+                stat[0] += 1
+                stat[1] += duration
+                stat[2] = max(stat[2], duration)
+            else:
+                self.stats[name] = [1, duration, duration]
+
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((name, start - self.start, duration, depth, threading.current_thread().name))
+
+    def profile(self):
+        """Return the session profile as json (dictionary)"""
+        import socket
+
+        with self._lock:
+            phases = {}
+            for name, (count, total, longest) in self.stats.items():
+                phases[name] = {"count": count, "total": total, "mean": total / count, "max": longest}
+
+            events = [{"name": name, "start": start, "duration": duration, "depth": depth, "thread": thread}
+                for name, start, duration, depth, thread in self.events]
+
+        return {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            "python": sys.version.split()[0],
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_time": time.perf_counter() - self.start,
+            "phases": phases,
+            "events": events
+        }
+
+    def summary(self, profile):
+        """Return human readable summary of @profile"""
+        lines = ["ml-browse profile, %s pid %d, %.3f s" % (profile["host"], profile["pid"], profile["wall_time"]), ""]
+        lines.append("%-48s %8s %12s %12s %12s" % ("phase", "count", "total [ms]", "mean [ms]", "max [ms]"))
+
+        for name, phase in sorted(profile["phases"].items(), key=lambda item: -item[1]["total"]):
+            lines.append("%-48s %8d %12.2f %12.2f %12.2f" % (name, phase["count"], phase["total"] * 1000.0, phase["mean"] * 1000.0, phase["max"] * 1000.0))
+
+        return "\n".join(lines)
+
+    def write(self):
+        """Write profile json and cProfile output, print the summary"""
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        profile = self.profile()
+
+        output_dir = self.output_dir
+        if output_dir == "":
+            from . import lmod
+            output_dir = os.path.join(lmod.user_cache_dir(), "profiles")
+
+        basename = os.path.join(output_dir, "mlbrowse-%s-%d-%s" % (profile["host"], profile["pid"], time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))))
+
+        print(self.summary(profile), file=sys.stderr)
+
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+
+            with open(basename + ".json", "w") as f:
+                json.dump(profile, f, indent=2)
+
+            print("\nProfile written to %s.json" % basename, file=sys.stderr)
+
+            if self.profiler is not None:
+                self.profiler.dump_stats(basename + ".prof")
+                print("cProfile output written to %s.prof" % basename, file=sys.stderr)
+        except OSError as e:
+            print("Error: Could not write profile: %s" % e, file=sys.stderr)
+
+
+def enable(output_dir="", use_cprofile=False):
+    """Start profiling the session, the profile is written at exit"""
+    global _session
+
+    if _session is not None:
+        return _session
+
+    _session = Session(output_dir, use_cprofile)
+    atexit.register(_session.write)
+
+    return _session
+
+
+def configure(argv=None):
+    """Enable profiling if requested by the environment or @argv. The
+    --profile and --cprofile flags are removed from @argv."""
+    if argv is None:
+        argv = sys.argv
+
+    value = os.environ.get("MLBROWSE_PROFILE", "")
+    use_cprofile = os.environ.get("MLBROWSE_CPROFILE", "") not in ["", "0"]
+
+    enabled = value not in ["", "0"] or use_cprofile
+    output_dir = value if value not in ["", "0", "1"] else ""
+
+    for flag in ["--profile", "--cprofile"]:
+        while flag in argv:
+            argv.remove(flag)
+            enabled = True
+            if flag == "--cprofile":
+                use_cprofile = True
+
+    if enabled:
+        enable(output_dir, use_cprofile)
+
+    return enabled
+
+
+def is_enabled():
+    """Return True if the session is profiled"""
+    return _session is not None
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the enclosed block as phase @name"""
+    session = _session
+
+    if session is None:
+        yield
+        return
+
+    local = session._local
+    local.depth = getattr(local, "depth", 0) + 1
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        local.depth -= 1
+        session.record(name, start, duration)
+
+
+def timed(name=None):
+    """Decorator timing each call of a function as phase @name, by
+    default the qualified name of the function"""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _session is None:
+                return func(*args, **kwargs)
+            with phase(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,515 @@
+#!/bin/env python
+"""Scan modulefile trees without LMOD spider
+
+Walks the MODULEPATH roots with a thread pool, reads Lua (.lua) and Tcl
+(#%Module) modulefiles and produces the same package list as
+`spider -o jsonSoftwarePage`. Modules found in directories added to
+MODULEPATH by another module (prepend_path("MODULEPATH", ...) or
+module use) get that module, and its own parents, as a parent chain.
+
+Parsed modulefiles are cached by modification time and size, so a
+re-scan only reads the modulefiles that changed.
+"""
+
+import os
+import re
+import pickle
+import hashlib
+import tempfile
+import threading
+import concurrent.futures
+
+from . import lmod
+
+# Bump when the layout of the cached modulefile records changes.
+
+CACHE_FORMAT = 1
+
+lua_string_re = r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|\[(=*)\[(.*?)\]\3\]'
+
+lua_whatis_re = re.compile(r"\bwhatis\s*\(\s*(?:%s)\s*\)" % lua_string_re, re.S)
+lua_help_re = re.compile(r"\bhelp\s*\(\s*(?:%s)\s*\)" % lua_string_re, re.S)
+lua_modulepath_re = re.compile(r"\b(?:prepend_path|append_path)\s*\(\s*[\"']MODULEPATH[\"']\s*,\s*(.+?)\)\s*$", re.M)
+lua_token_re = re.compile(r"(?:%s)|os\.getenv\s*\(\s*[\"']([^\"']+)[\"']\s*\)" % lua_string_re, re.S)
+lua_module_version_re = re.compile(r"\bmodule_version\s*\(\s*[\"']([^\"']+)[\"']\s*,\s*[\"']default[\"']")
+
+tcl_word_re = r'"((?:[^"\\]|\\.)*)"|\{([^}]*)\}|(\S+)'
+
+tcl_whatis_re = re.compile(r"^\s*module-whatis\s+(?:%s)" % tcl_word_re, re.M)
+tcl_puts_re = re.compile(r"\bputs\s+stderr\s+(?:%s)" % tcl_word_re)
+tcl_module_use_re = re.compile(r"^\s*module\s+use\s+(?:(?:-a|--append|-p|--prepend)\s+)?(\S+)", re.M)
+tcl_env_re = re.compile(r"\$(?:::)?env\(([^)]+)\)")
+tcl_modules_version_re = re.compile(r"\bset\s+ModulesVersion\s+\"?([^\"\s]+)\"?")
+tcl_module_version_re = re.compile(r"^\s*module-version\s+(\S+)\s+default\b", re.M)
+
+
+def lua_string(match, first_group=1):
+    """Return the value of a Lua string literal matched by lua_string_re"""
+    quoted, single, level, long_string = match.group(first_group, first_group + 1, first_group + 2, first_group + 3)
+
+    if long_string is not None:
+        return long_string.lstrip("\n")
+
+    value = quoted if quoted is not None else single
+
+    return value.replace('\\"', '"').replace("\\'", "'").replace("\\n", "\n").replace("\\\\", "\\")
+
+
+def lua_path_expression(expression):
+    """Evaluate a MODULEPATH argument made of string literals, os.getenv()
+    calls, .. concatenation and pathJoin()"""
+    parts = []
+
+    for match in lua_token_re.finditer(expression):
+        if match.group(5) is not None:
+            parts.append(os.environ.get(match.group(5), ""))
+        else:
+            parts.append(lua_string(match))
+
+    if len(parts) == 0:
+        return None
+
+    if expression.lstrip().startswith("pathJoin"):
+        return os.path.join(*parts)
+
+    return "".join(parts)
+
+
+def tcl_word(match):
+    """Return the value of a Tcl word matched by tcl_word_re"""
+    quoted, braced, bare = match.group(1, 2, 3)
+
+    if braced is not None:
+        return braced
+
+    if quoted is not None:
+        return quoted.replace('\\"', '"').replace("\\n", "\n").replace("\\\\", "\\")
+
+    return bare
+
+
+def tcl_proc_body(text, name):
+    """Return the body of Tcl procedure @name or an empty string"""
+    match = re.search(r"^\s*proc\s+%s\s+\{[^}]*\}\s*\{" % re.escape(name), text, re.M)
+
+    if match is None:
+        return ""
+
+    depth = 1
+    pos = match.end()
+
+    while pos < len(text) and depth > 0:
+        if text[pos] == "{":
+            depth += 1
+        elif text[pos] == "}":
+            depth -= 1
+        pos += 1
+
+    return text[match.end():pos - 1]
+
+
+def parse_lua(text):
+    """Return whatis lines, help text and MODULEPATH extensions of a Lua modulefile"""
+    whatis = [lua_string(match) for match in lua_whatis_re.finditer(text)]
+
+    help_match = lua_help_re.search(text)
+    help_text = lua_string(help_match) if help_match is not None else None
+
+    modulepaths = []
+    for match in lua_modulepath_re.finditer(text):
+        path = lua_path_expression(match.group(1))
+        if path is not None:
+            modulepaths.append(path)
+
+    return whatis, help_text, modulepaths
+
+
+def parse_tcl(text):
+    """Return whatis lines, help text and MODULEPATH extensions of a Tcl modulefile"""
+    whatis = [tcl_word(match) for match in tcl_whatis_re.finditer(text)]
+
+    help_lines = [tcl_word(match) for match in tcl_puts_re.finditer(tcl_proc_body(text, "ModulesHelp"))]
+    help_text = "\n".join(help_lines) if len(help_lines) > 0 else None
+
+    modulepaths = []
+    for match in tcl_module_use_re.finditer(text):
+        modulepaths.append(tcl_env_re.sub(lambda env: os.environ.get(env.group(1), ""), match.group(1)))
+
+    return whatis, help_text, modulepaths
+
+
+def whatis_description(whatis):
+    """Return the Description: entry of the whatis lines, as spider does"""
+    for line in whatis:
+        if line.lower().startswith("description:"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+
+def read_default_version(package_dir, name):
+    """Return the version marked as default in a package directory or None"""
+    default_link = os.path.join(package_dir, "default")
+
+    if os.path.islink(default_link):
+        target = os.path.basename(os.readlink(default_link))
+        if target.endswith(".lua"):
+            target = target[:-4]
+        return target
+
+    for filename, pattern in [(".modulerc.lua", lua_module_version_re), (".modulerc", tcl_module_version_re), (".version", tcl_modules_version_re)]:
+        try:
+            with open(os.path.join(package_dir, filename), "r", errors="replace") as f:
+                match = pattern.search(f.read())
+        except OSError:
+            continue
+
+        if match is not None:
+            version = match.group(1)
+            if version.startswith(name + "/"):
+                version = version[len(name) + 1:]
+            return version.lstrip("/")
+
+    return None
+
+
+class ModulefileRecord(object):
+    """Information read from a single modulefile"""
+    __slots__ = ("name", "version", "path", "whatis", "help", "modulepaths")
+
+    def __init__(self, name, version, path, whatis, help, modulepaths):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.whatis = whatis
+        self.help = help
+        self.modulepaths = modulepaths
+
+    def __reduce__(self):
+        return (ModulefileRecord, tuple([getattr(self, name) for name in self.__slots__]))
+
+    @property
+    def full(self):
+        if self.version is None:
+            return self.name
+        return "%s/%s" % (self.name, self.version)
+
+
+def read_modulefile(path, name, version):
+    """Parse a modulefile, returns None if @path is not a modulefile"""
+    try:
+        with open(path, "r", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return None
+
+    if path.endswith(".lua"):
+        whatis, help_text, modulepaths = parse_lua(text)
+    elif text.startswith("#%Module"):
+        whatis, help_text, modulepaths = parse_tcl(text)
+    else:
+        return None
+
+    return ModulefileRecord(name, version, path, tuple(whatis), help_text, tuple(modulepaths))
+
+
+class ModulefileCache(object):
+    """Parsed modulefiles keyed by path, valid while mtime and size match"""
+    def __init__(self, filename=""):
+        self.filename = filename
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+        if filename != "" and os.path.isfile(filename):
+            try:
+                with open(filename, "rb") as f:
+                    cache_format, entries = pickle.load(f)
+                if cache_format == CACHE_FORMAT:
+                    self.entries = entries
+            except Exception:
+                self.entries = {}
+
+    def get(self, path, stat):
+        """Return cached record of @path if the file is unchanged"""
+        entry = self.entries.get(path)
+
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        return False
+
+    def put(self, path, stat, record):
+        """Store record (or None for files that are not modulefiles)"""
+        self.entries[path] = (stat.st_mtime_ns, stat.st_size, record)
+
+    def save(self, seen=None):
+        """Write cache atomically, keeping only the paths in @seen"""
+        if self.filename == "":
+            return False
+
+        if seen is not None:
+            self.entries = {path: entry for path, entry in self.entries.items() if path in seen}
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            return False
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((CACHE_FORMAT, self.entries), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, self.filename)
+            return True
+        except Exception:
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+            return False
+
+
+def default_cache_filename(roots):
+    """Return modulefile cache filename for a list of MODULEPATH roots"""
+    key = hashlib.sha1(":".join(roots).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(lmod.user_cache_dir(), "modulefiles-%s.cache" % key)
+
+
+class ModulefileScanner(object):
+    """Parallel scanner of MODULEPATH trees
+
+    Directories are read in two steps. All modulefiles reachable from
+    @roots, directly or through MODULEPATH extensions, are read with
+    @jobs threads. The parent chains are then followed from the roots in
+    memory, as the same directory can be reached through several chains.
+    """
+    def __init__(self, roots, jobs=None, cache=None, max_depth=8):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.jobs = jobs or min(32, 4 * (os.cpu_count() or 1))
+        self.cache = cache if cache is not None else ModulefileCache()
+        self.max_depth = max_depth
+
+        self.directories = {}
+        self.defaults = {}
+        self._seen_paths = set()
+        self._lock = threading.Lock()
+
+    def _list_packages(self, directory):
+        """Return package directories and modulefiles directly in @directory"""
+        packages = []
+
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            return packages
+
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                packages.append((entry.name, entry.path))
+            elif entry.is_file():
+                name = entry.name[:-4] if entry.name.endswith(".lua") else entry.name
+                packages.append((name, None))
+
+        return packages
+
+    def _read(self, path, name, version):
+        """Return modulefile record of @path, from the cache if unchanged"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            self._seen_paths.add(path)
+
+        record = self.cache.get(path, stat)
+
+        if record is False:
+            record = read_modulefile(path, name, version)
+            self.cache.put(path, stat, record)
+
+        return record
+
+    def _scan_package(self, directory, name, package_dir):
+        """Return modulefile records of a package"""
+        if package_dir is None:
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                path += ".lua"
+            record = self._read(path, name, None)
+            return [record] if record is not None else []
+
+        records = []
+
+        for dirpath, dirnames, filenames in os.walk(package_dir):
+            dirnames.sort()
+            relative = os.path.relpath(dirpath, package_dir)
+
+            for filename in sorted(filenames):
+                if filename in [".version", ".modulerc", ".modulerc.lua", "default"]:
+                    continue
+
+                version = filename[:-4] if filename.endswith(".lua") else filename
+                if relative != ".":
+                    version = "%s/%s" % (relative, version)
+
+                record = self._read(os.path.join(dirpath, filename), name, version)
+                if record is not None:
+                    records.append(record)
+
+        default_version = read_default_version(package_dir, name)
+        if default_version is not None:
+            with self._lock:
+                self.defaults[(directory, name)] = default_version
+
+        return records
+
+    def _scan_directory(self, executor, directory):
+        """Read all packages of @directory, returns futures of the packages"""
+        return [executor.submit(self._scan_package, directory, name, package_dir) for name, package_dir in self._list_packages(directory)]
+
+    def _read_directories(self):
+        """Read all directories reachable from the roots"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            pending = {}
+
+            def add_directory(directory):
+                if directory in self.directories:
+                    return
+                self.directories[directory] = []
+                pending[executor.submit(self._scan_directory, executor, directory)] = ("directory", directory)
+
+            for root in self.roots:
+                add_directory(root)
+
+            while len(pending) > 0:
+                done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    kind, directory = pending.pop(future)
+
+                    if kind == "directory":
+                        for package_future in future.result():
+                            pending[package_future] = ("package", directory)
+                        continue
+
+                    records = future.result()
+                    self.directories[directory].extend(records)
+
+                    for record in records:
+                        for modulepath in record.modulepaths:
+                            add_directory(os.path.abspath(modulepath))
+
+    def _parent_chains(self):
+        """Return path -> set of parent chains, following MODULEPATH
+        extensions from the roots"""
+        chains = {}
+        visited = set()
+        queue = [(root, ()) for root in self.roots]
+
+        while len(queue) > 0:
+            directory, chain = queue.pop(0)
+
+            if (directory, chain) in visited:
+                continue
+            visited.add((directory, chain))
+
+            for record in self.directories.get(directory, []):
+                chains.setdefault(record.path, set()).add(chain)
+
+                if len(chain) >= self.max_depth or record.full in chain:
+                    continue
+
+                for modulepath in record.modulepaths:
+                    queue.append((os.path.abspath(modulepath), chain + (record.full,)))
+
+        return chains
+
+    def scan(self):
+        """Scan the trees and return a spider (jsonSoftwarePage) package list"""
+        self._read_directories()
+
+        chains = self._parent_chains()
+        packages = {}
+
+        for directory in list(self.roots) + sorted(set(self.directories) - set(self.roots)):
+            for record in self.directories.get(directory, []):
+                if not record.path in chains:
+                    continue
+
+                package = packages.setdefault(record.name, {"versions": {}, "default": None})
+
+                if package["default"] is None:
+                    package["default"] = self.defaults.get((directory, record.name))
+
+                if record.path in package["versions"]:
+                    continue
+
+                description = whatis_description(record.whatis)
+
+                version = {"full": record.full, "path": record.path}
+                if record.version is not None:
+                    version["versionName"] = record.version
+                if description is not None:
+                    version["description"] = description
+                if record.help is not None:
+                    version["help"] = record.help
+                if len(record.whatis) > 0:
+                    version["whatis"] = list(record.whatis)
+
+                parents = sorted([list(chain) for chain in chains[record.path] if len(chain) > 0])
+                if len(parents) > 0:
+                    version["parent"] = parents
+
+                version["hidden"] = os.path.basename(record.path).startswith(".") or (record.version or "").startswith(".")
+
+                package["versions"][record.path] = version
+
+        modules = []
+
+        for name in sorted(packages, key=str.lower):
+            versions = sorted(packages[name]["versions"].values(), key=lambda version: lmod.version_key(version.get("versionName", "")))
+            version_names = [version["versionName"] for version in versions if "versionName" in version]
+            visible_names = [version["versionName"] for version in versions if "versionName" in version and not version["hidden"]]
+
+            # Without a marked default, LMOD loads the highest visible version.
+
+            default_version = packages[name]["default"]
+            if not default_version in version_names:
+                default_version = visible_names[-1] if len(visible_names) > 0 else None
+
+            for version in versions:
+                version["markedDefault"] = version.get("versionName") == default_version and packages[name]["default"] is not None
+
+            module = {"package": name}
+
+            descriptions = [version["description"] for version in versions if version.get("versionName") == default_version and "description" in version]
+            if len(descriptions) > 0:
+                module["description"] = descriptions[0]
+            if default_version is not None:
+                module["defaultVersionName"] = default_version
+
+            module["versions"] = versions
+            modules.append(module)
+
+        self.cache.save(self._seen_paths)
+
+        return modules
+
+
+def scan_modulepath(roots, jobs=None, cache_filename=None):
+    """Scan MODULEPATH @roots and return a spider (jsonSoftwarePage)
+    package list. Parsed modulefiles are cached in @cache_filename,
+    by default in the user cache directory. Use "" to disable."""
+    if cache_filename is None:
+        cache_filename = default_cache_filename(roots)
+
+    scanner = ModulefileScanner(roots, jobs, ModulefileCache(cache_filename))
+
+    return scanner.scan()
@@ -0,0 +1,210 @@
+#!/bin/env python
+"""Generate the LMOD json-database with spider
+
+Runs the LMOD spider command for each MODULEPATH root at the same time,
+merges the per-root results into a single modules.json, replaces the
+old file atomically and writes the database snapshot used by ml-browse.
+The modulefiles can also be read directly with the scanner module, for
+machines without LMOD.
+"""
+
+import os
+import io
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import concurrent.futures
+
+from . import lmod
+from . import lmod_stream
+from . import config
+
+
+def print_error(msg):
+    """Print error message"""
+    print("Error: %s" % msg, file=sys.stderr)
+
+
+def default_spider():
+    """Return spider command of the LMOD installation in $LMOD_DIR"""
+    lmod_dir = os.environ.get("LMOD_DIR", "")
+    if lmod_dir == "":
+        return ""
+    return os.path.join(lmod_dir, "spider")
+
+
+def run_spider(spider, root, timeout=None):
+    """Run spider for a single MODULEPATH root and return its json output"""
+    process = subprocess.run([spider, "-o", "jsonSoftwarePage", root], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+
+    if process.returncode != 0:
+        raise RuntimeError("spider failed for %s: %s" % (root, process.stderr.decode("utf-8", "replace").strip()))
+
+    return process.stdout
+
+
+def run_spiders(spider, roots, jobs=None, timeout=None):
+    """Run spider for every root in @roots with at most @jobs spider
+    processes at a time, by default one for each root as spider mostly
+    waits for the file system. Returns the json output of each root in
+    the order of @roots."""
+    if jobs is None:
+        jobs = len(roots)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(run_spider, spider, root, timeout) for root in roots]
+        return [future.result() for future in futures]
+
+
+def merge_modules(results):
+    """Merge spider results of several roots into a single package list
+
+    Roots are given in MODULEPATH order. Versions found in more than one
+    root are only listed once, with the parent chains of all roots. The
+    description and default version of the first root providing a
+    package are kept, as LMOD prefers earlier MODULEPATH entries.
+    """
+    packages = {}
+    version_keys = {}
+
+    for modules in results:
+        for module in modules:
+            name = module["package"]
+
+            if not name in packages:
+                packages[name] = dict(module, versions=[])
+                version_keys[name] = {}
+            else:
+                for key, value in module.items():
+                    if key != "versions" and packages[name].get(key) in [None, ""]:
+                        packages[name][key] = value
+
+            for version in module["versions"]:
+                key = version.get("path") or version.get("full")
+
+                if not key in version_keys[name]:
+                    version_keys[name][key] = dict(version)
+                    packages[name]["versions"].append(version_keys[name][key])
+                    continue
+
+                merged = version_keys[name][key]
+                for chain in version.get("parent", []):
+                    if not chain in merged.setdefault("parent", []):
+                        merged["parent"].append(chain)
+
+    return list(packages.values())
+
+
+def write_json_atomic(filename, data):
+    """Write @data as json to @filename through a temporary file, so that
+    readers never see a partially written file. The file is compressed
+    if @filename ends with .gz, .bz2, .xz or .zst."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    compression = lmod_stream.compression_extensions.get(os.path.splitext(filename)[1], "")
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix=".modules-", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer = lmod_stream.compressing_writer(f, compression)
+            text = io.TextIOWrapper(writer, encoding="utf-8")
+            json.dump(data, text)
+            text.flush()
+            text.detach()
+            if writer is not f:
+                writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_filename, 0o644)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def write_database(filename, modules, cache_dirs=None):
+    """Write package list @modules to @filename
+
+    Unless @cache_dirs is an empty list, the database snapshot and the
+    search indexes are written as well, so that the next start of
+    ml-browse does not have to parse the json file. Returns the LmodDB
+    of the new file or None if no snapshot was made.
+    """
+    write_json_atomic(filename, modules)
+
+    if cache_dirs is not None and len(cache_dirs) == 0:
+        return None
+
+    db = lmod.LmodDB(filename, cache_dirs)
+    db._get_text_index()
+    db._get_fuzzy_index()
+
+    return db
+
+
+def generate(spider, roots, filename, cache_dirs=None, jobs=None, timeout=None):
+    """Generate @filename and its snapshot from the spider output of all @roots"""
+    results = [json.loads(output) for output in run_spiders(spider, roots, jobs, timeout)]
+
+    return write_database(filename, merge_modules(results), cache_dirs)
+
+
+def generate_scanned(roots, filename, cache_dirs=None, jobs=None):
+    """Generate @filename and its snapshot by reading the modulefiles of
+    all @roots directly"""
+    from . import scanner
+
+    return write_database(filename, scanner.scan_modulepath(roots, jobs), cache_dirs)
+
+
+def main(argv=None, prog="ml-browse generate"):
+    """Generate modules.json and its snapshot, returns exit status"""
+
+    parser = argparse.ArgumentParser(prog=prog, description="Generate the LMOD json database by running spider for each MODULEPATH root in parallel")
+    parser.add_argument("--spider", dest="spider", action="store", default="", help="Spider command, default from the spider option or $LMOD_DIR/spider.")
+    parser.add_argument("--modulepath", dest="modulepath", action="store", default=os.environ.get("MODULEPATH", ""), help="Colon separated module roots, default $MODULEPATH.")
+    parser.add_argument("--output", dest="output", action="store", default="", help="Json database to write, default the modules_json_file option.")
+    parser.add_argument("--snapshot-dir", dest="snapshot_dir", action="store", default="", help="Directory for the database snapshot, default the snapshot_dir option.")
+    parser.add_argument("--scan", dest="scan", action="store_true", default=False, help="Read the modulefiles directly instead of running spider.")
+    parser.add_argument("--no-snapshot", dest="no_snapshot", action="store_true", default=False, help="Only write the json database.")
+    parser.add_argument("--jobs", dest="jobs", type=int, default=None, help="Number of spider processes (or scanner threads) run at the same time, default one per root.")
+    parser.add_argument("--timeout", dest="timeout", type=float, default=None, help="Timeout in seconds for each spider process.")
+    args = parser.parse_args(argv)
+
+    cfg = config.MlBrowseConfig.create()
+
+    spider = args.spider or cfg.spider or default_spider()
+    output = args.output or cfg.modules_json_file
+    roots = [root for root in args.modulepath.split(":") if root != ""]
+
+    if spider == "" and not args.scan:
+        print_error("No spider command, use --spider, the spider option or set LMOD_DIR")
+        return 1
+
+    if len(roots) == 0:
+        print_error("No module roots, use --modulepath or set MODULEPATH")
+        return 1
+
+    if args.no_snapshot:
+        cache_dirs = []
+    elif args.snapshot_dir != "":
+        cache_dirs = [args.snapshot_dir]
+    else:
+        cache_dirs = lmod.snapshot_dirs(cfg.snapshot_dir)
+
+    try:
+        if args.scan:
+            generate_scanned(roots, output, cache_dirs, args.jobs)
+        else:
+            generate(spider, roots, output, cache_dirs, args.jobs, args.timeout)
+    except (OSError, ValueError, RuntimeError, subprocess.TimeoutExpired) as e:
+        print_error(e)
+        return 1
+
+    print("Wrote %s from %d module roots" % (output, len(roots)))
+
+    return 0
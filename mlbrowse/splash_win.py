@@ -1,14 +1,11 @@
 """LUNARC HPC Desktop Launcher Module"""
 
 import os
-import getpass
-from datetime import datetime
 
-from PyQt5 import Qt, QtCore, QtGui, QtWidgets, uic
+from PyQt5 import QtCore, QtGui, QtWidgets
 
-from . import jobs
-from . import lrms
 from . import settings
+from . import ui_cache
 
 class SplashWindow(QtWidgets.QWidget):
     def __init__(self, parent = None, splash_text = ""):
@@ -23,7 +20,7 @@ class SplashWindow(QtWidgets.QWidget):
 
         # Load appropriate user interface
 
-        uic.loadUi(os.path.join(ui_path, "splash.ui"), self)
+        ui_cache.load_ui(os.path.join(ui_path, "splash.ui"), self)
 
         pixmap = QtGui.QPixmap(os.path.join(image_path, "lhpcdt_splash.png"))
         self.splashLabel.setPixmap(pixmap)
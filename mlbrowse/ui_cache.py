@@ -0,0 +1,139 @@
+#!/bin/env python
+"""Compiled user interface definitions
+
+uic.loadUi() parses the .ui XML and builds the widgets through
+reflection at every start. load_ui() instead imports the Python module
+generated from the .ui file by uic.compileUi(). The module is looked
+for next to the .ui file, where "ml-browse compile-ui" writes it at
+installation, and in the user cache directory, where it is compiled on
+first use. A module older than its .ui file is not used. If compiling
+or importing fails, or MLBROWSE_COMPILED_UI=0 is set, the .ui file is
+loaded with uic.loadUi().
+"""
+
+import os
+import sys
+import glob
+import hashlib
+import tempfile
+import importlib.util
+
+from . import lmod
+
+enabled = os.environ.get("MLBROWSE_COMPILED_UI", "1") != "0"
+
+
+def print_error(msg):
+    """Print error message"""
+    print("Error: %s" % msg, file=sys.stderr)
+
+
+def compiled_name(ui_filename):
+    """Return file name of the module compiled from @ui_filename"""
+    return os.path.splitext(os.path.basename(ui_filename))[0] + "_ui.py"
+
+
+def cache_filename(ui_filename):
+    """Return the user cache file of the module compiled from @ui_filename"""
+    from PyQt5.QtCore import PYQT_VERSION_STR
+
+    key = hashlib.sha1(os.path.abspath(ui_filename).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(lmod.user_cache_dir(), "ui", "%s-%s-%s" % (key, PYQT_VERSION_STR, compiled_name(ui_filename)))
+
+
+def is_current(py_filename, ui_filename):
+    """Return True if @py_filename exists and is not older than @ui_filename"""
+    try:
+        return os.stat(py_filename).st_mtime_ns >= os.stat(ui_filename).st_mtime_ns
+    except OSError:
+        return False
+
+
+def compile_ui(ui_filename, py_filename):
+    """Compile @ui_filename to the Python module @py_filename"""
+    from PyQt5 import uic
+
+    directory = os.path.dirname(os.path.abspath(py_filename))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            uic.compileUi(ui_filename, f)
+        os.chmod(temp_filename, 0o644)
+        os.replace(temp_filename, py_filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+
+def compiled_class(ui_filename):
+    """Return the Ui_ class compiled from @ui_filename, compiling it if needed"""
+    py_filename = os.path.join(os.path.dirname(ui_filename), compiled_name(ui_filename))
+
+    if not is_current(py_filename, ui_filename):
+        py_filename = cache_filename(ui_filename)
+        if not is_current(py_filename, ui_filename):
+            compile_ui(ui_filename, py_filename)
+
+    module_name = "mlbrowse_ui_" + hashlib.sha1(py_filename.encode("utf-8")).hexdigest()[:16]
+
+    spec = importlib.util.spec_from_file_location(module_name, py_filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    classes = [value for name, value in vars(module).items() if name.startswith("Ui_") and isinstance(value, type)]
+
+    if len(classes) != 1:
+        raise ValueError("%s does not define a single Ui_ class" % py_filename)
+
+    return classes[0]
+
+
+def load_ui(ui_filename, widget):
+    """Set up @widget from @ui_filename, as uic.loadUi(), using the
+    compiled module when possible"""
+    ui = None
+
+    if enabled:
+        try:
+            ui = compiled_class(ui_filename)()
+        except Exception as e:
+            print_error("Could not use compiled %s, loading it instead: %s" % (ui_filename, e))
+
+    if ui is None:
+        from PyQt5 import uic
+        return uic.loadUi(ui_filename, widget)
+
+    ui.setupUi(widget)
+
+    # uic.loadUi() makes the child widgets attributes of @widget.
+
+    for name, value in vars(ui).items():
+        setattr(widget, name, value)
+
+    return widget
+
+
+def main(argv):
+    """Compile the .ui files of the installation, ml-browse compile-ui"""
+    from . import settings
+
+    ui_path = os.path.join(settings.LaunchSettings.create().tool_path, "ui")
+    ui_filenames = sorted(glob.glob(os.path.join(ui_path, "*.ui")))
+
+    if len(argv) > 0:
+        ui_filenames = argv
+
+    status = 0
+
+    for ui_filename in ui_filenames:
+        py_filename = os.path.join(os.path.dirname(ui_filename), compiled_name(ui_filename))
+        try:
+            compile_ui(ui_filename, py_filename)
+            print("Compiled %s to %s" % (ui_filename, py_filename))
+        except Exception as e:
+            print_error("Could not compile %s: %s" % (ui_filename, e))
+            status = 1
+
+    return status
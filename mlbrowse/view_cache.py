@@ -0,0 +1,137 @@
+#!/bin/env python
+"""Prepared module and version views of the browser
+
+Selecting a module shows its versions, default version and description,
+selecting a version the labels of its parent alternatives and the load
+commands. ViewCache keeps these prepared views of the most recently
+selected modules and versions, so moving back and forth through the
+lists does not query the database again.
+"""
+
+import collections
+
+
+class LRUCache(object):
+    """Bounded mapping keeping the @maxsize most recently used entries
+
+    get() returns the cached value of a key or computes and stores it,
+    counting hits and misses.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, compute):
+        """Return value of @key, calling compute() on a miss"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+        value = compute()
+
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """Remove all entries, the counters are kept"""
+        self._entries.clear()
+
+    def stats(self):
+        """Return hits, misses, size and maximum size as a dictionary"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class ModuleView(object):
+    """Versions, index of the default version (-1 if none) and description
+    of a module"""
+    def __init__(self, versions, default_index, description):
+        self.versions = versions
+        self.default_index = default_index
+        self.description = description
+
+
+class VersionView(object):
+    """Parent alternatives of a module version
+
+    @labels are the short forms of the alternatives shown in the list,
+    e.g. GCC/OpenMPI, and @commands the load commands of each
+    alternative. @command is the load command of a version without
+    parents.
+    """
+    def __init__(self, alternatives, labels, commands, command):
+        self.alternatives = alternatives
+        self.labels = labels
+        self.commands = commands
+        self.command = command
+
+
+class ViewCache(object):
+    """LRU cache of module and version views in front of a module database
+
+    Views are prepared from @db on first use. With @name_only the load
+    commands only list the module names, as for the --name-only option.
+    clear() must be called when the database changes.
+    """
+    def __init__(self, db, name_only=False, maxsize=256):
+        self.db = db
+        self.name_only = name_only
+        self.modules = LRUCache(maxsize)
+        self.versions = LRUCache(maxsize)
+
+    def _load_line(self, full_name):
+        """Return load command of @full_name (name/version)"""
+        if self.name_only:
+            return full_name
+        return "module load %s" % full_name
+
+    def _module_view(self, module):
+        versions = self.db.find_versions(module)
+        default_version = self.db.find_default_version(module)
+        default_index = versions.index(default_version) if default_version in versions else -1
+        return ModuleView(versions, default_index, self.db.find_description(module).replace("\n", ""))
+
+    def _version_view(self, module, version):
+        alternatives = self.db.find_parents(module, version)
+        full_name = "%s/%s" % (module, version)
+
+        labels = []
+        commands = []
+
+        for parents in alternatives:
+            labels.append("/".join(parent.split("/")[0] for parent in parents))
+            commands.append("".join("%s\n" % self._load_line(name) for name in list(parents) + [full_name]))
+
+        return VersionView(alternatives, labels, commands, self._load_line(full_name))
+
+    def module_view(self, module):
+        """Return ModuleView of @module"""
+        return self.modules.get(module, lambda: self._module_view(module))
+
+    def version_view(self, module, version):
+        """Return VersionView of @version of @module"""
+        return self.versions.get((module, version), lambda: self._version_view(module, version))
+
+    def clear(self):
+        """Drop all views, e.g. after the database has been updated"""
+        self.modules.clear()
+        self.versions.clear()
+
+    def stats(self):
+        """Return hit and miss counters of the module and version views"""
+        return {"modules": self.modules.stats(), "versions": self.versions.stats()}
@@ -0,0 +1,53 @@
+"""Shared fixtures of the ml-browse tests"""
+
+import os
+import sys
+import json
+
+import pytest
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.abspath(os.path.join(tests_dir, ".."))
+
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, "bench"))
+
+import synth
+
+
+def extra_modules():
+    """Packages covering cases the synthetic tree does not: non-ASCII
+    names, a version without versionName, unknown keys and a package
+    listed twice"""
+    return [
+        {"package": "Straße", "description": "Street maps", "defaultVersionName": "1.0",
+            "versions": [{"versionName": "1.0", "full": "Straße/1.0", "path": "/sw/Straße/1.0.lua", "parent": [["GCC/12.3.0"]]}]},
+        {"package": "Ärger", "description": "", "versions": [{"versionName": "2", "path": "/sw/Ärger/2.lua", "license": "GPL"}]},
+        {"package": "bare", "versions": [{"path": "/sw/bare.lua"}]},
+        {"package": "dup", "description": "first", "defaultVersionName": "1",
+            "versions": [{"versionName": "1", "full": "dup/1", "path": "/sw/dup/1.lua"}]},
+        {"package": "dup", "description": "second", "defaultVersionName": "2",
+            "versions": [{"versionName": "2", "full": "dup/2", "path": "/sw/dup/2.lua", "parent": [["GCC/13.2.0"]]}]}
+    ]
+
+
+def make_modules(count=300, seed=7):
+    """Return synthetic package list with @count packages and the extra cases"""
+    return synth.module_tree(count, seed) + extra_modules()
+
+
+def write_json(filename, modules):
+    """Write package list @modules to @filename"""
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(modules, f)
+    return str(filename)
+
+
+@pytest.fixture
+def modules():
+    return make_modules()
+
+
+@pytest.fixture
+def modules_json(tmp_path, modules):
+    return write_json(tmp_path / "modules.json", modules)
@@ -0,0 +1,26 @@
+#!/bin/env python
+"""Stand-in for the LMOD spider command
+
+Called as spider -o jsonSoftwarePage ROOT, like the real command, and
+prints the contents of ROOT/spider.json. If ROOT contains a file named
+fail, it exits with status 1 and the contents of that file on stderr.
+"""
+
+import os
+import sys
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 4 or sys.argv[1:3] != ["-o", "jsonSoftwarePage"]:
+        print("usage: fake_spider.py -o jsonSoftwarePage ROOT", file=sys.stderr)
+        sys.exit(2)
+
+    root = sys.argv[3]
+
+    if os.path.exists(os.path.join(root, "fail")):
+        with open(os.path.join(root, "fail")) as f:
+            sys.stderr.write(f.read())
+        sys.exit(1)
+
+    with open(os.path.join(root, "spider.json")) as f:
+        sys.stdout.write(f.read())
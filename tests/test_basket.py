@@ -0,0 +1,165 @@
+"""BasketResolver compared with a search over all choices of chains"""
+
+import random
+import itertools
+
+import pytest
+
+from mlbrowse import basket
+
+
+class ChainDB(object):
+    """find_versions() and find_parents() of module versions given as
+    full name -> parent chains"""
+    def __init__(self, parents):
+        self.parents = parents
+
+    def find_versions(self, module):
+        versions = [full_name.split("/", 1)[1] for full_name in self.parents if full_name.split("/", 1)[0] == module]
+        if len(versions) == 0:
+            raise KeyError(module)
+        return versions
+
+    def find_parents(self, module, version):
+        return [list(chain) for chain in self.parents.get("%s/%s" % (module, version), [])]
+
+
+def brute_force(db, items):
+    """Return length of the shortest common toolchain of @items, None if there is none"""
+    names = {}
+    for module, version in items:
+        if names.setdefault(module, version) != version:
+            return None
+
+    alternatives = [[tuple(chain) for chain in db.find_parents(module, version)] or [()] for module, version in items]
+    best = None
+
+    for chains in itertools.product(*alternatives):
+        toolchain = max(chains, key=len)
+        if any(toolchain[:len(chain)] != chain for chain in chains):
+            continue
+        if any(basket.module_name(full_name) in names and full_name != "%s/%s" % (basket.module_name(full_name), names[basket.module_name(full_name)])
+                for full_name in toolchain):
+            continue
+        if best is None or len(toolchain) < best:
+            best = len(toolchain)
+
+    return best
+
+
+def check_plan(db, items, plan):
+    """Check that @plan loads @items through a common toolchain, return the toolchain"""
+    toolchain = max(plan.chains, key=len)
+
+    for (module, version), chain in zip(items, plan.chains):
+        assert list(chain) in db.find_parents(module, version) or (chain == () and db.find_parents(module, version) == [])
+        assert toolchain[:len(chain)] == chain
+
+    full_names = ["%s/%s" % item for item in items]
+    assert plan.modules == list(toolchain) + [full_name for full_name in full_names if not full_name in toolchain]
+
+    return toolchain
+
+
+compilers = ["GCC/12", "GCC/13", "intel/2023"]
+mpis = {"GCC/12": ["OpenMPI/4.1", "MPICH/4"], "GCC/13": ["OpenMPI/5.0"], "intel/2023": ["impi/2021"]}
+cudas = {"GCC/12": ["CUDA/12.1"], "GCC/13": ["CUDA/12.4"]}
+
+
+def random_db(rnd, count=25):
+    """Return ChainDB with toolchain modules and @count packages in random toolchains"""
+    toolchains = [(compiler,) for compiler in compilers]
+    toolchains += [(compiler, mpi) for compiler in compilers for mpi in mpis[compiler]]
+    toolchains += [(compiler, cuda) for compiler in cudas for cuda in cudas[compiler]]
+    toolchains += [(compiler, cuda, mpi) for compiler in cudas for cuda in cudas[compiler] for mpi in mpis[compiler]]
+
+    parents = {compiler: [] for compiler in compilers}
+    for compiler in compilers:
+        for module in mpis[compiler] + cudas.get(compiler, []):
+            parents.setdefault(module, []).append([compiler])
+    for compiler in cudas:
+        for cuda in cudas[compiler]:
+            for mpi in mpis[compiler]:
+                parents[mpi].append([compiler, cuda])
+
+    for i in range(count):
+        for version in range(rnd.randint(1, 2)):
+            chains = rnd.sample(toolchains, rnd.randint(0, 4))
+            parents["pkg%d/%d" % (i, version)] = [list(chain) for chain in chains]
+
+    return ChainDB(parents)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_resolver_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    db = random_db(rnd)
+    resolver = basket.BasketResolver(db)
+
+    full_names = sorted(db.parents)
+
+    for i in range(40):
+        items = [tuple(full_name.split("/", 1)) for full_name in rnd.sample(full_names, rnd.randint(1, 4))]
+        best = brute_force(db, items)
+        plan = resolver.resolve(items)
+
+        if best is None:
+            assert not plan.ok
+            assert plan.modules == []
+            continue
+
+        assert plan.ok, (items, plan.error)
+        assert len(check_plan(db, items, plan)) == best, items
+
+
+def test_common_toolchain():
+    db = ChainDB({
+        "GCC/12": [], "OpenMPI/4.1": [["GCC/12"]],
+        "FFTW/3": [["GCC/12"], ["GCC/12", "OpenMPI/4.1"]],
+        "GROMACS/2023": [["GCC/12", "OpenMPI/4.1"]],
+        "Python/3.11": [["GCC/12"]],
+        "intel-tool/1": [["intel/2023"]]
+    })
+    resolver = basket.BasketResolver(db)
+
+    plan = resolver.resolve([("FFTW", "3"), ("Python", "3.11")])
+    assert plan.ok
+    assert plan.modules == ["GCC/12", "FFTW/3", "Python/3.11"]
+    assert plan.commands() == "module load GCC/12\nmodule load FFTW/3\nmodule load Python/3.11\n"
+
+    plan = resolver.resolve([("GROMACS", "2023"), ("FFTW", "3")])
+    assert plan.modules == ["GCC/12", "OpenMPI/4.1", "GROMACS/2023", "FFTW/3"]
+    assert plan.chains == [("GCC/12", "OpenMPI/4.1"), ("GCC/12",)]
+
+    plan = resolver.resolve([("Python", "3.11"), ("intel-tool", "1")])
+    assert not plan.ok
+    assert "Python/3.11" in plan.error and "intel-tool/1" in plan.error
+
+    plan = resolver.resolve([("Python", "2.7")])
+    assert plan.error == "Python/2.7 is not available"
+
+
+def test_plans_are_cached():
+    db = ChainDB({"GCC/12": [], "FFTW/3": [["GCC/12"]]})
+    resolver = basket.BasketResolver(db)
+
+    first = resolver.resolve([("FFTW", "3")])
+    assert resolver.resolve([("FFTW", "3")]) is first
+    assert resolver.stats()["plans"]["hits"] == 1
+
+    resolver.clear()
+    assert resolver.resolve([("FFTW", "3")]) is not first
+
+
+def test_basket():
+    items = basket.Basket()
+    assert items.add("FFTW", "3")
+    assert not items.add("FFTW", "3")
+    assert items.add("GCC", "12")
+    assert items.labels() == ["FFTW/3", "GCC/12"]
+
+    items.remove("FFTW", "3")
+    assert items.items == (("GCC", "12"),)
+
+    items.clear()
+    assert len(items) == 0
@@ -0,0 +1,311 @@
+"""LmodDB compared with the linear scans of the original implementation"""
+
+import os
+import copy
+import json
+import gzip
+import tempfile
+
+import pytest
+
+from conftest import write_json
+
+from mlbrowse import lmod
+from mlbrowse import lmod_search
+
+
+class BaselineDB(object):
+    """The queries of the original LmodDB, over the json records"""
+    def __init__(self, modules):
+        self.modules = modules
+        self.module_dict = {}
+        self.module_version_dict = {}
+
+        for module in modules:
+            self.module_dict[module["package"]] = module
+            for version in module["versions"]:
+                if "versionName" in version:
+                    self.module_version_dict.setdefault(module["package"], {}).setdefault(version["versionName"], []).append(version)
+
+    def find_versions(self, module):
+        return list(self.module_version_dict[module].keys())
+
+    def find_parents(self, module, version):
+        module_parents = []
+        for record in self.module_version_dict.get(module, {}).get(version, []):
+            module_parents.extend(record.get("parent", []))
+        return module_parents
+
+    def find_version_info(self, module):
+        return list(self.module_dict[module]["versions"])
+
+    def find_modules(self, name=""):
+        return [module["package"] for module in self.modules if name == "" or lmod_search.name_matches(name, module["package"])]
+
+    def find_description(self, module):
+        try:
+            return self.module_dict[module]["description"]
+        except KeyError:
+            return ""
+
+    def find_default_version(self, module):
+        return self.module_dict[module].get("defaultVersionName", "") if module in self.module_dict else ""
+
+
+queries = ["", "py", "GRO", "mpi", "bio", "x", "Pyma", "blas", "STRASSE", "ss", "ärg", "ÄRGER", "dup", "bare", "nothing-like-this"]
+
+
+def assert_same_as_baseline(db, modules):
+    """Check the find_ queries of @db against BaselineDB of @modules"""
+    baseline = BaselineDB(modules)
+
+    assert db.module_count == len(modules)
+    assert db.module_version_count == sum(len(module["versions"]) for module in modules)
+
+    for query in queries:
+        assert db.find_modules(query) == sorted(set(baseline.find_modules(query))), query
+
+    for module in baseline.module_dict:
+        assert db.find_description(module) == (baseline.find_description(module) or "")
+        assert db.find_default_version(module) == baseline.find_default_version(module)
+
+        if not module in baseline.module_version_dict:
+            with pytest.raises(KeyError):
+                db.find_versions(module)
+            continue
+
+        versions = db.find_versions(module)
+        assert sorted(versions) == sorted(baseline.find_versions(module))
+        assert versions == sorted(versions, key=lmod.version_key)
+
+        for version in versions:
+            assert db.find_parents(module, version) == baseline.find_parents(module, version)
+
+    for module in ["bare", "Ärger"] + [module["package"] for module in modules[:50]]:
+        assert db.find_version_info(module) == baseline.find_version_info(module)
+
+
+def open_db(filename, cache_dirs=(), streaming=True):
+    return lmod.LmodDB(filename, list(cache_dirs), streaming=streaming)
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_queries_match_baseline(modules_json, modules, streaming):
+    assert_same_as_baseline(open_db(modules_json, streaming=streaming), modules)
+
+
+def test_snapshot_matches_baseline(tmp_path, modules_json, modules, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    open_db(modules_json, [cache_dir])
+
+    monkeypatch.setattr(lmod.LmodDB, "_stream_modules", lambda self: pytest.fail("snapshot not used"))
+
+    db = open_db(modules_json, [cache_dir])
+
+    assert db._fuzzy_index is None and db._hierarchy is None
+    assert_same_as_baseline(db, modules)
+    assert db.search_modules("pyma") == open_db(modules_json, streaming=False).search_modules("pyma")
+
+
+def count_hashes(monkeypatch):
+    """Count calls of lmod.hash_file()"""
+    calls = []
+    hash_file = lmod.hash_file
+
+    def counting_hash_file(filename):
+        calls.append(filename)
+        return hash_file(filename)
+
+    monkeypatch.setattr(lmod, "hash_file", counting_hash_file)
+    return calls
+
+
+def test_snapshot_header_touched_file(tmp_path, modules_json, modules, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    open_db(modules_json, [cache_dir])
+
+    os.utime(modules_json, ns=(1, 1))
+
+    calls = count_hashes(monkeypatch)
+    monkeypatch.setattr(lmod.LmodDB, "_stream_modules", lambda self: pytest.fail("snapshot not used"))
+
+    # Same content, the snapshot is used and its header refreshed.
+
+    assert_same_as_baseline(open_db(modules_json, [cache_dir]), modules)
+    assert len(calls) == 1
+
+    open_db(modules_json, [cache_dir])
+    assert len(calls) == 1
+
+
+def test_snapshot_header_validation(modules_json):
+    db = open_db(modules_json)
+    header = db._snapshot_header()
+
+    assert db._is_valid_header(header)
+    assert not db._is_valid_header(dict(header, format=lmod.SNAPSHOT_FORMAT - 1))
+    assert not db._is_valid_header(dict(header, python=(2, 7)))
+    assert not db._is_valid_header(dict(header, source="/elsewhere/modules.json"))
+    assert not db._is_valid_header(dict(header, size=header["size"] + 1))
+
+    # A different modification time is only accepted with the same content.
+
+    touched = dict(header, mtime=header["mtime"] + 1, hash=lmod.hash_file(modules_json))
+    assert db._is_valid_header(touched)
+    assert not db._is_valid_header(touched, compare_hash=False)
+    assert not db._is_valid_header(dict(touched, hash="0" * 40))
+
+
+def test_snapshot_changed_content(tmp_path, modules_json, modules):
+    cache_dir = str(tmp_path / "cache")
+    open_db(modules_json, [cache_dir])
+
+    # Same size, new modification time and different content.
+
+    size = os.stat(modules_json).st_size
+    changed = copy.deepcopy(modules)
+    changed[0]["package"] = changed[0]["package"][::-1]
+    write_json(modules_json, changed)
+    os.utime(modules_json, ns=(1, 1))
+
+    assert os.stat(modules_json).st_size == size
+    assert_same_as_baseline(open_db(modules_json, [cache_dir]), changed)
+
+
+def test_snapshot_read_only_site_dir(tmp_path, modules_json, modules, monkeypatch):
+    site_dir = str(tmp_path / "site")
+    user_dir = str(tmp_path / "user")
+    open_db(modules_json, [site_dir])
+
+    os.utime(modules_json, ns=(1, 1))
+
+    mkstemp = tempfile.mkstemp
+
+    def read_only_site(*args, **kwargs):
+        if kwargs.get("dir") == site_dir:
+            raise PermissionError("read-only")
+        return mkstemp(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "mkstemp", read_only_site)
+    calls = count_hashes(monkeypatch)
+
+    for i in range(3):
+        db = open_db(modules_json, [site_dir, user_dir])
+        db.search_modules("bio")
+        db.search_text("library")
+
+    assert len(calls) == 1
+    assert_same_as_baseline(db, modules)
+    assert sorted(name.rsplit(".", 1)[1] for name in os.listdir(user_dir)) == ["fuzzyindex", "snapshot", "textindex"]
+
+
+def edit_modules(modules):
+    """Return @modules with packages added, changed and removed"""
+    edited = copy.deepcopy(modules)
+
+    del edited[3]
+    del edited[10]
+
+    edited[0]["description"] = "changed description"
+    edited[5]["versions"].append({"versionName": "99.0", "full": "%s/99.0" % edited[5]["package"], "path": "/sw/new.lua",
+        "parent": [["GCC/12.3.0", "OpenMPI/4.1.5"]]})
+    edited[7]["versions"] = edited[7]["versions"][:1]
+
+    edited.append({"package": "newpkg", "description": "new package", "defaultVersionName": "1.0",
+        "versions": [{"versionName": "1.0", "full": "newpkg/1.0", "path": "/sw/newpkg/1.0.lua", "parent": [["GCC/13.2.0"]]}]})
+    edited.insert(2, {"package": "Aaa-first", "versions": [{"versionName": "0.1", "full": "Aaa-first/0.1"}]})
+
+    return edited
+
+
+@pytest.mark.parametrize("build_indexes", [True, False])
+@pytest.mark.parametrize("from_snapshot", [True, False])
+def test_apply_changes_equals_fresh_load(tmp_path, modules_json, modules, build_indexes, from_snapshot, monkeypatch):
+    db = open_db(modules_json, [str(tmp_path / "cache")])
+
+    if from_snapshot:
+        with monkeypatch.context() as patch:
+            patch.setattr(lmod.LmodDB, "_stream_modules", lambda self: pytest.fail("snapshot not used"))
+            db = open_db(modules_json, [str(tmp_path / "cache")])
+
+    if build_indexes:
+        db.search_modules("bio")
+        db.search_text("library")
+        db.list_toolchains()
+
+    edited = edit_modules(modules)
+    write_json(modules_json, edited)
+    os.utime(modules_json, ns=(2, 2))
+
+    changes = db.scan_changes()
+    assert sorted(changes.added) == ["Aaa-first", "newpkg"]
+    assert sorted(changes.removed) == sorted([modules[3]["package"], modules[11]["package"]])
+    assert db.apply_changes(changes)
+
+    fresh = open_db(modules_json)
+
+    assert_same_as_baseline(db, edited)
+
+    for query in ["bio", "pyma", "newpkg", "changed", "library"]:
+        assert db.search_modules(query) == fresh.search_modules(query)
+        assert db.search_text(query) == fresh.search_text(query)
+
+    assert db.list_toolchains() == fresh.list_toolchains()
+    assert db.find_available(["GCC/13.2.0"]) == fresh.find_available(["GCC/13.2.0"])
+    assert db.find_toolchains("newpkg") == fresh.find_toolchains("newpkg")
+
+    # The rewritten snapshot and index files match the json file.
+
+    reloaded = open_db(modules_json, [str(tmp_path / "cache")])
+    assert_same_as_baseline(reloaded, edited)
+    assert reloaded.search_modules("newpkg") == fresh.search_modules("newpkg")
+
+
+def test_apply_changes_broken_record(tmp_path, modules_json, modules):
+    cache_dir = str(tmp_path / "cache")
+    open_db(modules_json, [cache_dir])
+    db = open_db(modules_json, [cache_dir])
+
+    edited = copy.deepcopy(modules)
+    edited[0]["description"] = "changed description"
+    write_json(modules_json, edited)
+    os.utime(modules_json, ns=(2, 2))
+
+    # A record that can not be converted leaves the database unchanged.
+
+    changes = db.scan_changes()
+    del changes.modules[modules[0]["package"]][0]["versions"]
+
+    with pytest.raises(KeyError):
+        db.apply_changes(changes)
+
+    assert_same_as_baseline(db, modules)
+
+    assert db.reload()
+    assert_same_as_baseline(db, edited)
+
+
+def test_reload_unchanged(modules_json):
+    db = open_db(modules_json)
+    assert db.scan_changes() is None
+    assert db.reload() is False
+
+
+def test_version_key_natural_order():
+    versions = ["1.10.0", "1.2.0", "10.1", "1.9"]
+    assert sorted(versions, key=lmod.version_key) == ["1.2.0", "1.9", "1.10.0", "10.1"]
+
+    # Toolchain suffixes are compared after the version, hidden versions
+    # sort with their visible neighbours.
+
+    versions = ["1.10-GCC-11.3.0", "1.2-GCC-12.3.0", "1.2", ".1.5", "1.2-GCC-11.3.0"]
+    assert sorted(versions, key=lmod.version_key) == ["1.2", "1.2-GCC-11.3.0", "1.2-GCC-12.3.0", ".1.5", "1.10-GCC-11.3.0"]
+
+
+def test_compressed_json(tmp_path, modules):
+    filename = str(tmp_path / "modules.json.gz")
+    with gzip.open(filename, "wt", encoding="utf-8") as f:
+        json.dump(modules, f)
+
+    assert_same_as_baseline(open_db(filename), modules)
+    assert_same_as_baseline(open_db(filename, streaming=False), modules)
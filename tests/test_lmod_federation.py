@@ -0,0 +1,123 @@
+"""FederatedDB compared with the LmodDB of each source"""
+
+import copy
+
+import pytest
+
+from conftest import write_json
+
+from mlbrowse import lmod
+from mlbrowse import lmod_federation
+
+queries = ["", "py", "GRO", "mpi", "bio", "x", "ss", "ärg", "dup", "only"]
+
+
+def other_modules(modules):
+    """Return package list of a second cluster, sharing some packages
+    with @modules"""
+    other = copy.deepcopy(modules[:40])
+
+    for module in other[:10]:
+        module["versions"].append({"versionName": "99.0", "full": "%s/99.0" % module["package"], "path": "/sw/other.lua"})
+    for module in other[10:20]:
+        module["description"] = "described on the other cluster"
+
+    other.append({"package": "only-other", "description": "other cluster only", "defaultVersionName": "1",
+        "versions": [{"versionName": "1", "full": "only-other/1", "path": "/sw/only-other/1.lua"}]})
+
+    return other
+
+
+@pytest.fixture
+def sources(tmp_path, modules_json, modules):
+    return {"a": modules_json, "b": write_json(tmp_path / "other.json", other_modules(modules))}
+
+
+@pytest.fixture
+def federation(tmp_path, sources):
+    return lmod_federation.FederatedDB(sources, [str(tmp_path / "cache")])
+
+
+def test_source_queries_match_lmoddb(federation, sources):
+    for source, filename in sources.items():
+        db = lmod.LmodDB(filename, [])
+
+        for query in queries:
+            assert federation.find_modules(query, source=source) == db.find_modules(query), (source, query)
+
+        for module in db.find_modules():
+            assert federation.find_description(module, source=source) == db.find_description(module)
+            assert federation.find_default_version(module, source=source) == db.find_default_version(module)
+
+            if module in db.module_version_dict:
+                assert federation.find_versions(module, source=source) == db.find_versions(module)
+
+        assert federation.search_modules("pyma", source=source) == db.search_modules("pyma")
+
+    # Of packages listed twice, the last record is used, as in LmodDB.
+
+    assert federation.find_description("dup", source="a") == "second"
+    assert federation.find_default_version("dup", source="a") == "2"
+
+
+def test_catalogs_read_on_demand(federation, sources):
+    a, b = federation._sources["a"], federation._sources["b"]
+    assert a.catalog is None and b.catalog is None
+
+    assert federation.find_modules("only", source="b") == ["only-other"]
+    assert a.catalog is None and b.catalog is not None
+    assert federation.name_index is None
+
+    # Parents and version details load the LmodDB of that source only.
+
+    module = federation.find_modules(source="b")[0]
+    version = federation.find_versions(module, source="b")[0]
+    assert federation.find_parents(module, version, "b") == lmod.LmodDB(sources["b"], []).find_parents(module, version)
+    assert a.db is None and b.db is not None
+
+    federation.unload("b")
+    assert b.db is None
+
+
+def test_catalog_cache(tmp_path, sources, monkeypatch):
+    lmod_federation.FederatedDB(sources, [str(tmp_path / "cache")]).find_modules()
+
+    monkeypatch.setattr(lmod_federation.SourceCatalog, "_read_packages", lambda self: pytest.fail("catalog not cached"))
+
+    federation = lmod_federation.FederatedDB(sources, [str(tmp_path / "cache")])
+    assert "only-other" in federation.find_modules()
+
+
+def test_shared_index_matches_sources(federation, sources):
+    dbs = {source: lmod.LmodDB(filename, []) for source, filename in sources.items()}
+
+    for query in queries:
+        expected = set()
+        for db in dbs.values():
+            expected.update(db.find_modules(query))
+        assert federation.find_modules(query) == sorted(expected), query
+
+    assert "only-other" in federation.search_modules("only other")
+
+    for module in federation.find_modules():
+        providing = [source for source, db in dbs.items() if module in db.module_dict]
+        assert federation.find_sources(module) == providing
+
+        versions = set()
+        for source in providing:
+            versions.update(dbs[source].module_version_dict.get(module, {}))
+
+        if len(versions) == 0:
+            continue
+
+        assert federation.find_versions(module) == sorted(versions, key=lmod.version_key)
+
+        for version, version_sources in federation.find_availability(module):
+            assert version_sources == [source for source in providing if version in dbs[source].module_version_dict.get(module, {})]
+
+
+def test_unreadable_source(tmp_path, sources):
+    federation = lmod_federation.FederatedDB(dict(sources, c=str(tmp_path / "missing.json")), [])
+
+    assert federation.find_modules(source="c") == []
+    assert federation.find_sources("only-other") == ["b"]
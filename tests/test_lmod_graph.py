@@ -0,0 +1,101 @@
+"""Hierarchy queries compared with scans over the parent lists"""
+
+import random
+
+import pytest
+
+from mlbrowse import lmod
+from mlbrowse import lmod_graph
+
+
+def version_chains(modules):
+    """Return (full name, parent chains) of all named versions, Core
+    modules with the empty chain"""
+    versions = []
+    for module in modules:
+        for version in module["versions"]:
+            if version.get("versionName") is None:
+                continue
+            full_name = version.get("full") or "%s/%s" % (module["package"], version["versionName"])
+            versions.append((full_name, [tuple(chain) for chain in version.get("parent", [])] or [()]))
+    return versions
+
+
+def scan_available(versions, loaded, include_core=True):
+    """find_available() as a scan over all parent chains"""
+    loaded = set(loaded)
+    return sorted(set(full_name for full_name, chains in versions
+        if any(set(chain) <= loaded and (include_core or len(chain) > 0) for chain in chains)))
+
+
+def scan_toolchain_modules(versions, toolchain):
+    """find_toolchain_modules() as a scan over all parent chains"""
+    return sorted(set(full_name for full_name, chains in versions if any(set(chain) == set(toolchain) for chain in chains)))
+
+
+def scan_toolchains(versions, full_names):
+    """Toolchains of @full_names as sets of modules"""
+    return set(frozenset(chain) for full_name, chains in versions if full_name in full_names for chain in chains)
+
+
+def scan_children(versions, node):
+    """find_children() as a scan over the edges of all parent chains"""
+    children = set()
+    for full_name, chains in versions:
+        for chain in chains:
+            path = (lmod_graph.CORE,) + chain + (full_name,)
+            for parent, child in zip(path, path[1:]):
+                if parent == node:
+                    children.add(child)
+    return sorted(children)
+
+
+@pytest.fixture
+def db(modules_json):
+    return lmod.LmodDB(modules_json, [])
+
+
+def test_queries_match_parent_scan(db, modules):
+    versions = version_chains(modules)
+    toolchains = db.list_toolchains()
+
+    assert set(frozenset(chain) for chain in toolchains) == set(frozenset(chain) for full_name, chains in versions for chain in chains)
+    assert toolchains == sorted(toolchains, key=lambda chain: (len(chain), chain))
+
+    rnd = random.Random(1)
+    nodes = sorted(set(node for chain in toolchains for node in chain))
+    loaded_sets = toolchains + [rnd.sample(nodes, rnd.randint(1, 4)) for i in range(30)]
+
+    for loaded in loaded_sets:
+        assert db.find_available(loaded) == scan_available(versions, loaded), loaded
+        assert db.find_available(loaded, include_core=False) == scan_available(versions, loaded, False), loaded
+
+    for toolchain in toolchains:
+        assert db.find_toolchain_modules(toolchain) == scan_toolchain_modules(versions, toolchain), toolchain
+
+    for node in [lmod_graph.CORE] + nodes:
+        assert db.find_children(node) == scan_children(versions, node), node
+
+    for module in list(db.module_version_dict)[:80] + ["Straße", "dup"]:
+        full_names = set(db._full_name(module, version) for version in db.find_versions(module))
+        assert set(frozenset(chain) for chain in db.find_toolchains(module)) == scan_toolchains(versions, full_names), module
+
+        version = db.find_versions(module)[0]
+        assert set(frozenset(chain) for chain in db.find_toolchains(module, version)) == scan_toolchains(versions, {db._full_name(module, version)})
+
+
+def test_browse_down_the_hierarchy():
+    graph = lmod_graph.HierarchyGraph()
+    graph.add_module("GCC/12.3.0")
+    graph.add_module("OpenMPI/4.1.5", [["GCC/12.3.0"]])
+    graph.add_module("FFTW/3.3.10", [["GCC/12.3.0"], ["GCC/12.3.0", "OpenMPI/4.1.5"]])
+    graph.add_module("GROMACS/2023.1", [["GCC/12.3.0", "OpenMPI/4.1.5"]])
+
+    assert graph.find_children() == ["GCC/12.3.0"]
+    assert graph.find_children("GCC/12.3.0") == ["FFTW/3.3.10", "OpenMPI/4.1.5"]
+    assert graph.find_children("OpenMPI/4.1.5") == ["FFTW/3.3.10", "GROMACS/2023.1"]
+    assert graph.find_children("GROMACS/2023.1") == []
+
+    graph.remove_module("FFTW/3.3.10")
+    assert graph.find_children("OpenMPI/4.1.5") == ["GROMACS/2023.1"]
+    assert graph.available(["GCC/12.3.0"]) == ["GCC/12.3.0", "OpenMPI/4.1.5"]
@@ -0,0 +1,164 @@
+"""Search indexes compared with linear scans"""
+
+import math
+import random
+
+import pytest
+
+from conftest import make_modules
+
+from mlbrowse import lmod_search
+
+
+def linear_search(names, query):
+    """find_modules() of the original LmodDB, sorted"""
+    return sorted(name for name in names if query == "" or lmod_search.name_matches(query, name))
+
+
+def levenshtein(a, b):
+    """Unbounded edit distance"""
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1])))
+        previous = current
+    return previous[-1]
+
+
+names = sorted(set(module["package"] for module in make_modules(500)))
+
+queries = ["", "a", "py", "Py", "PY", "mpi", "MPI", "bio", "Boost", "tensorflow", "x", "ss", "STRASSE", "straße",
+    "ärg", "ÄRG", "R-", "-", "%", "zzz", "cuda", "numpy"]
+
+
+@pytest.mark.parametrize("query", queries)
+def test_trigram_search_matches_linear_scan(query):
+    index = lmod_search.TrigramIndex(names)
+    assert index.search(query) == linear_search(names, query)
+
+
+def test_trigram_renumbering():
+    rnd = random.Random(3)
+    shuffled = list(names)
+    rnd.shuffle(shuffled)
+
+    index = lmod_search.TrigramIndex()
+    for name in shuffled[:200]:
+        index.add(name)
+    assert not index.ordered
+
+    removed = set(shuffled[:40])
+    for name in removed:
+        index.remove(name)
+    for name in shuffled[200:]:
+        index.add(name)
+
+    current = sorted(set(shuffled) - removed)
+
+    for query in queries:
+        assert index.search(query) == linear_search(current, query), query
+
+    # Searching renumbered the ids in sorted order.
+
+    assert index.ordered
+    assert index.names == current
+    assert [index.ids[name] for name in current] == list(range(len(current)))
+    assert len(index) == len(current)
+
+    # Names added in order after renumbering keep it ordered.
+
+    last = current[-1] + "-last"
+    index.add(last)
+    assert index.ordered
+    assert index.search(last) == [last]
+
+
+def test_trigram_short_query_cache_invalidated():
+    index = lmod_search.TrigramIndex(["abc", "abd"])
+    assert index.search("ab") == ["abc", "abd"]
+
+    index.add("abe")
+    assert index.search("ab") == ["abc", "abd", "abe"]
+
+    index.remove("abc")
+    assert index.search("ab") == ["abd", "abe"]
+
+
+def test_bounded_edit_distance():
+    rnd = random.Random(5)
+    alphabet = "abcx"
+
+    for i in range(2000):
+        a = "".join(rnd.choice(alphabet) for j in range(rnd.randint(0, 7)))
+        b = "".join(rnd.choice(alphabet) for j in range(rnd.randint(0, 7)))
+        max_distance = rnd.randint(0, 4)
+
+        distance = levenshtein(a, b)
+        bounded = lmod_search.bounded_edit_distance(a, b, max_distance)
+
+        if distance <= max_distance:
+            assert bounded == distance, (a, b, max_distance)
+        else:
+            assert bounded == max_distance + 1, (a, b, max_distance)
+
+
+@pytest.mark.parametrize("a, b, distance", [("", "", 0), ("gromacs", "gromacs", 0), ("gromcas", "gromacs", 2),
+    ("gromac", "gromacs", 1), ("", "abc", 3), ("kitten", "sitting", 3)])
+def test_bounded_edit_distance_examples(a, b, distance):
+    assert lmod_search.bounded_edit_distance(a, b, 3) == distance
+
+
+def test_fuzzy_index_remove_package():
+    index = lmod_search.FuzzyIndex()
+    index.add_package("GROMACS", "molecular dynamics", ["2023.1"])
+    index.add_package("GROMOS", "molecular simulation", ["1.0"])
+
+    assert [name for name, score in index.search("gromacz")] == ["GROMACS"]
+
+    index.remove_package("GROMACS", "molecular dynamics", ["2023.1"])
+    assert "GROMACS" not in [name for name, score in index.search("gromacs")]
+
+
+def bm25_scores(documents, query, k1=1.2, b=0.75):
+    """Okapi BM25 scores of the texts in @documents, computed per document"""
+    tokens = {key: lmod_search.tokenize(text) for key, text in documents.items()}
+    average_length = max(sum(len(doc_tokens) for doc_tokens in tokens.values()) / len(tokens), 1.0)
+
+    scores = {}
+    for term in set(lmod_search.tokenize(query)):
+        containing = [key for key in tokens if term in tokens[key]]
+        idf = math.log(1.0 + (len(tokens) - len(containing) + 0.5) / (len(containing) + 0.5))
+        for key in containing:
+            count = tokens[key].count(term)
+            norm = k1 * (1.0 - b + b * len(tokens[key]) / average_length)
+            scores[key] = scores.get(key, 0.0) + idf * (k1 + 1.0) * count / (count + norm)
+
+    return scores
+
+
+def test_bm25_matches_direct_scoring():
+    rnd = random.Random(11)
+    words = ["molecular", "dynamics", "library", "fourier", "transform", "python", "mpi", "parallel", "solver", "linear"]
+
+    index = lmod_search.BM25Index()
+    documents = {}
+
+    for i in range(300):
+        key = ("pkg%d" % rnd.randint(0, 60), str(rnd.randint(1, 3)))
+        if rnd.random() < 0.2:
+            index.remove_document(key)
+            documents.pop(key, None)
+        else:
+            text = " ".join(rnd.choice(words) for j in range(rnd.randint(1, 12)))
+            index.add_document(key, text)
+            documents[key] = text
+
+    assert len(index) == len(documents)
+
+    for query in ["molecular", "fourier transform", "MPI parallel solver", "python python", "missing"]:
+        expected = bm25_scores(documents, query)
+        results = index.search(query, limit=len(documents))
+
+        assert dict(results) == pytest.approx(expected), query
+        assert [score for key, score in results] == pytest.approx(sorted(expected.values(), reverse=True))
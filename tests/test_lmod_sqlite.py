@@ -0,0 +1,70 @@
+"""SqliteDB compared with LmodDB"""
+
+import os
+import sqlite3
+
+import pytest
+
+from mlbrowse import lmod
+from mlbrowse import lmod_sqlite
+
+queries = ["", "py", "GRO", "mpi", "bio", "x", "Pyma", "STRASSE", "ss", "SS", "ärg", "ÄRGER", "dup", "_", "%"]
+
+
+@pytest.fixture
+def databases(tmp_path, modules_json):
+    db = lmod.LmodDB(modules_json, [])
+    sqlite_db = lmod_sqlite.SqliteDB(modules_json, cache_dirs=[str(tmp_path / "cache")])
+    yield db, sqlite_db
+    sqlite_db.close()
+
+
+def test_queries_match_lmoddb(databases):
+    db, sqlite_db = databases
+
+    assert sqlite_db.module_count == db.module_count
+    assert sqlite_db.module_version_count == db.module_version_count
+
+    for query in queries:
+        assert sqlite_db.find_modules(query) == db.find_modules(query), query
+
+    for module in db.find_modules():
+        assert sqlite_db.find_description(module) == db.find_description(module)
+        assert sqlite_db.find_default_version(module) == db.find_default_version(module)
+        assert sqlite_db.find_version_info(module) == db.find_version_info(module)
+
+        if not module in db.module_version_dict:
+            continue
+
+        assert sqlite_db.find_versions(module) == db.find_versions(module)
+        for version in db.find_versions(module):
+            assert sqlite_db.find_parents(module, version) == db.find_parents(module, version)
+
+
+def test_read_only_file_touched(tmp_path, modules_json, monkeypatch):
+    sqlite_file = str(tmp_path / "site" / "modules.sqlite")
+    user_dir = str(tmp_path / "user")
+    os.makedirs(os.path.dirname(sqlite_file))
+
+    lmod_sqlite.SqliteDB(modules_json, sqlite_file, [user_dir]).close()
+    os.utime(modules_json, ns=(1, 1))
+
+    connect = sqlite3.connect
+
+    def read_only_connect(filename, *args, **kwargs):
+        if filename == sqlite_file and not kwargs.get("uri"):
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+        return connect(filename, *args, **kwargs)
+
+    monkeypatch.setattr(sqlite3, "connect", read_only_connect)
+
+    calls = []
+    hash_file = lmod.hash_file
+    monkeypatch.setattr(lmod, "hash_file", lambda filename: calls.append(filename) or hash_file(filename))
+    monkeypatch.setattr(lmod_sqlite.SqliteDB, "_build", lambda self, sqlite_file: pytest.fail("rebuilt"))
+
+    for i in range(3):
+        lmod_sqlite.SqliteDB(modules_json, sqlite_file, [user_dir]).close()
+
+    assert len(calls) == 1
+    assert [name.rsplit(".", 1)[1] for name in os.listdir(user_dir)] == ["sqliteheader"]
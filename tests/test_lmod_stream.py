@@ -0,0 +1,72 @@
+"""Streaming json reader across buffer boundaries"""
+
+import io
+import json
+import gzip
+
+import pytest
+
+from conftest import make_modules
+
+from mlbrowse import lmod_stream
+
+
+def stream(data, chunk_size, raw=False):
+    """Return the elements of the json array @data read in chunks"""
+    return list(lmod_stream.iter_json_array(io.BytesIO(data.encode("utf-8")), chunk_size, raw))
+
+
+documents = [
+    "[]",
+    " [ ] ",
+    "[1, 23, 456.5e3, -7, 0.125]",
+    '[{"package": "Straße", "description": "ünïcödé ✓ 𝔘"}, {"package": "a\\"b", "versions": []}]',
+    '[\n  "x",\n  ["nested", [1, 2]],\n  null, true, false\n]',
+    json.dumps(make_modules(20), indent=1)
+]
+
+
+@pytest.mark.parametrize("data", documents)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 1 << 16])
+def test_chunked_equals_json_loads(data, chunk_size):
+    assert stream(data, chunk_size) == json.loads(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 13])
+def test_raw_text(chunk_size):
+    data = documents[3]
+
+    for element, text in stream(data, chunk_size, raw=True):
+        assert json.loads(text) == element
+        assert text in data
+
+
+@pytest.mark.parametrize("data", ["{}", "[1, 2", "[1 2]", '[{"a": 1}', "", "[1,]"])
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_invalid(data, chunk_size):
+    with pytest.raises(ValueError):
+        stream(data, chunk_size)
+
+
+def test_json_source_gzip(tmp_path):
+    modules = make_modules(50)
+    filename = str(tmp_path / "modules.json.gz")
+
+    with gzip.open(filename, "wt", encoding="utf-8") as f:
+        json.dump(modules, f)
+
+    with lmod_stream.JsonSource(filename) as source:
+        assert source.compression == "gz"
+        assert list(lmod_stream.iter_json_array(source, 1000)) == modules
+        assert source.bytes_read == len(open(filename, "rb").read())
+
+
+def test_json_source_damaged(tmp_path):
+    filename = str(tmp_path / "modules.json.gz")
+
+    with open(filename, "wb") as f:
+        f.write(gzip.compress(json.dumps(make_modules(50)).encode("utf-8"))[:200])
+
+    with pytest.raises((OSError, ValueError)):
+        with lmod_stream.JsonSource(filename) as source:
+            list(lmod_stream.iter_json_array(source, 64))
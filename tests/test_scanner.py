@@ -0,0 +1,162 @@
+"""Scanning a small modulefile tree"""
+
+import os
+
+import pytest
+
+from mlbrowse import scanner
+
+modulefiles = {
+    "Core/GCC/12.3.0.lua": '''
+help([[
+GNU Compiler Collection
+]])
+whatis("Description: GNU compilers")
+whatis("Version: 12.3.0")
+prepend_path("MODULEPATH", pathJoin(os.getenv("MODROOT"), "Compiler/GCC/12.3.0"))
+''',
+    "Core/GCC/13.2.0.lua": '''
+whatis("Description: GNU compilers")
+''',
+    "Core/GCC/.modulerc": "#%Module\nmodule-version GCC/12.3.0 default\n",
+    "Core/Python/3.10.4": "#%Module\nmodule-whatis {Description: Python 3.10}\n",
+    "Core/Python/3.11.3": '''#%Module
+proc ModulesHelp { } {
+    puts stderr "The Python interpreter"
+    puts stderr {and its standard library}
+}
+module-whatis "Description: Python 3.11"
+module use $env(MODROOT)/Python/3.11.3
+''',
+    "Core/Python/.version": '#%Module\nset ModulesVersion "3.10.4"\n',
+    "Core/Python/README": "not a modulefile\n",
+    "Core/CMake/3.26.lua": 'whatis("Description: build system")\n',
+    "Core/CMake/3.27.lua": 'whatis("Description: build system")\n',
+    "Core/CMake/.3.28.lua": 'whatis("Description: build system")\n',
+    "Core/tool/1.0.lua": "",
+    "Core/tool/.2.0.lua": "",
+    "Compiler/GCC/12.3.0/OpenMPI/4.1.5.lua": '''
+whatis("Description: MPI library")
+append_path("MODULEPATH", os.getenv("MODROOT") .. "/MPI/GCC/12.3.0/OpenMPI/4.1.5")
+''',
+    "Compiler/GCC/12.3.0/FFTW/3.3.10.lua": 'whatis("Description: FFT library")\n',
+    "MPI/GCC/12.3.0/OpenMPI/4.1.5/FFTW/3.3.10.lua": 'whatis("Description: FFT library with MPI")\n',
+    "Python/3.11.3/numpy/1.26": "#%Module\nmodule-whatis {Description: arrays}\n",
+    "Unused/orphan/1.0.lua": 'whatis("Description: not on any MODULEPATH")\n'
+}
+
+
+def write_tree(root, files):
+    """Write modulefiles @files (relative path -> text) under @root"""
+    for name, text in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    root = str(tmp_path / "modules")
+    write_tree(root, modulefiles)
+    os.symlink("3.26.lua", os.path.join(root, "Core", "CMake", "default"))
+    monkeypatch.setenv("MODROOT", root)
+    return root
+
+
+def scan(root, cache=None):
+    """Return scanner and the packages found from Core, by name"""
+    modulefile_scanner = scanner.ModulefileScanner([os.path.join(root, "Core")], jobs=4, cache=cache)
+    return modulefile_scanner, {module["package"]: module for module in modulefile_scanner.scan()}
+
+
+def versions(module):
+    """Return version name -> list of version records"""
+    records = {}
+    for version in module["versions"]:
+        records.setdefault(version["versionName"], []).append(version)
+    return records
+
+
+def test_hierarchy(tree):
+    modulefile_scanner, modules = scan(tree)
+
+    assert sorted(modules) == ["CMake", "FFTW", "GCC", "OpenMPI", "Python", "numpy", "tool"]
+
+    gcc = versions(modules["GCC"])["12.3.0"][0]
+    assert gcc["full"] == "GCC/12.3.0"
+    assert gcc["path"] == os.path.join(tree, "Core", "GCC", "12.3.0.lua")
+    assert gcc["description"] == "GNU compilers"
+    assert gcc["help"] == "GNU Compiler Collection\n"
+    assert gcc["whatis"] == ["Description: GNU compilers", "Version: 12.3.0"]
+    assert not "parent" in gcc
+
+    assert versions(modules["OpenMPI"])["4.1.5"][0]["parent"] == [["GCC/12.3.0"]]
+
+    # FFTW is provided in the GCC and the OpenMPI level.
+
+    fftw = versions(modules["FFTW"])["3.3.10"]
+    assert sorted([(version["parent"], version["description"]) for version in fftw]) == [
+        ([["GCC/12.3.0"]], "FFT library"), ([["GCC/12.3.0", "OpenMPI/4.1.5"]], "FFT library with MPI")]
+
+    # Tcl modulefiles, module use and help from the ModulesHelp procedure.
+
+    python = versions(modules["Python"])["3.11.3"][0]
+    assert python["help"] == "The Python interpreter\nand its standard library"
+    assert python["description"] == "Python 3.11"
+    assert versions(modules["numpy"])["1.26"][0]["parent"] == [["Python/3.11.3"]]
+
+    assert sorted(versions(modules["Python"])) == ["3.10.4", "3.11.3"]
+
+
+def test_default_versions(tree):
+    modulefile_scanner, modules = scan(tree)
+
+    # .modulerc, .version and the default symlink.
+
+    assert modules["GCC"]["defaultVersionName"] == "12.3.0"
+    assert modules["Python"]["defaultVersionName"] == "3.10.4"
+    assert modules["Python"]["description"] == "Python 3.10"
+    assert modules["CMake"]["defaultVersionName"] == "3.26"
+
+    marked = [version["versionName"] for version in modules["CMake"]["versions"] if version["markedDefault"]]
+    assert marked == ["3.26"]
+
+    # Without a marked default the highest visible version is the default,
+    # but it is not marked.
+
+    assert modules["tool"]["defaultVersionName"] == "1.0"
+    assert not any(version["markedDefault"] for version in modules["tool"]["versions"])
+
+
+def test_hidden_versions(tree):
+    modulefile_scanner, modules = scan(tree)
+
+    hidden = {version["versionName"]: version["hidden"] for version in modules["CMake"]["versions"]}
+    assert hidden == {"3.26": False, "3.27": False, ".3.28": True}
+
+    assert [version["versionName"] for version in modules["CMake"]["versions"]] == ["3.26", "3.27", ".3.28"]
+    assert versions(modules["tool"])[".2.0"][0]["hidden"]
+
+
+def test_rescan_reads_changed_files(tmp_path, tree):
+    cache_filename = str(tmp_path / "cache" / "modulefiles.cache")
+
+    modulefile_scanner, modules = scan(tree, scanner.ModulefileCache(cache_filename))
+    read = modulefile_scanner.cache.misses
+    assert modulefile_scanner.cache.hits == 0
+
+    modulefile_scanner, unchanged = scan(tree, scanner.ModulefileCache(cache_filename))
+    assert (modulefile_scanner.cache.hits, modulefile_scanner.cache.misses) == (read, 0)
+    assert unchanged == modules
+
+    with open(os.path.join(tree, "Core", "CMake", "3.27.lua"), "w") as f:
+        f.write('whatis("Description: the CMake build system")\n')
+
+    modulefile_scanner, changed = scan(tree, scanner.ModulefileCache(cache_filename))
+    assert (modulefile_scanner.cache.hits, modulefile_scanner.cache.misses) == (read - 1, 1)
+    assert versions(changed["CMake"])["3.27"][0]["description"] == "the CMake build system"
+
+    # Files no longer reachable are dropped from the cache.
+
+    assert sorted(modulefile_scanner.cache.entries) == sorted(modulefile_scanner._seen_paths)
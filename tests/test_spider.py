@@ -0,0 +1,135 @@
+"""Generating modules.json with a fake spider command"""
+
+import os
+import sys
+import json
+import stat
+
+import pytest
+
+from conftest import tests_dir, write_json
+
+from mlbrowse import lmod
+from mlbrowse import spider
+
+
+def version(name, version_name, parents=None):
+    record = {"versionName": version_name, "full": "%s/%s" % (name, version_name), "path": "/sw/%s/%s.lua" % (name, version_name)}
+    if parents is not None:
+        record["parent"] = parents
+    return record
+
+
+root_modules = [
+    [
+        {"package": "GCC", "description": "GNU compilers", "defaultVersionName": "12.3.0", "versions": [version("GCC", "12.3.0")]},
+        {"package": "FFTW", "description": "", "versions": [version("FFTW", "3.3.10", [["GCC/12.3.0"]])]}
+    ],
+    [
+        {"package": "FFTW", "description": "Fast Fourier transform", "defaultVersionName": "3.3.10",
+            "versions": [version("FFTW", "3.3.10", [["GCC/12.3.0", "OpenMPI/4.1.5"]]), version("FFTW", "3.3.9", [["GCC/11.3.0"]])]},
+        {"package": "Python", "description": "Python", "versions": [version("Python", "3.11.3", [["GCC/12.3.0"]])]}
+    ]
+]
+
+
+@pytest.fixture
+def spider_command(tmp_path):
+    """Executable running fake_spider.py with this interpreter"""
+    command = str(tmp_path / "spider")
+    with open(command, "w") as f:
+        f.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, os.path.join(tests_dir, "fake_spider.py")))
+    os.chmod(command, os.stat(command).st_mode | stat.S_IXUSR)
+    return command
+
+
+@pytest.fixture
+def roots(tmp_path):
+    """Module roots with the spider output of root_modules"""
+    roots = []
+    for i, modules in enumerate(root_modules):
+        root = tmp_path / ("root%d" % i)
+        root.mkdir()
+        write_json(root / "spider.json", modules)
+        roots.append(str(root))
+    return roots
+
+
+def test_run_spiders(spider_command, roots):
+    results = spider.run_spiders(spider_command, roots, jobs=2)
+    assert [json.loads(output) for output in results] == root_modules
+
+
+def test_generate_merges_roots(tmp_path, spider_command, roots):
+    filename = str(tmp_path / "out" / "modules.json")
+    os.makedirs(os.path.dirname(filename))
+
+    spider.generate(spider_command, roots, filename, cache_dirs=[])
+
+    with open(filename) as f:
+        modules = {module["package"]: module for module in json.load(f)}
+
+    assert sorted(modules) == ["FFTW", "GCC", "Python"]
+
+    # The empty description of the first root is filled from the second.
+
+    assert modules["FFTW"]["description"] == "Fast Fourier transform"
+    assert modules["FFTW"]["defaultVersionName"] == "3.3.10"
+
+    # Versions found in both roots are listed once, with the parent chains of both.
+
+    versions = {record["versionName"]: record for record in modules["FFTW"]["versions"]}
+    assert sorted(versions) == ["3.3.10", "3.3.9"]
+    assert versions["3.3.10"]["parent"] == [["GCC/12.3.0"], ["GCC/12.3.0", "OpenMPI/4.1.5"]]
+
+    assert os.listdir(os.path.dirname(filename)) == ["modules.json"]
+
+
+def test_generate_replaces_atomically(tmp_path, spider_command, roots):
+    filename = str(tmp_path / "modules.json")
+    write_json(filename, [{"package": "old", "versions": []}])
+    old_inode = os.stat(filename).st_ino
+
+    # A failing spider leaves the old file in place.
+
+    with open(os.path.join(roots[1], "fail"), "w") as f:
+        f.write("spider crashed")
+
+    with pytest.raises(RuntimeError, match="spider crashed"):
+        spider.generate(spider_command, roots, filename, cache_dirs=[])
+
+    with open(filename) as f:
+        assert json.load(f) == [{"package": "old", "versions": []}]
+
+    os.remove(os.path.join(roots[1], "fail"))
+
+    # The new file is written under another name and renamed, readers
+    # holding the old file keep reading it.
+
+    with open(filename) as old_file:
+        spider.generate(spider_command, roots, filename, cache_dirs=[])
+        assert json.load(old_file) == [{"package": "old", "versions": []}]
+
+    assert os.stat(filename).st_ino != old_inode
+    assert sorted(os.listdir(str(tmp_path))) == ["modules.json", "root0", "root1", "spider"]
+
+
+def test_generate_writes_snapshot(tmp_path, spider_command, roots, monkeypatch):
+    filename = str(tmp_path / "modules.json.gz")
+    cache_dir = str(tmp_path / "cache")
+
+    db = spider.generate(spider_command, roots, filename, cache_dirs=[cache_dir])
+
+    assert sorted(name.rsplit(".", 1)[1] for name in os.listdir(cache_dir)) == ["fuzzyindex", "snapshot", "textindex"]
+
+    # The next start loads the snapshot instead of the json file.
+
+    monkeypatch.setattr(lmod.LmodDB, "_stream_modules", lambda self: pytest.fail("snapshot not used"))
+
+    loaded = lmod.LmodDB(filename, [cache_dir])
+
+    assert loaded.find_modules() == ["FFTW", "GCC", "Python"] == db.find_modules()
+    assert loaded.find_versions("FFTW") == ["3.3.9", "3.3.10"]
+    assert loaded.find_parents("FFTW", "3.3.10") == [["GCC/12.3.0"], ["GCC/12.3.0", "OpenMPI/4.1.5"]]
+    assert loaded.search_modules("fourier") == ["FFTW"]
+